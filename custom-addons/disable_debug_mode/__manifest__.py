@@ -16,7 +16,7 @@ Key features:
     ''',
     'author': 'Alvin Paul L. Azurin',
     'website': 'https://www.cre8or-lab.com',
-    'depends': ['web', 'base'],
+    'depends': ['web', 'base', 'structured_logging'],
     'data': [
         'security/ir.model.access.csv',
     ],
@@ -1,13 +1,13 @@
 # -*- coding: utf-8 -*-
 
-import logging
 import werkzeug.utils
 from urllib.parse import urlencode
 from odoo import http, models, api
 from odoo.http import request
 from odoo.tools import config
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 # Log that the module is being loaded
 _logger.info("Disable Debug Mode module is being loaded")
@@ -26,7 +26,7 @@ class IrHttpInherit(models.AbstractModel):
             debug_param = request.httprequest.args.get('debug')
             if debug_param:
                 debug_requested = True
-                _logger.info("Debug mode requested via URL parameter: %s", debug_param)
+                _logger.debug("Debug mode requested via URL parameter: %s", debug_param)
         
         # If debug mode is requested, check if user is admin
         if debug_requested and request.session and hasattr(request.session, 'uid') and request.session.uid:
@@ -35,7 +35,7 @@ class IrHttpInherit(models.AbstractModel):
                 user = request.env['res.users'].sudo().browse(request.session.uid)
                 is_admin = user.has_group('base.group_system')
                 
-                _logger.info(
+                _logger.debug(
                     "Debug access check - User: %s (ID: %s), Is Admin: %s",
                     user.name, user.id, is_admin
                 )
@@ -44,7 +44,7 @@ class IrHttpInherit(models.AbstractModel):
                 if not is_admin:
                     _logger.info(
                         'Non-admin user %s (ID: %s) attempted to access debug mode - redirecting',
-                        user.name, user.id
+                        user.name, user.id, sample=60
                     )
                     
                     # Clear debug from session
@@ -65,7 +65,7 @@ class IrHttpInherit(models.AbstractModel):
                     if new_query_string:
                         redirect_url += '?' + new_query_string
                     
-                    _logger.info("Redirecting to: %s", redirect_url)
+                    _logger.debug("Redirecting to: %s", redirect_url)
                     
                     # Redirect to the same page without debug
                     return werkzeug.utils.redirect(redirect_url)
@@ -94,7 +94,7 @@ class DisableDebugModeController(http.Controller):
         if not is_admin and result.get('debug', False):
             _logger.info(
                 'Non-admin user %s (ID: %s) attempted to access debug mode - blocking in session info',
-                user.name, user.id
+                user.name, user.id, sample=60
             )
             result['debug'] = False
         
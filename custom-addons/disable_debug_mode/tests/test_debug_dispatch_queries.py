@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Query budget of the debug mode check in the HTTP dispatch
+
+Every request with a ``debug`` parameter goes through the check, so it must
+stay cheap: it is measured as the queries it adds to the same request
+without the parameter. Each request is sent once beforehand to warm the
+caches.
+"""
+import logging
+
+from odoo.tests import HttpCase, new_test_user, tagged
+
+_logger = logging.getLogger(__name__)
+
+# A light route with a user session, so the dispatch hook is the main cost
+URL = '/web/health'
+
+
+@tagged('post_install', '-at_install')
+class TestDebugDispatchQueries(HttpCase):
+    """SQL cost of IrHttpInherit._dispatch()"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestDebugDispatchQueries, cls).setUpClass()
+        cls.user = new_test_user(cls.env, login='qc_debug_user', groups='base.group_user')
+
+    def _queries(self, url):
+        self.url_open(url, allow_redirects=False)
+        count = self.cr.sql_log_count
+        response = self.url_open(url, allow_redirects=False)
+        return self.cr.sql_log_count - count, response
+
+    def _debug_overhead(self):
+        plain, _response = self._queries(URL)
+        debug, response = self._queries(URL + '?debug=1')
+        return debug - plain, response
+
+    def test_01_admin(self):
+        """Administrators keep debug mode: one user lookup at most"""
+        self.authenticate('admin', 'admin')
+        overhead, response = self._debug_overhead()
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(overhead, 1)
+
+    def test_02_non_admin(self):
+        """Other users are redirected without debug mode: one user lookup at most"""
+        self.authenticate('qc_debug_user', 'qc_debug_user')
+        overhead, response = self._debug_overhead()
+        self.assertIn(response.status_code, (302, 303))
+        self.assertNotIn('debug', response.headers.get('Location', ''))
+        self.assertLessEqual(overhead, 1)
@@ -7,14 +7,18 @@
         This module extends the expense management functionality by adding
         receipt scanning capabilities. Upload a receipt image and the system
         will automatically extract relevant information to populate expense claim fields.
+        
+        In callback mode the scan request returns immediately and the scanner
+        completes the expense through the /expense_claim/webhook callback.
     """,
     'author': 'Odoo Developer',
     'website': '',
-    'depends': ['hr_expense'],
+    'depends': ['hr_expense', 'hr_expense_ocr_common', 'structured_logging'],
     'data': [
         'security/ir.model.access.csv',
         'views/expense_claim_views.xml',
         'views/res_config_settings_views.xml',
+        'data/ir_cron.xml',
     ],
     'installable': True,
     'application': False,
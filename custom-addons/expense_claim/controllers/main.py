@@ -1,17 +1,22 @@
-import logging
 import json
 from odoo import http, _
 from odoo.http import request
 from odoo.exceptions import AccessError, UserError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class ExpenseClaimController(http.Controller):
     """Controller for expense claim receipt scanning webhook callbacks"""
     
     @http.route('/expense_claim/webhook', type='json', auth='public', csrf=False)
     def receipt_scan_webhook(self, **post):
-        """Handle webhook callbacks from the receipt scanning service"""
+        """Handle webhook callbacks from the receipt scanning service
+        
+        Callbacks of scans requested in callback mode carry the correlation ID
+        of their scan request and either a ``scan_result`` or an ``error``;
+        other callbacks identify the expense by ``expense_id``.
+        """
         # Log the webhook call
         _logger.info(
             "Received receipt scan webhook callback from %s", 
@@ -22,8 +27,22 @@ class ExpenseClaimController(http.Controller):
             # Extract data from the request
             data = json.loads(request.httprequest.data.decode('utf-8'))
             
+            # Callback of a scan request: the request tells which company's token to expect
+            correlation_id = data.get('correlation_id')
+            scan_request = request.env['hr.expense.scan.request']
+            if correlation_id:
+                scan_request = scan_request.sudo().search([('correlation_id', '=', str(correlation_id))], limit=1)
+                if not scan_request:
+                    _logger.error(
+                        "Unknown scan request correlation ID: %s from webhook call from %s", 
+                        correlation_id, request.httprequest.remote_addr
+                    )
+                    return {'status': 'error', 'message': 'Unknown correlation ID'}
+                company = scan_request.company_id
+            else:
+                company = request.env['res.company'].sudo().search([], limit=1)
+            
             # Validate the webhook token if configured
-            company = request.env['res.company'].sudo().search([], limit=1)
             webhook_token = company.receipt_scanner_api_key
             
             if not webhook_token:
@@ -39,6 +58,23 @@ class ExpenseClaimController(http.Controller):
                 )
                 return {'status': 'error', 'message': 'Invalid webhook token'}
             
+            if scan_request:
+                scan_result = data.get('scan_result')
+                error = data.get('error')
+                if not scan_result and not error:
+                    _logger.error(
+                        "Invalid webhook data: missing scan_result or error for scan request %s", 
+                        correlation_id
+                    )
+                    return {'status': 'error', 'message': 'Invalid webhook data'}
+                if not scan_request._complete(scan_result, error=error and str(error)):
+                    return {'status': 'error', 'message': 'Scan request already answered'}
+                _logger.info(
+                    "Completed scan request %s of expense ID: %s from webhook callback", 
+                    correlation_id, scan_request.expense_id.id
+                )
+                return {'status': 'success', 'message': 'Expense updated successfully'}
+            
             # Process the webhook data
             expense_id = data.get('expense_id')
             scan_result = data.get('scan_result')
@@ -1,2 +1,3 @@
 from . import expense_claim
 from . import res_config_settings
+from . import expense_scan_request
@@ -0,0 +1,120 @@
+import uuid
+from datetime import timedelta
+from odoo import models, fields, api, _
+from odoo.addons.hr_expense_ocr_common.services.db import state_cursor
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+class HrExpenseScanRequest(models.Model):
+    """Receipt scan submitted in callback mode, completed by the scanner webhook"""
+    _name = 'hr.expense.scan.request'
+    _description = 'Receipt Scan Request'
+    _order = 'id desc'
+    _rec_name = 'correlation_id'
+
+    correlation_id = fields.Char(string="Correlation ID", required=True, readonly=True, index=True,
+                                 help="Identifier sent to the scanner and echoed back by its callback")
+    expense_id = fields.Many2one('hr.expense', string="Expense", required=True, readonly=True,
+                                 ondelete='cascade', index=True)
+    company_id = fields.Many2one('res.company', string="Company", required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('expired', 'Expired'),
+    ], string="Status", default='pending', required=True, readonly=True)
+    requested_at = fields.Datetime(string="Requested On", readonly=True)
+    deadline = fields.Datetime(string="Deadline", readonly=True, index=True,
+                               help="The request expires if the scanner has not called back by then")
+    done_at = fields.Datetime(string="Answered On", readonly=True)
+    error = fields.Text(string="Error", readonly=True)
+
+    _sql_constraints = [
+        ('correlation_id_uniq', 'unique(correlation_id)', 'The correlation ID of a scan request must be unique!'),
+    ]
+
+    @api.model
+    def _register(self, expense):
+        """Record a scan request for an expense before it is sent to the scanner
+
+        The request and the "scan pending" state of the expense are committed
+        in a transaction of its own, so the scanner callback finds them even
+        when it arrives before the caller's transaction is committed. The
+        caller must not write the state of the expense again.
+
+        Returns:
+            hr.expense.scan.request: the pending request, in the caller's environment
+        """
+        now = fields.Datetime.now()
+        timeout = max(expense.company_id.receipt_scanner_callback_timeout, 1)
+        vals = {
+            'correlation_id': uuid.uuid4().hex,
+            'expense_id': expense.id,
+            'company_id': expense.company_id.id,
+            'requested_at': now,
+            'deadline': now + timedelta(minutes=timeout),
+        }
+        with state_cursor(self.env) as cr:
+            request_id = self.with_env(self.env(cr=cr, su=True)).create(vals).id
+            cr.execute("UPDATE hr_expense SET scan_state = 'pending' WHERE id = %s", (expense.id,))
+        expense.invalidate_recordset(['scan_state'])
+        return self.sudo().browse(request_id)
+
+    def _fail(self, error):
+        """Mark pending requests as failed, e.g. when the scanner rejected them
+
+        Their expenses leave the "scan pending" state committed by _register(),
+        unless another request of the expense is still pending.
+        """
+        with state_cursor(self.env) as cr:
+            cr.execute("""
+                WITH failed AS (
+                    UPDATE hr_expense_scan_request
+                       SET state = 'failed', error = %s, done_at = (now() AT TIME ZONE 'UTC')
+                     WHERE id IN %s AND state = 'pending'
+                 RETURNING id, expense_id
+                )
+                UPDATE hr_expense e
+                   SET scan_state = 'failed', scan_message = %s
+                  FROM failed
+                 WHERE e.id = failed.expense_id AND e.scan_state = 'pending'
+                   AND NOT EXISTS (
+                        SELECT 1 FROM hr_expense_scan_request r
+                         WHERE r.expense_id = e.id AND r.state = 'pending' AND r.id NOT IN %s)
+            """, (error, tuple(self.ids), error, tuple(self.ids)))
+        self.invalidate_recordset()
+        self.expense_id.invalidate_recordset(['scan_state', 'scan_message'])
+
+    def _complete(self, scan_result=None, error=None):
+        """Apply the callback of the scanner to the expense of the request"""
+        self.ensure_one()
+        if self.state not in ('pending', 'expired'):
+            _logger.warning("Ignoring callback for scan request %s in state %s", self.correlation_id, self.state)
+            return False
+        if self.state == 'expired':
+            _logger.info("Late callback for expired scan request %s, applying it anyway", self.correlation_id)
+        expense = self.expense_id.sudo()
+        if error:
+            self.write({'state': 'failed', 'error': error, 'done_at': fields.Datetime.now()})
+            expense.write({'scan_state': 'failed', 'scan_message': error})
+            expense.message_post(body=_("Receipt scan failed: %s", error))
+        else:
+            self.write({'state': 'done', 'done_at': fields.Datetime.now()})
+            expense._update_from_scan_result(scan_result)
+        return True
+
+    @api.model
+    def _cron_expire(self):
+        """Fail the scan requests the scanner never answered"""
+        expired = self.search([('state', '=', 'pending'), ('deadline', '<', fields.Datetime.now())])
+        if not expired:
+            return
+        expired.write({'state': 'expired', 'error': _("The receipt scanner did not answer in time.")})
+        # An expense may have been scanned again since: only fail those without a newer pending request
+        still_pending = self.search([('state', '=', 'pending'), ('expense_id', 'in', expired.expense_id.ids)])
+        expenses = (expired.expense_id - still_pending.expense_id).filtered(lambda e: e.scan_state == 'pending')
+        expenses.write({'scan_state': 'failed'})
+        for expense in expenses:
+            expense.message_post(body=_("The receipt scanner did not answer in time. Please scan the receipt again."))
+        _logger.info("Expired %d unanswered receipt scan request(s)", len(expired))
@@ -1,7 +1,7 @@
-import logging
 from odoo import models, fields
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class ResCompany(models.Model):
     _inherit = 'res.company'
@@ -15,6 +15,16 @@ class ResCompany(models.Model):
         help="URL endpoint for the receipt scanning service",
         default="https://api.receipt-scanner.com/v1/scan"
     )
+    receipt_scanner_callback_mode = fields.Boolean(
+        string="Scan in Callback Mode",
+        help="Send the scan request with a callback URL and return immediately; "
+             "the scanner completes the expense through the /expense_claim/webhook callback"
+    )
+    receipt_scanner_callback_timeout = fields.Integer(
+        string="Callback Timeout (minutes)",
+        help="Scan requests the scanner has not called back after this delay are marked as failed",
+        default=10
+    )
 
 class ResConfigSettings(models.TransientModel):
     _inherit = 'res.config.settings'
@@ -31,3 +41,15 @@ class ResConfigSettings(models.TransientModel):
         help="URL endpoint for the receipt scanning service",
         readonly=False
     )
+    receipt_scanner_callback_mode = fields.Boolean(
+        related='company_id.receipt_scanner_callback_mode',
+        string="Scan in Callback Mode",
+        help="Send the scan request with a callback URL and return immediately",
+        readonly=False
+    )
+    receipt_scanner_callback_timeout = fields.Integer(
+        related='company_id.receipt_scanner_callback_timeout',
+        string="Callback Timeout (minutes)",
+        help="Scan requests the scanner has not called back after this delay are marked as failed",
+        readonly=False
+    )
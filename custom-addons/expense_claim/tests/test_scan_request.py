@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the receipt scans sent in callback mode: registration of the scan
+request, its completion by the scanner webhook and its expiry
+"""
+import base64
+import json
+import logging
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+from odoo import fields
+from odoo.tests import HttpCase, common, tagged
+
+from ..models import expense_claim
+
+_logger = logging.getLogger(__name__)
+
+PNG_DATA = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+API_KEY = 'test-scanner-key'
+SCAN_RESULT = {'output': {'business_name': 'City Taxi', 'receipt_number': 'CT-42', 'total_amount': 25.5}}
+
+
+class ScanRequestMixin(object):
+    """Expense of a company scanning receipts in callback mode"""
+
+    def _setup_scanner(self):
+        self.env.company.write({
+            'receipt_scanner_api_key': API_KEY,
+            'receipt_scanner_api_url': 'https://scanner.example.com/v1/scan',
+            'receipt_scanner_callback_mode': True,
+            'receipt_scanner_callback_timeout': 15,
+        })
+        self.expense = self.env['hr.expense'].create({
+            'name': 'Taxi',
+            'employee_id': self.env.ref('hr.employee_admin').id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 10.0,
+        })
+        self.ScanRequest = self.env['hr.expense.scan.request']
+
+
+@tagged('post_install', '-at_install')
+class TestScanRequest(ScanRequestMixin, common.TransactionCase):
+    """Test the life cycle of scan requests"""
+
+    def setUp(self):
+        super(TestScanRequest, self).setUp()
+        self._setup_scanner()
+
+    def test_01_register(self):
+        """Registering a request sets the expense pending with it"""
+        scan_request = self.ScanRequest._register(self.expense)
+        self.assertEqual(scan_request.state, 'pending')
+        self.assertEqual(scan_request.expense_id, self.expense)
+        self.assertEqual(scan_request.company_id, self.env.company)
+        self.assertEqual(len(scan_request.correlation_id), 32)
+        self.assertEqual(scan_request.deadline - scan_request.requested_at, timedelta(minutes=15))
+        self.assertEqual(self.expense.scan_state, 'pending')
+        self.assertNotEqual(self.ScanRequest._register(self.expense).correlation_id, scan_request.correlation_id)
+
+    def test_02_complete(self):
+        """A callback with a result scans the expense once, later callbacks are ignored"""
+        scan_request = self.ScanRequest._register(self.expense)
+        self.assertTrue(scan_request._complete(SCAN_RESULT))
+        self.assertEqual(scan_request.state, 'done')
+        self.assertTrue(scan_request.done_at)
+        self.assertEqual(self.expense.scan_state, 'done')
+        self.assertEqual(self.expense.name, 'City Taxi')
+
+        self.assertFalse(scan_request._complete(error='Duplicate callback'))
+        self.assertEqual(scan_request.state, 'done')
+        self.assertEqual(self.expense.scan_state, 'done')
+
+    def test_03_complete_error(self):
+        """A callback with an error fails the request and the expense"""
+        scan_request = self.ScanRequest._register(self.expense)
+        self.assertTrue(scan_request._complete(error='Unreadable receipt'))
+        self.assertEqual(scan_request.state, 'failed')
+        self.assertEqual(scan_request.error, 'Unreadable receipt')
+        self.assertEqual(self.expense.scan_state, 'failed')
+        self.assertEqual(self.expense.scan_message, 'Unreadable receipt')
+
+    def test_04_fail(self):
+        """A rejected request fails its expense, unless another request of the expense is pending"""
+        first = self.ScanRequest._register(self.expense)
+        second = self.ScanRequest._register(self.expense)
+        first._fail('Rejected')
+        self.assertEqual(first.state, 'failed')
+        self.assertEqual(self.expense.scan_state, 'pending')
+
+        second._fail('Rejected again')
+        self.assertEqual(second.state, 'failed')
+        self.assertEqual(self.expense.scan_state, 'failed')
+        self.assertEqual(self.expense.scan_message, 'Rejected again')
+
+    def test_05_cron_expire(self):
+        """Unanswered requests expire and fail their expense, late callbacks still apply"""
+        scan_request = self.ScanRequest._register(self.expense)
+        other = self.expense.copy({'name': 'Hotel'})
+        rescanned = self.ScanRequest._register(other)
+        self.ScanRequest._register(other)
+        past = fields.Datetime.now() - timedelta(minutes=1)
+        (scan_request | rescanned).write({'deadline': past})
+
+        self.ScanRequest._cron_expire()
+        self.assertEqual(scan_request.state, 'expired')
+        self.assertEqual(self.expense.scan_state, 'failed')
+        # Scanned again since: still waiting for the newer request
+        self.assertEqual(rescanned.state, 'expired')
+        self.assertEqual(other.scan_state, 'pending')
+
+        self.assertTrue(scan_request._complete(SCAN_RESULT))
+        self.assertEqual(scan_request.state, 'done')
+        self.assertEqual(self.expense.scan_state, 'done')
+
+    def test_06_callback_before_response(self):
+        """A callback completing the scan before the request returns is not undone by the caller"""
+        attachment = self.env['ir.attachment'].create({
+            'name': 'taxi.png',
+            'datas': base64.b64encode(PNG_DATA),
+            'mimetype': 'image/png',
+            'res_model': 'hr.expense',
+            'res_id': self.expense.id,
+        })
+        self.expense.message_main_attachment_id = attachment
+
+        def post(env, url, before_send=None, **kwargs):
+            self.ScanRequest.search([('expense_id', '=', self.expense.id)])._complete(SCAN_RESULT)
+            return MagicMock(status_code=202)
+
+        with patch.object(expense_claim.circuit_breaker, 'post', side_effect=post):
+            action = self.expense.action_scan_receipt()
+        self.assertEqual(action['params']['title'], 'Receipt Scan Requested')
+        self.assertEqual(self.expense.scan_state, 'done')
+        self.assertEqual(self.expense.name, 'City Taxi')
+
+
+@tagged('post_install', '-at_install')
+class TestScanWebhook(ScanRequestMixin, HttpCase):
+    """Test the correlation of the scanner callbacks with their scan request"""
+
+    def setUp(self):
+        super(TestScanWebhook, self).setUp()
+        self._setup_scanner()
+        self.scan_request = self.ScanRequest._register(self.expense)
+
+    def _callback(self, data, token=API_KEY):
+        response = self.url_open('/expense_claim/webhook', data=json.dumps(data), headers={
+            'Content-Type': 'application/json',
+            'Authorization': 'Bearer %s' % token,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.env.invalidate_all()
+        return response.json()['result']
+
+    def test_01_correlated_callback(self):
+        """The callback completes the request of its correlation ID"""
+        result = self._callback({'correlation_id': self.scan_request.correlation_id, 'scan_result': SCAN_RESULT})
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.scan_request.state, 'done')
+        self.assertEqual(self.expense.scan_state, 'done')
+        self.assertEqual(self.expense.name, 'City Taxi')
+
+        result = self._callback({'correlation_id': self.scan_request.correlation_id, 'scan_result': SCAN_RESULT})
+        self.assertEqual(result, {'status': 'error', 'message': 'Scan request already answered'})
+
+    def test_02_rejected_callbacks(self):
+        """Callbacks with an unknown correlation ID, a wrong token or no result change nothing"""
+        result = self._callback({'correlation_id': 'unknown', 'scan_result': SCAN_RESULT})
+        self.assertEqual(result['message'], 'Unknown correlation ID')
+        result = self._callback({'correlation_id': self.scan_request.correlation_id, 'scan_result': SCAN_RESULT},
+                                token='wrong')
+        self.assertEqual(result['message'], 'Invalid webhook token')
+        result = self._callback({'correlation_id': self.scan_request.correlation_id})
+        self.assertEqual(result['message'], 'Invalid webhook data')
+        self.assertEqual(self.scan_request.state, 'pending')
+        self.assertEqual(self.expense.scan_state, 'pending')
+
+    def test_03_error_callback(self):
+        """A callback carrying an error fails the expense"""
+        result = self._callback({'correlation_id': self.scan_request.correlation_id, 'error': 'Unreadable receipt'})
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(self.scan_request.state, 'failed')
+        self.assertEqual(self.expense.scan_state, 'failed')
@@ -9,7 +9,7 @@ Once the limit is reached, no new employees can be created.
     ''',
     'author': 'Alvin Paul L. Azurin',
     'website': 'https://www.cre8or-lab.com',
-    'depends': ['hr'],
+    'depends': ['hr', 'structured_logging'],
     'data': [
         'security/ir.model.access.csv',
         'views/hr_employee_limit_views.xml',
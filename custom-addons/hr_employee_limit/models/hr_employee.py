@@ -1,15 +1,15 @@
-import logging
 from odoo import models, api, _
 from odoo.exceptions import ValidationError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class HrEmployee(models.Model):
     _inherit = 'hr.employee'
 
     @api.model_create_multi
     def create(self, vals_list):
-        _logger.info('Attempting to create %d new employee record(s)', len(vals_list))
+        _logger.debug('Attempting to create %d new employee record(s)', len(vals_list))
         
         try:
             # Get the current employee count
@@ -20,6 +20,11 @@ class HrEmployee(models.Model):
             limit_config = self.env['hr.employee.limit.config'].sudo().get_employee_limit()
             _logger.debug('Employee limit configuration: %d', limit_config)
             
+            # If limit is -1, it means no limit is set
+            if limit_config == -1:
+                _logger.debug('No employee limit configured, proceeding with creation')
+                return super().create(vals_list)
+            
             # Check if creating these employees would exceed the limit
             if employee_count + len(vals_list) > limit_config:
                 _logger.warning(
@@ -31,7 +36,7 @@ class HrEmployee(models.Model):
                     'Current employee count: %s'
                 ) % (limit_config, employee_count))
             
-            _logger.info('Employee limit check passed, proceeding with creation')
+            _logger.debug('Employee limit check passed, proceeding with creation')
             result = super().create(vals_list)
             _logger.info('Successfully created %d new employee record(s)', len(vals_list))
             return result
@@ -1,8 +1,8 @@
-import logging
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class HrEmployeeLimitConfig(models.Model):
     _name = 'hr.employee.limit.config'
@@ -153,11 +153,11 @@ class HrEmployeeLimitConfig(models.Model):
                 (when no configuration is enabled)
         """
         try:
-            _logger.info('Fetching current employee limit configuration')
+            _logger.debug('Fetching current employee limit configuration')
             config = self.search([('is_enabled', '=', True)], limit=1)
             
             if not config:
-                _logger.info('No enabled configuration found - employee creation will be unlimited')
+                _logger.info('No enabled configuration found - employee creation will be unlimited', sample=3600)
                 return -1  # Return -1 to indicate no limit
             
             _logger.debug(
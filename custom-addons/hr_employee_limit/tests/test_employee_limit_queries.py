@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+Query budgets of employee creation under an employee limit
+
+The budgets are upper bounds: a change that makes the limit check issue
+more queries fails here, one that saves queries is only logged by
+assertQueryCount(). Each case is run once beforehand to warm the caches.
+"""
+import logging
+
+from odoo.exceptions import ValidationError
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestEmployeeLimitQueries(common.TransactionCase):
+    """SQL cost of the employee limit check in hr.employee create()"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestEmployeeLimitQueries, cls).setUpClass()
+        cls.employee_count = cls.env['hr.employee'].search_count([])
+        cls.config = cls.env['hr.employee.limit.config'].create({
+            'name': 'Query Count Limit',
+            'max_employees': cls.employee_count,
+            'is_enabled': True,
+        })
+        cls.Employees = cls.env['hr.employee'].with_user(cls.env.ref('base.user_admin'))
+
+    def test_01_limit_reached(self):
+        """Refusing an employee costs the employee count and the configuration lookup only"""
+        with self.assertRaises(ValidationError):
+            self.Employees.create([{'name': 'QC Warm-up'}])
+        self.env.invalidate_all()
+        with self.assertQueryCount(admin=3):
+            with self.assertRaises(ValidationError):
+                self.Employees.create([{'name': 'QC Refused'}])
+
+    def test_02_under_limit(self):
+        """Creating employees under the limit"""
+        self.config.max_employees = self.employee_count + 10
+        self.Employees.create([{'name': 'QC Warm-up'}])
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(admin=80):
+            employees = self.Employees.create([{'name': 'QC Employee %d' % index} for index in range(3)])
+            self.env.flush_all()
+        self.assertEqual(len(employees), 3)
+
+    def test_03_no_limit(self):
+        """Without an enabled configuration employees are not limited"""
+        self.config.is_enabled = False
+        self.assertEqual(self.env['hr.employee.limit.config'].get_employee_limit(), -1)
+        self.assertTrue(self.Employees.create([{'name': 'QC Unlimited'}]))
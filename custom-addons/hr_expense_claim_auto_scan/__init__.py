@@ -1,4 +1,5 @@
 from . import models
 from . import controllers
 from . import services
+from . import cli
 from .hooks import uninstall_hook
@@ -17,11 +17,17 @@
     'category': 'Human Resources/Expenses',
     'author': 'Alvin Paul L. Azurin',
     'website': 'https://www.cre8or-lab.com',
-    'depends': ['hr_expense'],
+    'depends': ['hr_expense', 'hr_expense_ocr_common', 'structured_logging'],
     'data': [
         'security/ir.model.access.csv',
         'views/hr_expense_views.xml',
+        'views/hr_expense_ocr_job_views.xml',
+        'views/hr_expense_ocr_cache_views.xml',
+        'views/hr_expense_ocr_backfill_views.xml',
+        'views/hr_expense_ocr_engine_stat_views.xml',
+        'views/hr_expense_ocr_vendor_profile_views.xml',
         'data/system_parameters.xml',
+        'data/ir_cron.xml',
     ],
     'uninstall_hook': 'uninstall_hook',
     'installable': True,
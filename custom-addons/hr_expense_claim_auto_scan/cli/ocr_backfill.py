@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+odoo-bin ocr_backfill: scan the receipts of existing expenses.
+
+    odoo-bin ocr_backfill -c odoo.conf -d mydb --workers 8
+    odoo-bin ocr_backfill -c odoo.conf -d mydb --resume 3
+
+Options not listed below are passed to the Odoo configuration parser.
+"""
+import argparse
+import sys
+from pathlib import Path
+
+import odoo
+from odoo import api, SUPERUSER_ID
+from odoo.cli import Command
+from odoo.modules.registry import Registry
+from odoo.tools import config
+from odoo.addons.structured_logging import get_logger
+
+from ..models.hr_expense_ocr_backfill import DEFAULT_DOMAIN
+
+_logger = get_logger(__name__)
+
+
+class OcrBackfill(Command):
+    """Scan the receipts of existing expenses with the OCR API, resumably"""
+    name = 'ocr_backfill'
+
+    def run(self, cmdargs):
+        parser = argparse.ArgumentParser(
+            prog='%s %s' % (Path(sys.argv[0]).name, self.name),
+            description=self.__doc__,
+        )
+        parser.add_argument('--domain', default=DEFAULT_DOMAIN,
+                            help="domain selecting the expenses to scan (default: %(default)s)")
+        parser.add_argument('--workers', type=int, default=4,
+                            help="chunks scanned in parallel, one database cursor each (default: %(default)s)")
+        parser.add_argument('--chunk-size', type=int, default=5,
+                            help="expenses per chunk, i.e. per batched OCR request (default: %(default)s)")
+        parser.add_argument('--async', dest='async_requests', action='store_true',
+                            help="scan with concurrent asynchronous requests from one thread "
+                                 "(--workers requests in flight) instead of a pool of threads")
+        parser.add_argument('--resume', type=int, metavar='BACKFILL_ID',
+                            help="resume an existing backfill from its checkpoint")
+        parser.add_argument('--name', default='OCR Backfill (command line)',
+                            help="name of the new backfill")
+        opts, odoo_args = parser.parse_known_args(cmdargs)
+
+        config.parse_config(odoo_args)
+        odoo.netsvc.init_logger()
+        dbnames = config['db_name']
+        if isinstance(dbnames, str):
+            dbnames = [db for db in dbnames.split(',') if db]
+        if len(dbnames or []) != 1:
+            sys.exit("Please select exactly one database with -d")
+
+        registry = Registry(dbnames[0])
+        with registry.cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            Backfill = env['hr.expense.ocr.backfill']
+            if opts.resume:
+                backfill = Backfill.browse(opts.resume).exists()
+                if not backfill:
+                    sys.exit("Backfill %s does not exist" % opts.resume)
+                if backfill.state == 'done':
+                    sys.exit("Backfill %s is already done" % opts.resume)
+            else:
+                backfill = Backfill.create({
+                    'name': opts.name,
+                    'domain': opts.domain,
+                    'workers': opts.workers,
+                    'chunk_size': opts.chunk_size,
+                    'async_requests': opts.async_requests,
+                })
+            backfill._mark_running()
+            cr.commit()
+            print("Running OCR backfill %s: %d expenses to scan, resuming after expense id %d"
+                  % (backfill.id, backfill.total_count, backfill.last_expense_id))
+
+            try:
+                backfill._run()
+            except KeyboardInterrupt:
+                cr.rollback()
+                backfill.action_pause()
+                cr.commit()
+                print("Interrupted; resume with --resume %d" % backfill.id)
+                return 1
+
+            print("OCR backfill %s %s: %d scanned, %d failed, %.1f receipts per minute"
+                  % (backfill.id, dict(backfill._fields['state'].selection)[backfill.state],
+                     backfill.done_count, backfill.failed_count, backfill.throughput))
+        return 0
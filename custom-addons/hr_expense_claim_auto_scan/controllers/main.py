@@ -1,13 +1,14 @@
 # -*- coding: utf-8 -*-
-import logging
-import base64
 import json
 import werkzeug
 import requests
 from odoo import http, _
 from odoo.http import request
 
-_logger = logging.getLogger(__name__)
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
 
 class HrExpenseOCRController(http.Controller):
     """Controller for HR Expense OCR operations"""
@@ -67,18 +68,11 @@ class HrExpenseOCRController(http.Controller):
             return {'error': _('Invalid parameters')}
         
         try:
-            # Get file data
-            file_data = base64.b64decode(attachment.datas)
-            file_name = attachment.name
-            
             _logger.info("Processing receipt scan for expense %s with file %s", 
-                       expense_id, file_name)
-            
-            # Import here to avoid circular imports
-            from ..services.ocr_service import process_receipt_ocr
+                       expense_id, attachment.name)
             
-            # Process OCR
-            ocr_result = process_receipt_ocr(file_data, file_name)
+            # Process OCR (served from the result cache when possible)
+            ocr_result = expense._ocr_scan_attachment(attachment)
             
             if not ocr_result:
                 _logger.error("OCR processing failed for expense %s", expense_id)
@@ -104,6 +98,12 @@ class HrExpenseOCRController(http.Controller):
                 'success': False,
                 'error': _('Data error during OCR processing: %s') % str(e)
             }
+        except OcrUnavailableError as e:
+            _logger.warning("OCR service unavailable for expense %s: %s", expense_id, str(e))
+            return {
+                'success': False,
+                'error': _('The OCR service is temporarily unavailable, please try again later.')
+            }
         except requests.exceptions.RequestException as e:
             _logger.exception("API request error during OCR processing for expense %s: %s", 
                             expense_id, str(e))
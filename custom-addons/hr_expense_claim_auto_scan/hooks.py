@@ -1,8 +1,8 @@
 # -*- coding: utf-8 -*-
-import logging
 from psycopg2 import Error as PostgresError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 def uninstall_hook(env):
     """
@@ -23,6 +23,14 @@ def uninstall_hook(env):
     except PostgresError as e:
         _logger.error("Error dropping PostgreSQL function: %s", str(e))
     
+    # Drop the trigram indexes of the expense category matching, see models/product_product.py
+    try:
+        env.cr.execute("DROP INDEX IF EXISTS product_product_default_code_trgm_index")
+        env.cr.execute("DROP INDEX IF EXISTS product_template_expense_name_trgm_index")
+        _logger.info("Successfully dropped the expense category trigram indexes")
+    except PostgresError as e:
+        _logger.error("Error dropping the expense category trigram indexes: %s", str(e))
+    
     # Clean up any ir.model.function records related to this module
     try:
         env.cr.execute("""
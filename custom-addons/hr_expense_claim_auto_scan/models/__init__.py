@@ -1,3 +1,12 @@
 from . import hr_expense
 from . import init_functions
 from . import ir_model_function
+from . import hr_expense_ocr_job
+from . import hr_expense_ocr_cache
+from . import ir_config_parameter
+from . import hr_expense_ocr_backfill
+from . import hr_expense_sheet
+from . import hr_expense_ocr_engine_stat
+from . import hr_expense_ocr_vendor_profile
+from . import product_product
+from . import product_template
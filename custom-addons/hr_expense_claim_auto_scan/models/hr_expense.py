@@ -1,13 +1,20 @@
 # -*- coding: utf-8 -*-
-import base64
-import logging
-from datetime import datetime
+from collections import defaultdict
+from datetime import timedelta
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
 
-from ..services.ocr_service import process_receipt_ocr
+from odoo.addons.hr_expense_ocr_common.services import http_client
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.hr_expense_ocr_common.services.extraction import extract_ocr_values, receipt_line_values
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+from odoo.addons.structured_logging import get_logger, payload
+from ..services import async_ocr
+from ..services.ocr_service import process_receipt_file, process_receipt_files
+from ..services.preprocess import preprocess_receipt_file
+from ..services.single_flight import FLIGHT_RETRY_DELAY, SingleFlight
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class HrExpense(models.Model):
     _inherit = 'hr.expense'
@@ -24,20 +31,78 @@ class HrExpense(models.Model):
     
     receipt_number = fields.Char(string='Receipt Number', copy=False, size=32, help="Receipt number extracted from receipt")
     
+    ocr_original_size = fields.Integer(string='Receipt Size (bytes)', copy=False, readonly=True,
+                                       help="Size of the receipt attachment before preprocessing")
+    
+    ocr_processed_size = fields.Integer(string='Uploaded Size (bytes)', copy=False, readonly=True,
+                                        help="Size of the receipt sent to the OCR API after preprocessing")
+    
+    ocr_job_ids = fields.One2many('hr.expense.ocr.job', 'expense_id', string='OCR Jobs', copy=False)
+    
+    ocr_engine = fields.Selection(selection='_get_ocr_engine_selection', string='OCR Engine', copy=False,
+                                  readonly=True, help="OCR engine that extracted the receipt data")
+    
+    ocr_total_amount = fields.Float(string='Extracted Total', copy=False, readonly=True,
+                                    help="Total amount read on the receipt, compared with the submitted total "
+                                         "to measure the accuracy of the OCR engine")
+    
+    ocr_accuracy_checked = fields.Boolean(string='OCR Accuracy Checked', copy=False, readonly=True)
+    
+    @api.model
+    def _get_ocr_engine_selection(self):
+        return self.env['hr.expense.ocr.engine.stat']._get_engine_selection()
+    
+    def _register_hook(self):
+        """Open the pooled connection to the OCR API when the worker loads the registry."""
+        super(HrExpense, self)._register_hook()
+        try:
+            api_url = self.env['ir.config_parameter']._get_ocr_config()['api_url']
+        except Exception as e:  # pylint: disable=broad-except
+            _logger.debug("Could not read OCR API URL for connection warm-up: %s", str(e))
+            return
+        http_client.warm_up([api_url])
+    
     # Override abstract method from BaseModel to avoid lint error
     def onchange(self, values, field_name, field_onchange):
         return super(HrExpense, self).onchange(values, field_name, field_onchange)
     
-    def auto_scan_attachment(self, attachment=None):
+    def auto_scan_attachment(self, attachment=None, ocr_result=None):
         """Process an attachment with OCR to extract expense data.
         
         Args:
             attachment: The attachment to process. If not provided, uses the main attachment.
+            ocr_result: OCR result already obtained for the attachment (e.g. by a
+                batched scan). If not provided, the attachment is scanned.
             
         Returns:
             bool: True if processing was successful, False otherwise.
         """
         self.ensure_one()
+        preprocessed, learned = {}, {}
+        vals, note, success = self._prepare_auto_scan(attachment, ocr_result, preprocessed=preprocessed,
+                                                      learned=learned)
+        # Sizes and dropped pages of the receipt are written with the outcome of the scan
+        for sizes, dropped_note in preprocessed.values():
+            vals = dict(vals, **sizes)
+            note = ' '.join(filter(None, (note, dropped_note)))
+        self._write_ocr_values({self.id: vals}, {self.id: note} if note else None, learned)
+        return success
+    
+    def _prepare_auto_scan(self, attachment=None, ocr_result=None, preprocessed=None, learned=None):
+        """Scan an attachment and return the expense values of the outcome, without writing them.
+        
+        Args:
+            attachment: The attachment to process. If not provided, uses the main attachment.
+            ocr_result: OCR result already obtained for the attachment. If not
+                provided, the attachment is scanned.
+            preprocessed (dict): filled by the scan, see _ocr_scan_attachments()
+            learned (dict): filled by the mapping, see _prepare_ocr_result()
+            
+        Returns:
+            tuple: (vals, note, success) with the values to write on the expense,
+                the chatter note to post (or None) and whether the scan succeeded
+        """
+        self.ensure_one()
         
         if not attachment:
             # Get the main attachment if none provided
@@ -46,82 +111,322 @@ class HrExpense(models.Model):
             
         if not attachment:
             _logger.info("No attachment found for expense %s", self.id)
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': _("No receipt attachment found to scan.")[:2048]
-            })
-            return False
+            return self._ocr_failure_values(_("No receipt attachment found to scan."))
             
         try:
             _logger.info("Processing attachment %s for expense %s", attachment.id, self.id)
             
-            # Update status to processing
-            self.write({'ocr_status': 'pending'})
-            
-            # Get file data and name
-            file_data = base64.b64decode(attachment.datas)
-            file_name = attachment.name or 'unknown'
-            
-            # Process the receipt with OCR
-            ocr_result = process_receipt_ocr(file_data, file_name)
+            # Process the receipt with OCR (served from the result cache when possible)
+            if ocr_result is None:
+                ocr_result = self._ocr_scan_attachment(attachment, preprocessed=preprocessed)
+                if ocr_result is None:
+                    # Another request is scanning the receipt: the queue reads its result from the cache
+                    self.env['hr.expense.ocr.job']._enqueue(
+                        self, eta=fields.Datetime.now() + timedelta(seconds=FLIGHT_RETRY_DELAY))
+                    return {
+                        'ocr_status': 'pending',
+                        'ocr_message': _("The receipt is already being scanned. "
+                                         "The expense will be updated once the scan is complete.")[:2048]
+                    }, None, False
             
             if not ocr_result:
                 _logger.warning("OCR processing returned no result for expense %s", self.id)
-                self.write({
-                    'ocr_status': 'failed',
-                    'ocr_message': _("OCR processing failed to extract data from the receipt.")[:2048]
-                })
-                return False
+                return self._ocr_failure_values(_("OCR processing failed to extract data from the receipt."))
                 
-            # Update expense with OCR result
-            self.update_from_ocr_result(ocr_result)
-            return True
+            # Map the OCR result to expense values
+            return self._prepare_ocr_result(ocr_result, learned=learned)
             
+        except OcrUnavailableError as e:
+            # Fail fast while the OCR API is down: queue the scan for when it is back
+            _logger.warning("OCR API unavailable for expense %s, deferring scan: %s", self.id, str(e))
+            self.env['hr.expense.ocr.job']._enqueue(self, eta=e.retry_at)
+            return {
+                'ocr_status': 'pending',
+                'ocr_message': _("The OCR service is temporarily unavailable. "
+                                 "The receipt will be scanned automatically once it is back.")[:2048]
+            }, None, False
         except UserError as e:
             _logger.error("User error in OCR processing for expense %s: %s", self.id, str(e))
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': str(e)[:2048]
-            })
-            return False
+            return self._ocr_failure_values(str(e))
         except (ValueError, TypeError, ValidationError) as e:
             _logger.error("Validation error in OCR processing for expense %s: %s", self.id, str(e))
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': _("Validation error during OCR processing: %s") % str(e)[:2048]
-            })
-            return False
+            return self._ocr_failure_values(_("Validation error during OCR processing: %s") % str(e)[:2048])
         except Exception as e:
             _logger.error("Error in OCR processing for expense %s: %s", self.id, str(e), exc_info=True)
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': _("An error occurred during OCR processing: %s") % str(e)[:2048]
-            })
-            return False
+            return self._ocr_failure_values(_("An error occurred during OCR processing: %s") % str(e)[:2048])
+    
+    @api.model
+    def _ocr_failure_values(self, message):
+        """Return the outcome of a failed scan, see _prepare_auto_scan()."""
+        return {'ocr_status': 'failed', 'ocr_message': message[:2048]}, None, False
+    
+    @api.model
+    def _dropped_pages_note(self, dropped_pages):
+        """Return the chatter note telling which PDF pages were not sent to the OCR service.
+        
+        Args:
+            dropped_pages (list): (page number, 'blank' or 'limit') tuples,
+                see preprocess_receipt_file()
+        """
+        blank = [str(number) for number, reason in dropped_pages if reason == 'blank']
+        limit = [str(number) for number, reason in dropped_pages if reason == 'limit']
+        parts = []
+        if blank:
+            parts.append(_("blank pages %s", ", ".join(blank)))
+        if limit:
+            parts.append(_("pages %s, beyond the ocr_preprocess_max_pdf_pages limit", ", ".join(limit)))
+        return _("Not sent to the OCR service: %s.", "; ".join(parts))
+    
+    def _write_ocr_values(self, values, notes=None, learned=None):
+        """Write the outcome of OCR scans on their expenses.
+        
+        Each expense is written once, with the fields whose value changes only
+        and without mail tracking; expenses getting the same values share one
+        write. Receipt items are read-only for employees: once the expenses
+        are known to be writable by the user, their items are replaced as
+        superuser, all at once. The chatter notes are logged in one batch, and
+        the vendor profiles updated for the expenses that were written.
+        
+        Args:
+            values (dict): expense id -> field values
+            notes (dict): expense id -> chatter note
+            learned (dict): expense id -> vendor profile update, see _prepare_ocr_result()
+        """
+        groups = {}
+        for expense in self.browse(list(values)):
+            changed = expense._ocr_changed_values(values[expense.id])
+            if changed:
+                # Payloads are dicts: group by representation
+                key = repr(sorted(changed.items()))
+                groups.setdefault(key, (changed, []))[1].append(expense.id)
+        Expense = self.with_context(tracking_disable=True)
+        failed = set()
+        for changed, expense_ids in groups.values():
+            expenses = Expense.browse(expense_ids)
+            changed = dict(changed)
+            lines = changed.pop('receipt_line_ids', None)
+            try:
+                if changed:
+                    expenses.write(changed)
+                if lines is not None:
+                    expenses.check_access('write')
+                    expenses._replace_receipt_lines(lines)
+            except (UserError, ValidationError, ValueError, TypeError) as e:
+                _logger.error("Could not write OCR data on expenses %s: %s", expense_ids, str(e))
+                failed.update(expense_ids)
+                expenses.write(self._ocr_failure_values(
+                    _("Validation error during OCR processing: %s") % str(e)[:2048])[0])
+        notes = {expense_id: note for expense_id, note in (notes or {}).items() if note}
+        if notes and hasattr(self, '_message_log_batch'):
+            self.browse(list(notes))._message_log_batch(bodies=notes)
+        for expense_id, (profile, args) in (learned or {}).items():
+            if expense_id not in failed:
+                profile._learn(*args)
+    
+    def _replace_receipt_lines(self, lines):
+        """Replace the receipt items of the expenses as superuser, all lines being created at once.
+        
+        Args:
+            lines (list): line values, see receipt_line_values()
+        """
+        Line = self.env['hr.expense.receipt.line'].sudo()
+        self.sudo().receipt_line_ids.unlink()
+        Line.create([dict(line, expense_id=expense_id) for expense_id in self.ids for line in lines])
+    
+    def _ocr_changed_values(self, vals):
+        """Return the values of vals that differ from the ones of the expense.
+        
+        The receipt lines are given as a list of line values, see
+        receipt_line_values(), and kept as such when they differ from the
+        current lines; _write_ocr_values() replaces these.
+        """
+        self.ensure_one()
+        changed = {}
+        for name, value in vals.items():
+            if name == 'receipt_line_ids':
+                if self.receipt_line_ids._get_line_values() != value:
+                    changed[name] = value
+                continue
+            field = self._fields[name]
+            if field.convert_to_cache(value, self, validate=False) != \
+                    field.convert_to_cache(self[name], self, validate=False):
+                changed[name] = value
+        return changed
+    
+    def _ocr_scan_attachment(self, attachment, preprocessed=None):
+        """Return the OCR result for an attachment, using the result cache.
+        
+        Args:
+            attachment: ir.attachment record to scan
+            preprocessed (dict): see _ocr_scan_attachments()
+            
+        Returns:
+            dict: OCR result data, False if processing failed or None if
+                another request is scanning the receipt
+        """
+        return self._ocr_scan_attachments(attachment, preprocessed=preprocessed)[attachment.id]
+    
+    def _ocr_scan_attachments(self, attachments, preprocessed=None):
+        """Return the OCR results for several attachments, using the result cache.
+        
+        The cache is keyed by the attachment checksum and the OCR API URL, so a
+        receipt uploaded on several expenses is only sent to the API once.
+        Concurrent requests for the same receipt are coordinated with
+        services/single_flight.py: one of them scans it, the others leave it
+        to be scanned again later, from the cache. Attachments missing from
+        the cache are sent with batched OCR requests, or with concurrent ones
+        when the ``ocr_concurrency`` context key is set. Results are not
+        cached in test mode.
+        
+        Args:
+            attachments: ir.attachment recordset to scan
+            preprocessed (dict): filled with attachment id -> (expense values,
+                chatter note or None) telling the sizes of the receipts sent
+                and the PDF pages left out, for the caller to write with the
+                outcome of the scans
+            
+        Returns:
+            dict: attachment id -> OCR result data, False if processing failed
+                or None if another request is scanning the receipt
+        """
+        ocr_config = self.env['ir.config_parameter']._get_ocr_config()
+        test_mode = ocr_config['test_mode']
+        api_url = ocr_config['api_url']
+        Cache = self.env['hr.expense.ocr.cache'].sudo()
+        use_cache = bool(api_url and not test_mode)
+        
+        results = {}
+        # One scan per receipt content, even when several attachments share it
+        to_scan = defaultdict(lambda: self.env['ir.attachment'])
+        for attachment in attachments:
+            cached = use_cache and Cache._lookup(attachment.checksum, api_url)
+            if cached:
+                _logger.info("Using cached OCR result for attachment %s", attachment.id)
+                results[attachment.id] = cached
+            else:
+                to_scan[attachment.checksum or attachment.id] |= attachment
+        if not to_scan:
+            return results
+        
+        flight = SingleFlight(self.env, api_url, enabled=use_cache)
+        claimed = {}
+        for key, group in to_scan.items():
+            if flight.claim(group[0].checksum):
+                claimed[key] = group
+            else:
+                # Another request is scanning the receipt: its result will be in the cache
+                results.update(dict.fromkeys(group.ids))
+        self._ocr_scan_claimed(flight, claimed, ocr_config, results,
+                               preprocessed if preprocessed is not None else {})
+        return results
+    
+    def _ocr_scan_claimed(self, flight, groups, ocr_config, results, preprocessed):
+        """Scan the receipts claimed in a single flight and cache their results.
+        
+        Results are cached in the caller's transaction, which holds the claims
+        until it ends: the requests that found a receipt claimed find its
+        result in the cache once they run again.
+        
+        Args:
+            flight (SingleFlight): claims of the caller
+            groups (dict): receipt checksum -> attachments with that content
+            ocr_config (dict): OCR configuration, see _get_ocr_config()
+            results (dict): attachment id -> OCR result, updated in place
+            preprocessed (dict): attachment id -> (expense values, chatter
+                note or None), updated in place
+        """
+        if not groups:
+            return
+        
+        # Stream the files from the filestore, shrunk by the preprocessing stage when enabled
+        receipts = []
+        for group in groups.values():
+            attachment = group[0]
+            receipt = ReceiptFile.from_attachment(attachment)
+            if ocr_config['preprocess']:
+                receipt, original_size, processed_size, dropped_pages = preprocess_receipt_file(
+                    receipt, ocr_config['preprocess_options'])
+                sizes = {'ocr_original_size': original_size, 'ocr_processed_size': processed_size}
+                note = self._dropped_pages_note(dropped_pages) if dropped_pages else None
+                preprocessed.update(dict.fromkeys(group.ids, (sizes, note)))
+            receipts.append(receipt)
+        # Use the caller's environment: no second database connection per scan
+        if self.env.context.get('ocr_concurrency'):
+            # Batch jobs: concurrent requests from this thread, see services/async_ocr.py
+            ocr_results = async_ocr.scan_receipt_files(
+                self.env, receipts, concurrency=self.env.context['ocr_concurrency'])
+        elif len(receipts) == 1:
+            ocr_results = [process_receipt_file(self.env, receipts[0])]
+        else:
+            ocr_results = process_receipt_files(self.env, receipts)
+        for group, ocr_result in zip(groups.values(), ocr_results):
+            results.update(dict.fromkeys(group.ids, ocr_result))
+            if ocr_result:
+                flight.store(group[0].checksum, ocr_result)
+    
+    def _auto_scan_attachments(self):
+        """Scan the main attachments of several expenses with batched OCR requests.
+        
+        Returns:
+            dict: expense id -> True if processing was successful, False
+                otherwise, None if another request is scanning the receipt:
+                the expense is left unchanged and is to be scanned again later
+        """
+        to_scan = self.filtered('message_main_attachment_id')
+        outcome = {expense.id: False for expense in self - to_scan}
+        if not to_scan:
+            return outcome
+        
+        preprocessed = {}
+        try:
+            results = self._ocr_scan_attachments(to_scan.message_main_attachment_id, preprocessed=preprocessed)
+        except OcrUnavailableError:
+            # Nothing was scanned; the queue defers the jobs until the OCR API is back
+            raise
+        except Exception as e:  # pylint: disable=broad-except
+            _logger.error("Error in batched OCR processing for expenses %s: %s",
+                          to_scan.ids, str(e), exc_info=True)
+            results = {}
+        
+        # The outcomes are written once the results are all mapped: one write per expense
+        values, notes, learned = {}, {}, {}
+        for expense in to_scan:
+            attachment = expense.message_main_attachment_id
+            if attachment.id in results and results[attachment.id] is None:
+                outcome[expense.id] = None
+                continue
+            vals, note, outcome[expense.id] = expense._prepare_auto_scan(
+                attachment, ocr_result=results.get(attachment.id) or False, learned=learned)
+            sizes, dropped_note = preprocessed.get(attachment.id, ({}, None))
+            values[expense.id] = dict(vals, **sizes)
+            notes[expense.id] = ' '.join(filter(None, (note, dropped_note))) or None
+        to_scan._write_ocr_values(values, notes, learned)
+        return outcome
     
     @api.model_create_multi
     def create(self, vals_list):
-        """Override create to trigger OCR processing on creation if attachment exists."""
+        """Override create to queue OCR processing on creation if attachment exists."""
         expenses = super(HrExpense, self).create(vals_list)
         
-        for expense in expenses:
-            # Check if there's an attachment and auto-scan it
-            if hasattr(expense, 'message_main_attachment_id') and expense.message_main_attachment_id:
-                _logger.info("New expense %s created with attachment, triggering OCR scan", expense.id)
-                expense.auto_scan_attachment(expense.message_main_attachment_id)
+        # Only enqueue here: the scheduled OCR worker calls the API, so creating
+        # expenses never waits on the OCR service
+        to_scan = expenses.filtered('message_main_attachment_id')
+        if to_scan:
+            _logger.info("New expenses %s created with attachment, queuing OCR scan", to_scan.ids)
+            self.env['hr.expense.ocr.job']._enqueue(to_scan)
             
         return expenses
     
     def write(self, vals):
-        """Override write to trigger OCR processing when main attachment changes."""
+        """Override write to queue OCR processing when main attachment changes."""
         result = super(HrExpense, self).write(vals)
         
-        # If the main attachment was updated, process it with OCR
+        # If the main attachment was updated, queue it for OCR
         if 'message_main_attachment_id' in vals:
-            for expense in self:
-                if hasattr(expense, 'message_main_attachment_id') and expense.message_main_attachment_id:
-                    _logger.info("Main attachment updated for expense %s, triggering OCR scan", expense.id)
-                    expense.auto_scan_attachment(expense.message_main_attachment_id)
+            to_scan = self.filtered('message_main_attachment_id')
+            if to_scan:
+                _logger.info("Main attachment updated for expenses %s, queuing OCR scan", to_scan.ids)
+                self.env['hr.expense.ocr.job']._enqueue(to_scan)
         
         return result
     
@@ -136,18 +441,45 @@ class HrExpense(models.Model):
             bool: True if successful
         """
         self.ensure_one()
+        learned = {}
+        vals, note, success = self._prepare_ocr_result(ocr_data, learned=learned)
+        self._write_ocr_values({self.id: vals}, {self.id: note} if note else None, learned)
+        return success
+    
+    def _prepare_ocr_result(self, ocr_data, learned=None):
+        """
+        Return the expense values of OCR result data, without writing them.
+        
+        The vendor profile is not updated either: what the receipt showed is
+        added to learned, for _write_ocr_values() to update the profile once
+        the values are written.
+        
+        Args:
+            ocr_data (dict): Dictionary containing OCR extracted data
+            learned (dict): filled with expense id -> (vendor profile, arguments
+                of its _learn())
+        
+        Returns:
+            tuple: (vals, note, success) with the values to write on the expense,
+                the chatter note to post (or None) and whether data was extracted
+        """
+        self.ensure_one()
         
-        _logger.info("Updating expense %s with OCR result: %s", self.id, ocr_data)
+        _logger.debug("Updating expense %s with OCR result: %s", self.id, payload(ocr_data))
         
         # Check if OCR data contains an error
         if ocr_data and 'error' in ocr_data:
             error_message = ocr_data.get('error')
             _logger.error("OCR processing failed for expense %s: %s", self.id, error_message)
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': _("OCR processing failed to extract data from the receipt. %s") % error_message[:2048]
-            })
-            return False
+            return self._ocr_failure_values(
+                _("OCR processing failed to extract data from the receipt. %s") % error_message[:2048])
+        
+        # Engine that read the receipt and the total it read, for its accuracy statistics
+        ocr_vals = {
+            'ocr_engine': isinstance(ocr_data, dict) and ocr_data.get('engine') or False,
+            'ocr_total_amount': 0.0,
+            'ocr_accuracy_checked': False,
+        }
         
         # Check if we have the new format (with 'output' field)
         if isinstance(ocr_data, dict) and 'output' in ocr_data:
@@ -156,166 +488,56 @@ class HrExpense(models.Model):
         
         if not ocr_data or not isinstance(ocr_data, dict):
             _logger.warning("Invalid OCR data format for expense %s", self.id)
-            self.write({
-                'ocr_status': 'failed',
-                'ocr_message': _("Invalid OCR data format received.")[:2048]
-            })
-            return False
-            
-        vals = {}
+            return self._ocr_failure_values(_("Invalid OCR data format received."))
         
-        # Extract business name
-        if ocr_data.get('business_name'):
-            vals['business_name'] = ocr_data.get('business_name')[:64]
-        elif ocr_data.get('vendor'):
-            vals['business_name'] = ocr_data.get('vendor')[:64]
-            
-        # Extract receipt number
-        if ocr_data.get('receipt_number'):
-            vals['receipt_number'] = ocr_data.get('receipt_number')[:32]
-            
-        # Extract total amount
-        total_amount = None
-        if ocr_data.get('total_amount'):
-            total_amount = ocr_data.get('total_amount')
-        elif ocr_data.get('total'):
-            total_amount = ocr_data.get('total')
-            
-        if total_amount:
-            # Convert to float if it's a string
-            if isinstance(total_amount, str):
-                try:
-                    total_amount = float(total_amount.replace(',', ''))
-                except (ValueError, TypeError):
-                    _logger.warning("Could not convert total amount '%s' to float for expense %s", 
-                                   total_amount, self.id)
-            vals['total_amount_currency'] = total_amount
-            
-        # Extract tax amount
-        tax_amount = None
-        if ocr_data.get('tax_amount'):
-            tax_amount = ocr_data.get('tax_amount')
-        elif ocr_data.get('tax'):
-            tax_amount = ocr_data.get('tax')
-            
-        if tax_amount:
-            # Convert to float if it's a string
-            if isinstance(tax_amount, str):
-                try:
-                    tax_amount = float(tax_amount.replace(',', ''))
-                    _logger.info("Extracted tax amount %s for expense %s", tax_amount, self.id)
-                except (ValueError, TypeError):
-                    _logger.warning("Could not convert tax amount '%s' to float for expense %s", 
-                                   tax_amount, self.id)
-            
-            # Update the tax_amount_currency field with the extracted tax amount
-            vals['tax_amount_currency'] = tax_amount
-            _logger.info("Updated tax_amount_currency to %s for expense %s", tax_amount, self.id)
-        
-        # Extract date
-        expense_date = None
-        if ocr_data.get('date'):
-            date_str = ocr_data.get('date')
-            _logger.info("Attempting to parse date from OCR data: %s", date_str)
-            try:
-                # Try different date formats
-                for fmt in ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', 
-                           '%m/%d/%Y %I:%M %p', '%d/%m/%Y %H:%M', '%Y-%m-%dT%H:%M:%S',
-                           '%B %d, %Y', '%d %B %Y']:
-                    try:
-                        expense_date = datetime.strptime(date_str, fmt).date()
-                        _logger.info("Successfully parsed date '%s' with format '%s'", date_str, fmt)
-                        break
-                    except ValueError:
-                        continue
-                    
-                if expense_date:
-                    vals['date'] = expense_date
-                    _logger.info("Set expense date to %s", expense_date)
-                else:
-                    _logger.warning("Could not parse date '%s' with any known format", date_str)
-            except (ValueError, TypeError) as e:
-                _logger.warning("Could not parse date '%s' for expense %s: %s", 
-                               date_str, self.id, str(e))
-                
-        # Extract description from line items if available
-        if ocr_data.get('items') and isinstance(ocr_data.get('items'), list):
-            items = ocr_data.get('items')
-            _logger.info("Found %d line items in OCR result for expense %s", len(items), self.id)
-            
-            # Use the first item description as the expense name if not set
-            if items and self.env['hr.expense']._fields.get('name') and hasattr(self, 'name') and not self.name:
-                first_item = items[0]
-                if first_item.get('description'):
-                    vals['name'] = first_item.get('description')
-        elif ocr_data.get('description') and self.env['hr.expense']._fields.get('name') and hasattr(self, 'name') and not self.name:
-            vals['name'] = ocr_data.get('description')
-        
-        # Set description based on receipt_description if available
-        if ocr_data.get('receipt_description'):
-            vals['name'] = ocr_data.get('receipt_description')
-            _logger.info("Setting expense description from receipt_description: %s", ocr_data.get('receipt_description'))
+        # Raw payload, queryable in SQL, see hr_expense_ocr_common/models/hr_expense.py
+        ocr_vals['ocr_payload'] = ocr_data
+            
+        # Receipts of a known vendor are parsed with what its previous receipts showed
+        vendor = ocr_data.get('business_name') or ocr_data.get('vendor')
+        vendor = vendor if isinstance(vendor, str) else None
+        profile = self.env['hr.expense.ocr.vendor.profile'].sudo()._lookup(vendor, self.company_id.id)
+        hints = profile._get_hints()
+        
+        # Map the OCR output to expense values, see hr_expense_ocr_common/services/extraction.py
+        vals, category_name, item_lines = extract_ocr_values(
+            ocr_data, has_name=bool('name' in self._fields and self.name), profile=hints)
+        if isinstance(vals.get('total_amount_currency'), (int, float)):
+            ocr_vals['ocr_total_amount'] = vals['total_amount_currency']
+        # Receipt items, searchable, see hr_expense_ocr_common/models/hr_expense_receipt_line.py
+        ocr_vals['receipt_line_ids'] = receipt_line_values(
+            ocr_data.get('items'), hints.get('decimal_separator') or '.')
+        
+        product = note = None
+        known_product = profile._get_product(category_name) if category_name else None
+        if known_product and self.env['hr.expense']._fields.get('product_id'):
+            # The vendor's category code resolved to this expense category before
+            product = known_product.with_env(self.env)
+            vals['product_id'] = product.id
+            _logger.info("Set expense category to product %s (ID: %s) from the profile of vendor '%s'",
+                         product.name, product.id, vendor)
+            note = _("OCR Processing: Expense category set to '%s' based on receipt category '%s'.") % (
+                product.name, category_name)
         
         # Set expense category based on receipt_category if available
-        if ocr_data.get('receipt_category') and self.env['hr.expense']._fields.get('product_id'):
-            category_name = ocr_data.get('receipt_category')
+        elif category_name and self.env['hr.expense']._fields.get('product_id'):
             _logger.info("Looking for expense category matching: %s", category_name)
             
-            # Get available expense categories
-            available_products = self.env['product.product'].search([
-                ('can_be_expensed', '=', True)
-            ])
-            
-            if not available_products:
-                _logger.warning("No expense categories (expensable products) found in the system")
-            
-            # Normalize the category name for better matching
-            normalized_category = category_name
-            if isinstance(normalized_category, str):
-                normalized_category = normalized_category.strip().upper()
-            
-            # Try to find a matching product using multiple methods
-            methods = [
-                # Method 1: Exact match on default_code
-                lambda: self.env['product.product'].search([
-                    ('default_code', '=', category_name),
-                    ('can_be_expensed', '=', True)
-                ], limit=1),
-                
-                # Method 2: Case-insensitive match on default_code
-                lambda: self.env['product.product'].search([
-                    ('default_code', 'ilike', category_name),
-                    ('can_be_expensed', '=', True)
-                ], limit=1),
-                
-                # Method 3: Match on name
-                lambda: self.env['product.product'].search([
-                    ('name', 'ilike', category_name),
-                    ('can_be_expensed', '=', True)
-                ], limit=1),
-                
-                # Method 4: Manual comparison with normalized values
-                lambda: self._find_product_by_normalized_code(available_products, normalized_category)
-            ]
-            
-            # Try each method in sequence
-            product = None
-            for method in methods:
-                product = method()
-                if product:
-                    break
+            # Zero-query lookup in the expense category index, see product_product.py
+            product = self.env['product.product']._find_expense_category(category_name)
             
             if product:
                 vals['product_id'] = product.id
                 _logger.info("Set expense category to product: %s (ID: %s)", product.name, product.id)
                 
                 # Add a note in the chatter about the OCR processing
-                if hasattr(self, 'message_post'):
-                    note = _("OCR Processing: Expense category set to '%s' based on receipt category '%s'.") % (
-                        product.name, category_name)
-                    self.message_post(body=note)
+                note = _("OCR Processing: Expense category set to '%s' based on receipt category '%s'.") % (
+                    product.name, category_name)
             else:
                 _logger.info("No matching expense category found for: '%s'", category_name)
+        
+        if vendor and learned is not None:
+            learned[self.id] = (profile, (vendor, self.company_id.id, hints, category_name, product))
             
         # If no description was set from OCR data, use the filename of the attachment
         if not vals.get('name') and hasattr(self, 'message_main_attachment_id') and self.message_main_attachment_id:
@@ -351,32 +573,9 @@ class HrExpense(models.Model):
                 ocr_message_parts.append("\n".join(details))
             
             # Add itemized details if available
-            if ocr_data.get('items') and isinstance(ocr_data.get('items'), list):
-                items = ocr_data.get('items')
-                if items:
-                    ocr_message_parts.append("📋 %s:" % _("Items"))
-                    
-                    item_lines = []
-                    
-                    for item in items:
-                        item_desc = item.get('description', '')
-                        item_qty = item.get('quantity', '')
-                        item_amount = item.get('amount', '')
-                        
-                        # Format each item line
-                        item_parts = []
-                        if item_qty:
-                            item_parts.append(str(item_qty) + "×")
-                        if item_desc:
-                            item_parts.append(item_desc)
-                        if item_amount:
-                            item_parts.append("(" + str(item_amount) + ")")
-                        
-                        if item_parts:
-                            item_lines.append("  • " + " ".join(item_parts))
-                    
-                    if item_lines:
-                        ocr_message_parts.append("\n".join(item_lines))
+            if item_lines:
+                ocr_message_parts.append("📋 %s:" % _("Items"))
+                ocr_message_parts.append("\n".join(item_lines))
             
             # Set the OCR message with all the details - use a larger field if available
             vals['ocr_status'] = 'processed'
@@ -394,25 +593,34 @@ class HrExpense(models.Model):
                 if len(full_message) > 2048:
                     _logger.info("OCR message truncated from %d to 2048 characters", len(full_message))
             
-            self.write(vals)
             _logger.info("Updated expense %s with OCR data", self.id)
-        else:
-            self.write({
-                'ocr_status': 'processed',
-                'ocr_message': _("Receipt processed but no useful data was extracted.")[:2048]
-            })
-            _logger.warning("No useful data extracted from OCR for expense %s", self.id)
-            
-        return True
+            return dict(vals, **ocr_vals), note, True
+        
+        _logger.warning("No useful data extracted from OCR for expense %s", self.id)
+        return dict(ocr_vals, **{
+            'ocr_status': 'processed',
+            'ocr_message': _("Receipt processed but no useful data was extracted.")[:2048]
+        }), note, True
     
-    def _find_product_by_normalized_code(self, products, normalized_code):
-        """Manual search for a product by normalized default code."""
-        for product in products:
-            if product.default_code:
-                normalized_product_code = product.default_code.strip().upper()
-                if normalized_product_code == normalized_code:
-                    return product
-        return None
+    def _record_ocr_accuracy(self):
+        """Compare the submitted totals with the totals read by the OCR engines.
+        
+        Each expense counts once, the first time it is submitted: the total the
+        employee kept is taken as the right one.
+        """
+        to_check = self.filtered(lambda e: e.ocr_engine and e.ocr_total_amount and not e.ocr_accuracy_checked)
+        if not to_check:
+            return
+        counts = defaultdict(lambda: [0, 0])
+        for expense in to_check:
+            count = counts[(expense.ocr_engine, expense.company_id.id)]
+            count[0] += 1
+            if expense.currency_id.compare_amounts(expense.total_amount_currency, expense.ocr_total_amount) == 0:
+                count[1] += 1
+        Stat = self.env['hr.expense.ocr.engine.stat']
+        for (engine, company_id), (checked, correct) in counts.items():
+            Stat._record_check(engine, company_id, checked, correct)
+        to_check.sudo().write({'ocr_accuracy_checked': True})
     
     def action_scan_receipt(self):
         """Manual action to scan receipt attachment."""
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Resumable bulk OCR scans of existing expenses.
+
+A backfill selects expenses with a domain and scans them in id order, in
+waves of chunks fanned out over a bounded thread pool where each worker has
+its own cursor. The highest expense id of every completed wave is saved as a
+checkpoint, so an interrupted backfill resumes where it stopped.
+
+With ``async_requests``, a wave is scanned from the backfill's own thread by
+the asyncio OCR client instead, with ``workers`` concurrent requests.
+"""
+import ast
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from odoo import models, fields, api, _
+from odoo.exceptions import ValidationError
+
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Advisory lock key space of running backfills ('OCRF')
+LOCK_NAMESPACE = 0x4f435246
+DEFAULT_DOMAIN = "[('ocr_status', 'in', [False, 'failed']), ('message_main_attachment_id', '!=', False)]"
+# Longest pause of a worker waiting for the OCR API to accept calls again
+MAX_UNAVAILABLE_WAIT = 300
+# Attempts at a chunk while the OCR API keeps being unavailable
+MAX_UNAVAILABLE_ATTEMPTS = 5
+# Seconds a backfill runs in one scheduled action call before handing over
+CRON_MAX_DURATION = 600
+
+
+class HrExpenseOcrBackfill(models.Model):
+    _name = 'hr.expense.ocr.backfill'
+    _description = 'Expense Receipt OCR Backfill'
+    _order = 'id desc'
+
+    name = fields.Char(string='Name', required=True, default=lambda self: _('OCR Backfill'))
+    domain = fields.Char(string='Expenses', required=True, default=DEFAULT_DOMAIN,
+                         help="Domain selecting the expenses to scan")
+    state = fields.Selection([
+        ('draft', 'Draft'),
+        ('running', 'Running'),
+        ('paused', 'Paused'),
+        ('done', 'Done'),
+    ], string='State', default='draft', required=True, copy=False)
+    workers = fields.Integer(string='Workers', default=4,
+                             help="Number of chunks scanned in parallel, each with its own database cursor")
+    async_requests = fields.Boolean(string='Concurrent Requests',
+                                    help="Scan each wave from a single thread with concurrent asynchronous "
+                                         "OCR requests (one per receipt, 'Workers' at a time) instead of "
+                                         "a pool of threads")
+    chunk_size = fields.Integer(string='Chunk Size', default=5,
+                                help="Expenses scanned together by a worker, i.e. per batched OCR request")
+    last_expense_id = fields.Integer(string='Checkpoint', readonly=True, copy=False,
+                                     help="Highest expense id of the last completed wave; "
+                                          "the backfill resumes after it")
+    total_count = fields.Integer(string='Expenses to Scan', readonly=True, copy=False)
+    done_count = fields.Integer(string='Scanned', readonly=True, copy=False)
+    failed_count = fields.Integer(string='Failed', readonly=True, copy=False)
+    duration = fields.Float(string='Running Time (s)', readonly=True, copy=False)
+    throughput = fields.Float(string='Receipts per Minute', compute='_compute_throughput', digits=(16, 1))
+    progress = fields.Float(string='Progress', compute='_compute_throughput')
+    date_started = fields.Datetime(string='Started On', readonly=True, copy=False)
+    date_done = fields.Datetime(string='Finished On', readonly=True, copy=False)
+
+    @api.depends('done_count', 'failed_count', 'duration', 'total_count')
+    def _compute_throughput(self):
+        for backfill in self:
+            processed = backfill.done_count + backfill.failed_count
+            backfill.throughput = processed * 60.0 / backfill.duration if backfill.duration else 0.0
+            backfill.progress = processed * 100.0 / backfill.total_count if backfill.total_count else 0.0
+
+    @api.constrains('domain', 'workers', 'chunk_size')
+    def _check_settings(self):
+        for backfill in self:
+            if backfill.workers < 1 or backfill.chunk_size < 1:
+                raise ValidationError(_("A backfill needs at least one worker and one expense per chunk."))
+            backfill._get_domain()
+
+    def _get_domain(self):
+        self.ensure_one()
+        try:
+            domain = ast.literal_eval(self.domain or '[]')
+        except (ValueError, SyntaxError) as e:
+            raise ValidationError(_("Invalid expense domain: %s") % str(e)) from e
+        if not isinstance(domain, list):
+            raise ValidationError(_("The expense domain must be a list."))
+        return domain
+
+    def _get_remaining_domain(self):
+        return self._get_domain() + [('id', '>', self.last_expense_id)]
+
+    def action_start(self):
+        """Start or resume the backfills in the background."""
+        self._mark_running()
+        self.env.ref('hr_expense_claim_auto_scan.ir_cron_run_ocr_backfill')._trigger()
+        return True
+
+    def _mark_running(self):
+        for backfill in self:
+            vals = {'state': 'running'}
+            if not backfill.date_started:
+                vals['date_started'] = fields.Datetime.now()
+            if backfill.state == 'draft':
+                vals['total_count'] = self.env['hr.expense'].search_count(backfill._get_domain())
+            backfill.write(vals)
+
+    def action_pause(self):
+        """Stop the backfills after their current wave; they can be resumed later."""
+        self.filtered(lambda b: b.state == 'running').write({'state': 'paused'})
+        return True
+
+    @api.model
+    def _cron_run(self):
+        """Scheduled action advancing the running backfills.
+
+        Each call runs for a bounded time and triggers itself again while work
+        remains, so a backfill survives worker restarts and cron time limits.
+        """
+        for backfill in self.search([('state', '=', 'running')]):
+            backfill._run(max_duration=CRON_MAX_DURATION)
+        if self.search_count([('state', '=', 'running')], limit=1):
+            self.env.ref('hr_expense_claim_auto_scan.ir_cron_run_ocr_backfill')._trigger()
+
+    def _run(self, max_duration=None):
+        """Scan the remaining expenses of the backfill, wave after wave.
+
+        Each wave is at most ``workers`` chunks of ``chunk_size`` expenses,
+        scanned in parallel. Progress and the checkpoint are committed after
+        every wave.
+
+        Args:
+            max_duration (float): seconds after which to stop after the current
+                wave, None to run until done or paused
+
+        Returns:
+            int: number of expenses processed by this call
+        """
+        self.ensure_one()
+        # Only one process runs a given backfill (the scheduled action or the command line)
+        self.env.cr.execute("SELECT pg_try_advisory_lock(%s, %s)", (LOCK_NAMESPACE, self.id))
+        if not self.env.cr.fetchone()[0]:
+            _logger.info("OCR backfill %s is already being run by another process", self.id)
+            return 0
+        try:
+            return self._run_waves(max_duration)
+        finally:
+            self.env.cr.execute("SELECT pg_advisory_unlock(%s, %s)", (LOCK_NAMESPACE, self.id))
+
+    def _run_waves(self, max_duration):
+        testing = getattr(threading.current_thread(), 'testing', False)
+        started = time.monotonic()
+        processed = 0
+        _logger.info("Running OCR backfill %s (%s) from expense id %s with %d worker(s)",
+                     self.id, self.name, self.last_expense_id, self.workers)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-backfill') as pool:
+            while True:
+                self.invalidate_recordset(['state'])
+                if self.state != 'running':
+                    _logger.info("OCR backfill %s is %s, stopping", self.id, self.state)
+                    break
+                expense_ids = self.env['hr.expense'].search(
+                    self._get_remaining_domain(), order='id', limit=self.workers * self.chunk_size).ids
+                if not expense_ids:
+                    self.write({'state': 'done', 'date_done': fields.Datetime.now()})
+                    break
+
+                wave_started = time.monotonic()
+                chunks = [expense_ids[i:i + self.chunk_size]
+                          for i in range(0, len(expense_ids), self.chunk_size)]
+                if self.async_requests:
+                    results = [self.with_context(ocr_concurrency=self.workers)._scan_chunk(expense_ids)]
+                elif testing:
+                    # Tests run in a single transaction: scan with the test cursor
+                    results = [self._scan_chunk(chunk) for chunk in chunks]
+                else:
+                    results = list(pool.map(self._scan_chunk_in_worker, chunks))
+
+                succeeded = sum(result[0] for result in results)
+                failed = sum(result[1] for result in results)
+                processed += succeeded + failed
+                self.write({
+                    'last_expense_id': expense_ids[-1],
+                    'done_count': self.done_count + succeeded,
+                    'failed_count': self.failed_count + failed,
+                    'duration': self.duration + time.monotonic() - wave_started,
+                })
+                if not testing:
+                    self.env.cr.commit()
+                _logger.info("OCR backfill %s: %d/%d expenses, %d failed, %.1f receipts per minute",
+                             self.id, self.done_count + self.failed_count, self.total_count,
+                             self.failed_count, self.throughput)
+
+                if max_duration and time.monotonic() - started >= max_duration:
+                    break
+        return processed
+
+    def _scan_chunk_in_worker(self, expense_ids):
+        """Scan a chunk in a pool thread, with a cursor of its own."""
+        threading.current_thread().dbname = self.env.cr.dbname
+        with self.env.registry.cursor() as cr:
+            env = api.Environment(cr, self.env.uid, self.env.context)
+            return self.with_env(env)._scan_chunk(expense_ids)
+
+    def _scan_chunk(self, expense_ids):
+        """Scan a chunk of expenses with batched OCR requests, per company.
+
+        While the OCR API is unavailable (circuit breaker open, quota used up),
+        the worker waits for it rather than marking the receipts as failed.
+
+        Returns:
+            tuple: (number of successful scans, number of failed scans)
+        """
+        expenses = self.env['hr.expense'].browse(expense_ids).exists()
+        succeeded = failed = 0
+        for company in expenses.company_id:
+            company_expenses = expenses.filtered(lambda e: e.company_id == company).with_company(company)
+            for attempt in range(1, MAX_UNAVAILABLE_ATTEMPTS + 1):
+                try:
+                    outcome = company_expenses._auto_scan_attachments()
+                    break
+                except OcrUnavailableError as e:
+                    if attempt == MAX_UNAVAILABLE_ATTEMPTS:
+                        _logger.error("OCR backfill %s: OCR API still unavailable, giving up on expenses %s",
+                                      self.id, company_expenses.ids)
+                        outcome = {expense.id: False for expense in company_expenses}
+                        break
+                    wait = MAX_UNAVAILABLE_WAIT
+                    if e.retry_at:
+                        wait = min(max((e.retry_at - fields.Datetime.now()).total_seconds(), 1),
+                                   MAX_UNAVAILABLE_WAIT)
+                    _logger.info("OCR backfill %s: OCR API unavailable, waiting %.0f seconds: %s",
+                                 self.id, wait, str(e))
+                    time.sleep(wait)
+            in_flight = [expense_id for expense_id, ok in outcome.items() if ok is None]
+            if in_flight:
+                # Scanned by another request meanwhile: the OCR queue reads the result from the cache
+                self.env['hr.expense.ocr.job']._enqueue(self.env['hr.expense'].browse(in_flight))
+            # Expenses handed to the queue are done as far as the backfill is concerned
+            succeeded += len([ok for ok in outcome.values() if ok is not False])
+            failed += len([ok for ok in outcome.values() if ok is False])
+        return succeeded, failed
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of OCR results.
+
+Entries are keyed by the attachment checksum and the OCR API URL, so the same
+receipt uploaded on several expenses is only sent to the OCR service once.
+"""
+import json
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_MAX_ENTRIES = 10000
+
+
+class HrExpenseOcrCache(models.Model):
+    _name = 'hr.expense.ocr.cache'
+    _description = 'Expense Receipt OCR Result Cache'
+    _order = 'last_hit_date desc, id desc'
+    _rec_name = 'checksum'
+
+    checksum = fields.Char(string='Checksum', required=True, index=True, readonly=True,
+                           help="SHA1 checksum of the scanned attachment")
+    api_url = fields.Char(string='OCR API URL', required=True, readonly=True)
+    result = fields.Text(string='OCR Result', readonly=True, help="Normalized OCR result as JSON")
+    result_size = fields.Integer(string='Size (bytes)', readonly=True)
+    hit_count = fields.Integer(string='Hits', readonly=True, aggregator='sum')
+    miss_count = fields.Integer(string='Misses', readonly=True, aggregator='sum')
+    last_hit_date = fields.Datetime(string='Last Used', readonly=True)
+
+    _sql_constraints = [
+        ('checksum_api_url_uniq', 'unique(checksum, api_url)',
+         'Only one cached OCR result per attachment content and OCR API is allowed!'),
+    ]
+
+    @api.model
+    def _get_ttl(self):
+        """Return the lifetime of a cache entry as a timedelta."""
+        days = self.env['ir.config_parameter']._get_ocr_config()['cache_ttl_days']
+        return timedelta(days=days)
+
+    @api.model
+    def _lookup(self, checksum, api_url):
+        """Return the cached OCR result for an attachment checksum, if any.
+
+        Args:
+            checksum (str): ir.attachment checksum
+            api_url (str): OCR API the result was obtained from
+
+        Returns:
+            dict: the cached OCR result, or None on a miss
+        """
+        if not checksum or not api_url:
+            return None
+
+        self.env.cr.execute("""
+            UPDATE hr_expense_ocr_cache
+               SET hit_count = hit_count + 1,
+                   last_hit_date = (now() AT TIME ZONE 'UTC')
+             WHERE checksum = %s AND api_url = %s
+               AND write_date >= %s
+         RETURNING result
+        """, (checksum, api_url, fields.Datetime.now() - self._get_ttl()))
+        row = self.env.cr.fetchone()
+        if not row or not row[0]:
+            _logger.debug("OCR cache miss for checksum %s", checksum)
+            return None
+
+        try:
+            result = json.loads(row[0])
+        except ValueError:
+            _logger.warning("Discarding unreadable OCR cache entry for checksum %s", checksum)
+            return None
+        _logger.info("OCR cache hit for checksum %s", checksum)
+        return result
+
+    @api.model
+    def _store(self, checksum, api_url, result):
+        """Cache a successful OCR result.
+
+        Args:
+            checksum (str): ir.attachment checksum
+            api_url (str): OCR API the result was obtained from
+            result (dict): normalized OCR result
+        """
+        if not checksum or not api_url or not isinstance(result, dict) or 'error' in result:
+            return
+
+        payload = json.dumps(result)
+        self.env.cr.execute("""
+            INSERT INTO hr_expense_ocr_cache
+                   (checksum, api_url, result, result_size, hit_count, miss_count,
+                    create_uid, write_uid, create_date, write_date)
+            VALUES (%s, %s, %s, %s, 0, 1, %s, %s,
+                    (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+       ON CONFLICT (checksum, api_url) DO UPDATE
+               SET result = EXCLUDED.result,
+                   result_size = EXCLUDED.result_size,
+                   miss_count = hr_expense_ocr_cache.miss_count + 1,
+                   write_uid = EXCLUDED.write_uid,
+                   write_date = EXCLUDED.write_date
+        """, (checksum, api_url, payload, len(payload.encode()), self.env.uid, self.env.uid))
+        _logger.debug("Stored OCR result for checksum %s in cache", checksum)
+
+    @api.model
+    def _cron_evict(self):
+        """Drop expired entries and keep the cache under its configured size."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        try:
+            max_entries = int(ICP.get_param('ocr_cache_max_entries', DEFAULT_MAX_ENTRIES))
+        except (ValueError, TypeError):
+            max_entries = DEFAULT_MAX_ENTRIES
+
+        self.env.cr.execute("""
+            DELETE FROM hr_expense_ocr_cache WHERE write_date < %s
+        """, (fields.Datetime.now() - self._get_ttl(),))
+        expired = self.env.cr.rowcount
+
+        # Least recently used entries go first when the cache is full
+        self.env.cr.execute("""
+            DELETE FROM hr_expense_ocr_cache
+             WHERE id IN (
+                SELECT id FROM hr_expense_ocr_cache
+              ORDER BY COALESCE(last_hit_date, write_date) DESC, id DESC
+                OFFSET %s
+             )
+        """, (max_entries,))
+        evicted = self.env.cr.rowcount
+
+        _logger.info("OCR cache eviction removed %d expired and %d excess entries", expired, evicted)
+        self.invalidate_model()
+        return expired + evicted
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+Latency and accuracy statistics of the OCR engines, per company.
+
+Each process adds up its counters in memory and writes them at most every
+FLUSH_INTERVAL seconds, in a short transaction of its own, so scans neither
+open a connection nor queue on the same row to count themselves. Accuracy
+is measured when expenses are submitted: an extracted total the employee
+kept counts as correct.
+"""
+import threading
+import time
+
+from odoo import models, fields, api
+
+from odoo.addons.hr_expense_ocr_common.services.db import state_cursor
+from odoo.addons.structured_logging import get_logger
+
+from ..services import engines
+
+_logger = get_logger(__name__)
+
+COUNTERS = ('receipt_count', 'extracted_count', 'unavailable_count', 'total_latency',
+            'checked_count', 'correct_count')
+# Seconds the counters of a process are added up before they are written
+FLUSH_INTERVAL = 60
+
+# Counters not written yet: (database, engine, company id) -> counter values
+_pending = {}
+# database -> time.monotonic() of the last write
+_flushed_at = {}
+_pending_lock = threading.Lock()
+
+
+class HrExpenseOcrEngineStat(models.Model):
+    _name = 'hr.expense.ocr.engine.stat'
+    _description = 'OCR Engine Statistics'
+    _order = 'company_id, engine'
+    _rec_name = 'engine'
+
+    engine = fields.Selection(selection='_get_engine_selection', string='Engine', required=True, readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True,
+                                 ondelete='cascade')
+    receipt_count = fields.Integer(string='Receipts', readonly=True, aggregator='sum')
+    extracted_count = fields.Integer(string='Extracted', readonly=True, aggregator='sum',
+                                     help="Receipts the engine returned data for")
+    unavailable_count = fields.Integer(string='Unavailable', readonly=True, aggregator='sum',
+                                       help="Scans the engine refused, e.g. while its circuit breaker was open")
+    total_latency = fields.Float(string='Total Time (s)', readonly=True, aggregator='sum')
+    avg_latency = fields.Float(string='Time per Receipt (ms)', compute='_compute_rates', digits=(16, 0))
+    extraction_rate = fields.Float(string='Extraction Rate', compute='_compute_rates')
+    checked_count = fields.Integer(string='Checked', readonly=True, aggregator='sum',
+                                   help="Submitted expenses whose total was extracted by the engine")
+    correct_count = fields.Integer(string='Correct', readonly=True, aggregator='sum',
+                                   help="Submitted expenses whose extracted total was kept")
+    accuracy = fields.Float(string='Accuracy', compute='_compute_rates')
+
+    _sql_constraints = [
+        ('engine_company_uniq', 'unique(engine, company_id)', 'Only one statistics record per engine and company!'),
+    ]
+
+    @api.model
+    def _get_engine_selection(self):
+        return [(name, engine.label) for name, engine in engines.get_engines().items()]
+
+    @api.depends('receipt_count', 'extracted_count', 'total_latency', 'checked_count', 'correct_count')
+    def _compute_rates(self):
+        for stat in self:
+            stat.avg_latency = stat.total_latency * 1000.0 / stat.receipt_count if stat.receipt_count else 0.0
+            stat.extraction_rate = stat.extracted_count / stat.receipt_count if stat.receipt_count else 0.0
+            stat.accuracy = stat.correct_count / stat.checked_count if stat.checked_count else 0.0
+
+    @api.model
+    def _increment(self, engine, company_id, **counters):
+        dbname = self.env.cr.dbname
+        with _pending_lock:
+            values = _pending.setdefault((dbname, engine, company_id), dict.fromkeys(COUNTERS, 0))
+            for column in COUNTERS:
+                values[column] += counters.get(column, 0)
+            due = time.monotonic() - _flushed_at.setdefault(dbname, time.monotonic()) >= FLUSH_INTERVAL
+        if due:
+            self._flush()
+
+    @api.model
+    def _flush(self):
+        """Write the counters this process added up for the database."""
+        dbname = self.env.cr.dbname
+        with _pending_lock:
+            rows = [(key[1], key[2], _pending.pop(key)) for key in list(_pending) if key[0] == dbname]
+            _flushed_at[dbname] = time.monotonic()
+        if not rows:
+            return
+        try:
+            with state_cursor(self.env) as cr:
+                for engine, company_id, values in rows:
+                    cr.execute("""
+                        INSERT INTO hr_expense_ocr_engine_stat
+                               (engine, company_id, receipt_count, extracted_count, unavailable_count,
+                                total_latency, checked_count, correct_count,
+                                create_uid, write_uid, create_date, write_date)
+                        VALUES (%(engine)s, %(company)s, %(receipt_count)s, %(extracted_count)s,
+                                %(unavailable_count)s, %(total_latency)s, %(checked_count)s, %(correct_count)s,
+                                %(uid)s, %(uid)s, (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+                   ON CONFLICT (engine, company_id) DO UPDATE
+                           SET receipt_count = hr_expense_ocr_engine_stat.receipt_count + EXCLUDED.receipt_count,
+                               extracted_count = hr_expense_ocr_engine_stat.extracted_count + EXCLUDED.extracted_count,
+                               unavailable_count = hr_expense_ocr_engine_stat.unavailable_count
+                                                   + EXCLUDED.unavailable_count,
+                               total_latency = hr_expense_ocr_engine_stat.total_latency + EXCLUDED.total_latency,
+                               checked_count = hr_expense_ocr_engine_stat.checked_count + EXCLUDED.checked_count,
+                               correct_count = hr_expense_ocr_engine_stat.correct_count + EXCLUDED.correct_count,
+                               write_uid = EXCLUDED.write_uid,
+                               write_date = EXCLUDED.write_date
+                    """, dict(values, engine=engine, company=company_id, uid=self.env.uid))
+        except Exception as e:  # pylint: disable=broad-except
+            # Statistics never fail a scan
+            _logger.warning("Could not write the OCR engine statistics: %s", str(e))
+        self.invalidate_model()
+
+    @api.model
+    def _record_scan(self, engine, company_id, results, latency):
+        """Count the receipts an engine scanned and the time it took.
+
+        Args:
+            engine (str): engine name
+            company_id (int): company the receipts were scanned for
+            results (list): OCR results returned by the engine
+            latency (float): seconds spent by the engine
+        """
+        extracted = len([r for r in results if r and not (isinstance(r, dict) and 'error' in r)])
+        self._increment(engine, company_id, receipt_count=len(results),
+                        extracted_count=extracted, total_latency=latency)
+
+    @api.model
+    def _record_unavailable(self, engine, company_id):
+        """Count a scan an engine refused."""
+        self._increment(engine, company_id, unavailable_count=1)
+
+    @api.model
+    def _record_check(self, engine, company_id, checked, correct):
+        """Count submitted expenses whose total was extracted by an engine.
+
+        Args:
+            engine (str): engine name
+            company_id (int): company of the expenses
+            checked (int): number of expenses
+            correct (int): number of expenses whose extracted total was kept
+        """
+        self._increment(engine, company_id, checked_count=checked, correct_count=correct)
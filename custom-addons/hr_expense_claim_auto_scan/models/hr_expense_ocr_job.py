@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent queue of OCR scans.
+
+``hr.expense`` only enqueues jobs from ``create()`` and ``write()``; the
+scheduled action drains the queue so HTTP workers never wait on the OCR API.
+"""
+import threading
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.structured_logging import get_logger
+from ..services.single_flight import FLIGHT_RETRY_DELAY
+
+_logger = get_logger(__name__)
+
+# Seconds to wait before retrying a failed job, multiplied by the attempt number
+RETRY_DELAY = 60
+# Jobs left in 'running' longer than this are considered orphaned by a dead worker
+STALE_RUNNING_AFTER = timedelta(minutes=15)
+
+
+class HrExpenseOcrJob(models.Model):
+    _name = 'hr.expense.ocr.job'
+    _description = 'Expense Receipt OCR Job'
+    _order = 'priority desc, id'
+
+    expense_id = fields.Many2one('hr.expense', string='Expense', required=True, index=True,
+                                 ondelete='cascade')
+    attachment_id = fields.Many2one('ir.attachment', string='Attachment', ondelete='set null')
+    company_id = fields.Many2one(related='expense_id.company_id', store=True, string='Company')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='State', default='pending', required=True, index=True, copy=False)
+    priority = fields.Integer(string='Priority', default=0,
+                              help="Jobs with a higher priority are claimed first")
+    attempts = fields.Integer(string='Attempts', default=0, copy=False)
+    max_attempts = fields.Integer(string='Max Attempts', default=3)
+    eta = fields.Datetime(string='Not Before', copy=False,
+                          help="The job is not claimed before this date (used for retries)")
+    date_started = fields.Datetime(string='Started On', copy=False, readonly=True)
+    date_done = fields.Datetime(string='Finished On', copy=False, readonly=True)
+    error = fields.Text(string='Last Error', copy=False, readonly=True)
+
+    @api.model
+    def _enqueue(self, expenses, eta=None):
+        """Queue an OCR scan of the main attachment of each expense.
+
+        Expenses that already have a pending job for the same attachment are
+        skipped, so repeated writes do not pile up duplicate scans.
+
+        Args:
+            expenses: hr.expense recordset
+            eta (datetime): date before which the jobs must not run
+
+        Returns:
+            hr.expense.ocr.job: the newly created jobs
+        """
+        expenses = expenses.filtered('message_main_attachment_id')
+        if not expenses:
+            return self.browse()
+
+        existing = self.sudo().search([
+            ('expense_id', 'in', expenses.ids),
+            ('state', '=', 'pending'),
+        ])
+        queued = {(job.expense_id.id, job.attachment_id.id) for job in existing}
+
+        vals_list = []
+        for expense in expenses:
+            key = (expense.id, expense.message_main_attachment_id.id)
+            if key in queued:
+                _logger.debug("OCR scan already queued for expense %s", expense.id)
+                continue
+            queued.add(key)
+            vals_list.append({
+                'expense_id': expense.id,
+                'attachment_id': expense.message_main_attachment_id.id,
+                'eta': eta or False,
+            })
+
+        jobs = self.sudo().create(vals_list)
+        if jobs:
+            jobs.expense_id.write({'ocr_status': 'pending'})
+            _logger.info("Queued %d OCR job(s) for expenses %s", len(jobs), jobs.expense_id.ids)
+            self.env.ref('hr_expense_claim_auto_scan.ir_cron_process_ocr_jobs')._trigger(at=eta or None)
+        return jobs
+
+    @api.model
+    def _claim(self, limit=1):
+        """Lock and mark as running up to ``limit`` jobs that are ready to run.
+
+        ``FOR UPDATE SKIP LOCKED`` lets several cron workers drain the queue
+        concurrently without ever picking the same job twice.
+
+        Args:
+            limit (int): maximum number of jobs to claim
+
+        Returns:
+            hr.expense.ocr.job: the claimed jobs
+        """
+        self.env.cr.execute("""
+            SELECT id FROM hr_expense_ocr_job
+             WHERE state = 'pending'
+               AND (eta IS NULL OR eta <= (now() AT TIME ZONE 'UTC'))
+          ORDER BY priority DESC, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        job_ids = [row[0] for row in self.env.cr.fetchall()]
+        if not job_ids:
+            return self.browse()
+
+        self.env.cr.execute("""
+            UPDATE hr_expense_ocr_job
+               SET state = 'running',
+                   attempts = attempts + 1,
+                   date_started = (now() AT TIME ZONE 'UTC'),
+                   write_date = (now() AT TIME ZONE 'UTC')
+             WHERE id IN %s
+        """, (tuple(job_ids),))
+        jobs = self.browse(job_ids)
+        jobs.invalidate_recordset(['state', 'attempts', 'date_started'])
+        return jobs
+
+    def _run(self):
+        """Scan the attachments of claimed jobs and record the outcome.
+
+        The receipts of the jobs of a company are scanned together, so a batch
+        of jobs costs one OCR API round trip per batch instead of one per
+        receipt, drawn from the OCR quota of that company.
+
+        Returns:
+            dict: job id -> True if the scan succeeded
+        """
+        outcome = {}
+        to_run = self.browse()
+        for job in self:
+            if not job.attachment_id or job.attachment_id != job.expense_id.message_main_attachment_id:
+                # The receipt was replaced or removed after enqueueing; a newer job
+                # (if any) takes care of the current attachment.
+                _logger.info("Skipping OCR job %s: attachment no longer attached to expense %s",
+                             job.id, job.expense_id.id)
+                job.write({'state': 'done', 'date_done': fields.Datetime.now()})
+                outcome[job.id] = True
+            else:
+                to_run |= job
+        if not to_run:
+            return outcome
+
+        scanned, errors = {}, {}
+        # Scan with the company of the expenses, whose OCR quota the calls use
+        for company in to_run.company_id:
+            company_jobs = to_run.filtered(lambda job: job.company_id == company)
+            try:
+                scanned.update(company_jobs.expense_id.with_company(company)._auto_scan_attachments())
+            except OcrUnavailableError as e:
+                company_jobs._defer(e.retry_at, str(e))
+                outcome.update({job.id: False for job in company_jobs})
+                to_run -= company_jobs
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.error("Error running OCR jobs %s: %s", company_jobs.ids, str(e), exc_info=True)
+                errors.update({job.id: str(e) for job in company_jobs})
+
+        in_flight = to_run.filtered(lambda job: job.expense_id.id in scanned
+                                    and scanned[job.expense_id.id] is None)
+        if in_flight:
+            # Another request is scanning the receipts: their next run reads its result from the cache
+            in_flight._defer(fields.Datetime.now() + timedelta(seconds=FLIGHT_RETRY_DELAY),
+                             _("The receipt is being scanned by another request."))
+            outcome.update(dict.fromkeys(in_flight.ids, False))
+            to_run -= in_flight
+
+        for job in to_run:
+            success = scanned.get(job.expense_id.id, False)
+            error = errors.get(job.id) or (
+                not success and (job.expense_id.ocr_message or _("OCR processing failed.")))
+            job._record_outcome(success, error)
+            outcome[job.id] = success
+        return outcome
+
+    def _record_outcome(self, success, error=False):
+        """Mark a job done, or schedule a retry / mark it failed after a failed scan."""
+        self.ensure_one()
+        if success:
+            self.write({'state': 'done', 'date_done': fields.Datetime.now(), 'error': False})
+        elif self.attempts < self.max_attempts:
+            delay = timedelta(seconds=RETRY_DELAY * self.attempts)
+            _logger.warning("OCR job %s failed (attempt %d/%d), retrying in %s",
+                            self.id, self.attempts, self.max_attempts, delay)
+            self.write({'state': 'pending', 'eta': fields.Datetime.now() + delay, 'error': error})
+        else:
+            _logger.error("OCR job %s failed after %d attempts", self.id, self.attempts)
+            self.write({'state': 'failed', 'date_done': fields.Datetime.now(), 'error': error})
+
+    def _defer(self, eta, reason):
+        """Put claimed jobs back in the queue without counting an attempt.
+
+        Used when the OCR API is unavailable or another request is scanning
+        the receipts: the scans did not fail, they were not tried.
+        """
+        eta = eta or fields.Datetime.now() + timedelta(seconds=RETRY_DELAY)
+        _logger.info("Deferring OCR jobs %s until %s: %s", self.ids, eta, reason)
+        for job in self:
+            job.write({
+                'state': 'pending',
+                'attempts': max(job.attempts - 1, 0),
+                'eta': eta,
+                'error': reason,
+            })
+        self.env.ref('hr_expense_claim_auto_scan.ir_cron_process_ocr_jobs')._trigger(at=eta)
+
+    @api.model
+    def _requeue_stale_jobs(self):
+        """Put back in the queue jobs whose worker died while running them."""
+        stale = self.search([
+            ('state', '=', 'running'),
+            ('date_started', '<', fields.Datetime.now() - STALE_RUNNING_AFTER),
+        ])
+        if stale:
+            _logger.warning("Requeuing %d stale OCR job(s): %s", len(stale), stale.ids)
+            stale.write({'state': 'pending', 'eta': False})
+        return stale
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=None, max_batches=10):
+        """Scheduled action draining the OCR queue.
+
+        Jobs are claimed in batches of ``ocr_batch_size`` and each batch is
+        claimed and run in its own transaction, so a slow or failing scan never
+        holds locks on the rest of the queue.
+
+        Args:
+            batch_size (int): number of jobs claimed and scanned together,
+                defaults to the ocr_batch_size system parameter
+            max_batches (int): maximum number of batches processed per cron run
+        """
+        testing = getattr(threading.current_thread(), 'testing', False)
+        ocr_config = self.env['ir.config_parameter']._get_ocr_config()
+        if not batch_size:
+            batch_size = ocr_config['batch_size']
+        self._requeue_stale_jobs()
+
+        # Do not claim anything while the circuit breaker of the OCR API is open
+        retry_at = not ocr_config['test_mode'] and \
+            self.env['hr.expense.ocr.breaker'].sudo()._get_retry_at(ocr_config['api_url'])
+        if retry_at:
+            _logger.info("OCR API circuit breaker is open, postponing the OCR queue until %s", retry_at)
+            self.env.ref('hr_expense_claim_auto_scan.ir_cron_process_ocr_jobs')._trigger(at=retry_at)
+            return 0
+
+        processed = 0
+        for _batch in range(max_batches):
+            jobs = self._claim(limit=batch_size)
+            if not jobs:
+                break
+            if not testing:
+                self.env.cr.commit()
+            jobs._run()
+            if not testing:
+                self.env.cr.commit()
+            processed += len(jobs)
+        else:
+            if self.search_count([('state', '=', 'pending')], limit=1):
+                # More work is waiting; schedule another run right away
+                self.env.ref('hr_expense_claim_auto_scan.ir_cron_process_ocr_jobs')._trigger()
+
+        # Counted by each process, see hr_expense_ocr_engine_stat.py
+        self.env['hr.expense.ocr.engine.stat']._flush()
+        _logger.info("OCR queue run finished, %d job(s) processed", processed)
+        return processed
+
+    def action_retry(self):
+        """Manually put failed jobs back in the queue."""
+        self.write({'state': 'pending', 'attempts': 0, 'eta': False, 'error': False})
+        self.env.ref('hr_expense_claim_auto_scan.ir_cron_process_ocr_jobs')._trigger()
+        return True
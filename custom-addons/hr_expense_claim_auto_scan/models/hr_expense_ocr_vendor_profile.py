@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+Parse profiles of the receipt vendors, learned from their past receipts.
+
+A vendor prints its receipts the same way every time: the profile remembers
+the date format that parsed its last receipt, its decimal separator and the
+expense category its category code resolved to. The next receipt of the
+vendor is parsed with those first, and its category needs no product search.
+
+Profiles are only written when a receipt changes what they hold, on the
+caller's cursor: the receipts of a known vendor cost no write at all.
+"""
+from psycopg2.errors import SerializationFailure
+
+from odoo import models, fields, api
+
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+
+def vendor_key(business_name):
+    """Return the key of a vendor: its name in lower case, spaces collapsed."""
+    return ' '.join((business_name or '').lower().split())[:64]
+
+
+class HrExpenseOcrVendorProfile(models.Model):
+    _name = 'hr.expense.ocr.vendor.profile'
+    _description = 'Receipt Vendor Parse Profile'
+    _order = 'last_seen desc'
+    _rec_name = 'vendor_key'
+
+    vendor_key = fields.Char(string='Vendor', required=True, readonly=True,
+                             help="Business name read on the receipts, in lower case")
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True,
+                                 ondelete='cascade')
+    date_format = fields.Char(string='Date Format', readonly=True,
+                              help="strptime format that parsed the last receipt of the vendor")
+    decimal_separator = fields.Selection([
+        ('.', 'Point (1,234.56)'),
+        (',', 'Comma (1.234,56)'),
+    ], string='Decimal Separator', readonly=True)
+    category_code = fields.Char(string='Category Code', readonly=True,
+                                help="Expense category code read on the last receipt of the vendor")
+    product_id = fields.Many2one('product.product', string='Expense Category', ondelete='set null',
+                                 help="Expense category the category code resolved to")
+    receipt_count = fields.Integer(string='Receipts Learned', readonly=True,
+                                   help="Receipts that changed the profile")
+    last_seen = fields.Datetime(string='Last Learned', readonly=True,
+                                help="Last receipt that changed the profile")
+
+    _sql_constraints = [
+        ('vendor_company_uniq', 'unique(vendor_key, company_id)', 'Only one profile per vendor and company!'),
+    ]
+
+    @api.model
+    def _lookup(self, business_name, company_id):
+        """Return the profile of a vendor, or an empty recordset."""
+        key = vendor_key(business_name)
+        if not key:
+            return self.browse()
+        return self.search([('vendor_key', '=', key), ('company_id', '=', company_id)], limit=1)
+
+    def _get_hints(self):
+        """Return the parse hints of the profile, see extract_ocr_values()."""
+        if not self:
+            return {}
+        self.ensure_one()
+        return {
+            'date_format': self.date_format or None,
+            'decimal_separator': self.decimal_separator or None,
+        }
+
+    def _get_product(self, category_code):
+        """Return the expense category learned for a category code, if it is still one."""
+        if not self or not self.product_id or self.category_code != category_code:
+            return self.env['product.product']
+        product = self.product_id
+        return product if product.active and product.can_be_expensed else self.env['product.product']
+
+    def _learn(self, business_name, company_id, hints, category_code=None, product=None):
+        """Update the profile of a vendor with what its last receipt showed.
+
+        Called on the profile loaded by _lookup() (empty for a new vendor); it
+        is not written when the receipt matches it.
+
+        Args:
+            business_name (str): vendor read on the receipt
+            company_id (int): company of the expense
+            hints (dict): parse hints updated by extract_ocr_values()
+            category_code (str): category code read on the receipt
+            product (product.product): expense category it resolved to
+        """
+        key = vendor_key(business_name)
+        if not key:
+            return
+        params = {
+            'key': key,
+            'company': company_id,
+            'date_format': hints.get('date_format') or None,
+            'decimal_separator': hints.get('decimal_separator') or None,
+            'category_code': category_code or None,
+            'product': product.id if product else None,
+            'uid': self.env.uid,
+        }
+        if self:
+            self.ensure_one()
+            if params['date_format'] in (None, self.date_format) \
+                    and params['decimal_separator'] in (None, self.decimal_separator) \
+                    and (params['category_code'] is None
+                         or (params['category_code'] == self.category_code
+                             and (params['product'] or False) == self.product_id.id)):
+                return
+        try:
+            with self.env.cr.savepoint():
+                self.env.cr.execute("""
+                    INSERT INTO hr_expense_ocr_vendor_profile
+                           (vendor_key, company_id, date_format, decimal_separator, category_code, product_id,
+                            receipt_count, last_seen, create_uid, write_uid, create_date, write_date)
+                    VALUES (%(key)s, %(company)s, %(date_format)s, %(decimal_separator)s, %(category_code)s,
+                            %(product)s, 1, (now() AT TIME ZONE 'UTC'), %(uid)s, %(uid)s,
+                            (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+               ON CONFLICT (vendor_key, company_id) DO UPDATE
+                       SET date_format = COALESCE(EXCLUDED.date_format, hr_expense_ocr_vendor_profile.date_format),
+                           decimal_separator = COALESCE(EXCLUDED.decimal_separator,
+                                                        hr_expense_ocr_vendor_profile.decimal_separator),
+                           category_code = COALESCE(EXCLUDED.category_code,
+                                                    hr_expense_ocr_vendor_profile.category_code),
+                           product_id = CASE WHEN EXCLUDED.category_code IS NULL
+                                             THEN hr_expense_ocr_vendor_profile.product_id
+                                             ELSE EXCLUDED.product_id END,
+                           receipt_count = hr_expense_ocr_vendor_profile.receipt_count + 1,
+                           last_seen = EXCLUDED.last_seen,
+                           write_uid = EXCLUDED.write_uid,
+                           write_date = EXCLUDED.write_date
+                """, params)
+        except SerializationFailure:
+            # A concurrent scan of the vendor updated the profile first
+            _logger.info("Profile of vendor %r updated by another scan meanwhile", key)
+        self.invalidate_model()
@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+from odoo import models
+
+
+class HrExpenseSheet(models.Model):
+    _inherit = 'hr.expense.sheet'
+
+    def action_submit_sheet(self):
+        """Measure the accuracy of the OCR engines on the submitted expenses."""
+        result = super(HrExpenseSheet, self).action_submit_sheet()
+        self.expense_ids._record_ocr_accuracy()
+        return result
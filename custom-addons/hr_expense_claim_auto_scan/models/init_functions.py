@@ -1,8 +1,8 @@
-import logging
 import psycopg2
 from odoo import api, models
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class InitFunctions(models.AbstractModel):
     _name = 'hr_expense_claim_auto_scan.init_functions'
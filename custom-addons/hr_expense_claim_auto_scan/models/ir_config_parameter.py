@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models, tools
+from odoo.tools import frozendict
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_OCR_API_URL = 'https://n8n.cre8or-lab.com/webhook/extract-receipt-details'
+DEFAULT_BATCH_SIZE = 5
+DEFAULT_BATCH_MAX_BYTES = 20 * 1024 * 1024
+# Longest wait for the answer to a batch request, in seconds
+DEFAULT_BATCH_TIMEOUT = 300
+DEFAULT_CACHE_TTL_DAYS = 30
+DEFAULT_PREPROCESS_MAX_PX = 2000
+DEFAULT_PREPROCESS_QUALITY = 85
+# 0 keeps every non-blank page of the PDF receipts
+DEFAULT_PREPROCESS_MAX_PDF_PAGES = 0
+DEFAULT_OCR_ENGINE = 'webhook'
+DEFAULT_CATEGORY_SIMILARITY = 0.5
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model
+    @tools.ormcache()
+    def _get_ocr_config(self):
+        """Return the OCR configuration read from the system parameters.
+
+        The result lives in the registry 'default' cache. ir.config_parameter
+        clears that cache whenever a parameter is created, written or deleted,
+        and the registry signals the invalidation to the other workers, so scans
+        read their configuration without any database round trip.
+
+        Returns:
+            frozendict: api_key, api_url, test_mode, batch_size, batch_max_bytes,
+                batch_timeout, cache_ttl_days, preprocess, preprocess_options and
+                category_similarity
+        """
+        ICP = self.sudo()
+        try:
+            batch_size = int(ICP.get_param('ocr_batch_size', DEFAULT_BATCH_SIZE))
+            batch_max_bytes = int(ICP.get_param('ocr_batch_max_bytes', DEFAULT_BATCH_MAX_BYTES))
+            batch_timeout = int(ICP.get_param('ocr_batch_timeout', DEFAULT_BATCH_TIMEOUT))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR batch parameters, using defaults")
+            batch_size, batch_max_bytes = DEFAULT_BATCH_SIZE, DEFAULT_BATCH_MAX_BYTES
+            batch_timeout = DEFAULT_BATCH_TIMEOUT
+        try:
+            cache_ttl_days = int(ICP.get_param('ocr_cache_ttl_days', DEFAULT_CACHE_TTL_DAYS))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR cache lifetime parameter, using default")
+            cache_ttl_days = DEFAULT_CACHE_TTL_DAYS
+
+        try:
+            preprocess_max_px = int(ICP.get_param('ocr_preprocess_max_px', DEFAULT_PREPROCESS_MAX_PX))
+            preprocess_quality = int(ICP.get_param('ocr_preprocess_quality', DEFAULT_PREPROCESS_QUALITY))
+            preprocess_max_pdf_pages = int(ICP.get_param('ocr_preprocess_max_pdf_pages',
+                                                         DEFAULT_PREPROCESS_MAX_PDF_PAGES))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR preprocessing parameters, using defaults")
+            preprocess_max_px = DEFAULT_PREPROCESS_MAX_PX
+            preprocess_quality = DEFAULT_PREPROCESS_QUALITY
+            preprocess_max_pdf_pages = DEFAULT_PREPROCESS_MAX_PDF_PAGES
+
+        try:
+            category_similarity = float(ICP.get_param('ocr_category_similarity', DEFAULT_CATEGORY_SIMILARITY))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR category similarity parameter, using default")
+            category_similarity = DEFAULT_CATEGORY_SIMILARITY
+
+        _logger.debug("Loading OCR configuration from system parameters")
+        return frozendict({
+            'api_key': ICP.get_param('ocr_api_key', False),
+            'api_url': ICP.get_param('ocr_api_url', DEFAULT_OCR_API_URL),
+            'test_mode': (ICP.get_param('ocr_test_mode', 'False') or '').lower() == 'true',
+            'batch_size': max(batch_size, 1),
+            'batch_max_bytes': batch_max_bytes,
+            'batch_timeout': max(batch_timeout, 1),
+            'cache_ttl_days': cache_ttl_days,
+            'preprocess': (ICP.get_param('ocr_preprocess_enabled', 'True') or '').lower() == 'true',
+            'preprocess_options': frozendict({
+                'max_px': preprocess_max_px,
+                'grayscale': (ICP.get_param('ocr_preprocess_grayscale', 'True') or '').lower() == 'true',
+                'format': (ICP.get_param('ocr_preprocess_format', 'jpeg') or 'jpeg').lower(),
+                'quality': preprocess_quality,
+                'max_pdf_pages': preprocess_max_pdf_pages,
+            }),
+            'category_similarity': min(max(category_similarity, 0.0), 1.0),
+        })
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_ocr_engine_config(self, company_id):
+        """Return the OCR engines of a company.
+
+        ``ocr_engine.<company id>`` and ``ocr_engine_fallback.<company id>``
+        override the ``ocr_engine`` and ``ocr_engine_fallback`` parameters of
+        all companies.
+
+        Args:
+            company_id (int): company scanning the receipts
+
+        Returns:
+            frozendict: engine and fallback (False for none) engine names
+        """
+        ICP = self.sudo()
+
+        def get(key, default):
+            value = ICP.get_param('%s.%s' % (key, company_id)) or ICP.get_param(key, default)
+            return (value or '').strip().lower() or default
+
+        return frozendict({
+            'engine': get('ocr_engine', DEFAULT_OCR_ENGINE),
+            'fallback': get('ocr_engine_fallback', False),
+        })
@@ -3,10 +3,10 @@
 This module adds a temporary ir.model.function model to the registry
 to allow proper uninstallation of modules that reference this model.
 """
-import logging
 from odoo import models, fields, api
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class IrModelFunction(models.Model):
     """
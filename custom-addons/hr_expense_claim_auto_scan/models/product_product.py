@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+import psycopg2
+
+from odoo import api, models, tools
+from odoo.tools import frozendict
+from odoo.tools.sql import create_index
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Fields of the products the expense category index is built from
+EXPENSE_CATEGORY_FIELDS = frozenset(['name', 'default_code', 'can_be_expensed', 'active', 'company_id'])
+# Text of the translated product names the trigram index covers, all languages at once
+TEMPLATE_NAME_TRIGRAM_EXPRESSION = "(jsonb_path_query_array(name, '$.*')::text)"
+
+
+def ensure_trigram(env):
+    """Return whether the pg_trgm extension is available, creating it if the database user may."""
+    if env.registry.has_trigram:
+        return True
+    try:
+        with env.cr.savepoint(flush=False):
+            env.cr.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except psycopg2.Error as e:
+        _logger.warning("pg_trgm extension unavailable, receipt categories will not be fuzzily matched: %s",
+                        str(e).strip())
+        return False
+    env.registry.has_trigram = True
+    return True
+
+
+def normalize_category(value):
+    """Return a category code or name as compared by the index: upper case, spaces collapsed."""
+    return ' '.join(value.split()).upper() if isinstance(value, str) else ''
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def init(self):
+        super().init()
+        if ensure_trigram(self.env):
+            create_index(self.env.cr, 'product_product_default_code_trgm_index', self._table,
+                         ['default_code gin_trgm_ops'], method='gin', where='default_code IS NOT NULL')
+
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_expense_category_index(self):
+        """Return the index of the expense categories, by normalized code and name.
+
+        The index lives in the registry 'default' cache. Products clear that
+        cache when an expense category is created or deleted, or when a write
+        changes what the index holds of them (see _expense_category_state()),
+        and the registry signals the invalidation to the other workers. Writes
+        to other products, or that leave the indexed values as they were,
+        keep the cache.
+
+        Returns:
+            frozendict: entries, a tuple of (id, company id, code, name) in the
+                order of the products, and codes and names, mapping the
+                normalized codes and names to the positions of their entries
+        """
+        products = self.sudo().with_context(active_test=True).search_fetch(
+            [('can_be_expensed', '=', True)], ['default_code', 'name', 'company_id'])
+        entries, codes, names = [], {}, {}
+        for position, product in enumerate(products):
+            code, name = normalize_category(product.default_code), normalize_category(product.name)
+            entries.append((product.id, product.company_id.id, code, name))
+            if code:
+                codes.setdefault(code, []).append(position)
+            if name:
+                names.setdefault(name, []).append(position)
+        _logger.debug("Indexed %d expense categories", len(entries))
+        return frozendict({
+            'entries': tuple(entries),
+            'codes': frozendict({key: tuple(positions) for key, positions in codes.items()}),
+            'names': frozendict({key: tuple(positions) for key, positions in names.items()}),
+        })
+
+    @api.model
+    def _find_expense_category(self, category):
+        """Return the expense category matching a category read on a receipt.
+
+        Tried in order: a code equal to the category, a code containing it, a
+        name equal to it and a name containing it; all case-insensitive. Only
+        the categories of the current companies, or of none, are returned.
+
+        Args:
+            category (str): expense category code read on the receipt
+
+        Returns:
+            product.product: the matching product, or an empty recordset
+        """
+        key = normalize_category(category)
+        if not key:
+            return self.browse()
+        index = self._get_expense_category_index()
+        entries = index['entries']
+        if not entries:
+            _logger.warning("No expense categories (expensable products) found in the system")
+            return self.browse()
+        company_ids = set(self.env.companies.ids)
+
+        def first(positions):
+            for position in positions:
+                product_id, company_id = entries[position][:2]
+                if not company_id or company_id in company_ids:
+                    return product_id
+            return None
+
+        for column, exact in ((2, index['codes']), (3, index['names'])):
+            product_id = first(exact.get(key, ())) \
+                or first(position for position, entry in enumerate(entries) if key in entry[column])
+            if product_id:
+                return self.browse(product_id)
+        return self._match_expense_category(category)
+
+    @api.model
+    def _match_expense_category(self, category):
+        """Return the expense category closest to a noisy category read on a receipt.
+
+        One query, backed by the trigram indexes of the product codes and of
+        the expense category names: the code or name with the highest word
+        similarity to the category wins, above the ``ocr_category_similarity``
+        threshold.
+
+        Args:
+            category (str): expense category code read on the receipt
+
+        Returns:
+            product.product: the closest product, or an empty recordset
+        """
+        category = ' '.join(category.split()) if isinstance(category, str) else ''
+        if not category or not self.env.registry.has_trigram:
+            return self.browse()
+        threshold = self.env['ir.config_parameter'].sudo()._get_ocr_config()['category_similarity']
+        self.env['product.product'].flush_model(['default_code', 'active', 'product_tmpl_id'])
+        self.env['product.template'].flush_model(['name', 'can_be_expensed', 'active', 'company_id'])
+        # SET LOCAL lets the <% operator, and thus the GIN indexes, apply the threshold
+        self.env.cr.execute("""
+            SET LOCAL pg_trgm.word_similarity_threshold = %(threshold)s;
+            SELECT id FROM (
+                SELECT p.id, word_similarity(%(category)s, p.default_code) AS score,
+                       similarity(%(category)s, p.default_code) AS closeness
+                  FROM product_product p
+                  JOIN product_template t ON t.id = p.product_tmpl_id
+                 WHERE %(category)s <%% p.default_code
+                   AND p.active AND t.active AND t.can_be_expensed
+                   AND (t.company_id IS NULL OR t.company_id = ANY(%(company_ids)s))
+             UNION ALL
+                SELECT p.id, word_similarity(%(category)s, {name}) AS score,
+                       similarity(%(category)s, {name}) AS closeness
+                  FROM product_template t
+                  JOIN product_product p ON p.product_tmpl_id = t.id
+                 WHERE %(category)s <%% {name}
+                   AND t.can_be_expensed AND p.active AND t.active
+                   AND (t.company_id IS NULL OR t.company_id = ANY(%(company_ids)s))
+            ) matches
+            ORDER BY score DESC, closeness DESC, id
+            LIMIT 1
+        """.format(name=TEMPLATE_NAME_TRIGRAM_EXPRESSION), {
+            'threshold': threshold,
+            'category': category,
+            'company_ids': self.env.companies.ids,
+        })
+        row = self.env.cr.fetchone()
+        if row:
+            _logger.info("Receipt category '%s' fuzzily matched to product %s", category, row[0])
+        return self.browse(row[0]) if row else self.browse()
+
+    def _expense_category_state(self):
+        """Return what the expense category index holds of these products.
+
+        Returns:
+            dict: id -> (code, name, company id, active) of the products that
+                are expense categories
+        """
+        return {
+            product.id: (product.default_code, product.name, product.company_id.id, product.active)
+            for product in self.sudo().with_context(active_test=False) if product.can_be_expensed
+        }
+
+    def _clear_expense_category_index(self):
+        self.env.registry.clear_cache()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        if any(product.can_be_expensed for product in products):
+            self._clear_expense_category_index()
+        return products
+
+    def write(self, vals):
+        if not EXPENSE_CATEGORY_FIELDS.intersection(vals):
+            return super().write(vals)
+        indexed = self._expense_category_state()
+        res = super().write(vals)
+        if self._expense_category_state() != indexed:
+            self._clear_expense_category_index()
+        return res
+
+    def unlink(self):
+        expense_categories = any(product.can_be_expensed for product in self)
+        res = super().unlink()
+        if expense_categories:
+            self._clear_expense_category_index()
+        return res
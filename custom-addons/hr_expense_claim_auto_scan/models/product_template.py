@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models
+from odoo.tools.sql import create_index
+
+from .product_product import EXPENSE_CATEGORY_FIELDS, TEMPLATE_NAME_TRIGRAM_EXPRESSION, ensure_trigram
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    def init(self):
+        super().init()
+        # Fuzzy matching of the receipt categories only looks at the expense categories
+        if ensure_trigram(self.env):
+            create_index(self.env.cr, 'product_template_expense_name_trgm_index', self._table,
+                         ['%s gin_trgm_ops' % TEMPLATE_NAME_TRIGRAM_EXPRESSION], method='gin',
+                         where='can_be_expensed')
+
+    # The name, the expense flag and the company of the variants are the
+    # template's: keep the expense category index of product.product current
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        templates = super().create(vals_list)
+        if any(template.can_be_expensed for template in templates):
+            self.env['product.product']._clear_expense_category_index()
+        return templates
+
+    def write(self, vals):
+        if not EXPENSE_CATEGORY_FIELDS.intersection(vals):
+            return super().write(vals)
+        variants = self.with_context(active_test=False).product_variant_ids
+        indexed = variants._expense_category_state()
+        res = super().write(vals)
+        if variants._expense_category_state() != indexed:
+            variants._clear_expense_category_index()
+        return res
+
+    def unlink(self):
+        expense_categories = any(template.can_be_expensed for template in self)
+        res = super().unlink()
+        if expense_categories:
+            self.env['product.product']._clear_expense_category_index()
+        return res
@@ -1 +1,5 @@
 from . import ocr_service
+from . import preprocess
+from . import async_ocr
+from . import single_flight
+from . import engines
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio OCR client for high-concurrency batch scans.
+
+``scan_receipt_files()`` sends many receipts to the OCR API concurrently from
+the calling thread: each receipt is its own request, at most ``concurrency``
+of them are in flight, each with an overall timeout. With httpx (and h2) the
+requests are multiplexed over HTTP/2 when the server supports it; without
+httpx they fall back to the pooled requests session, run in threads.
+
+It runs an event loop in the calling thread and blocks it until all the
+receipts are scanned, so it is meant for scheduled actions and command line
+jobs (e.g. the OCR backfill), never for HTTP requests. The results come back
+as one list the caller writes to the ORM in one go; the rate limiter and the
+circuit breaker are checked from the event loop thread, with short queries on
+the caller's cursor.
+
+Because all the calls share the caller's database connection, the concurrency
+slots of the circuit breaker (session-level advisory locks) do not limit them:
+the ``concurrency`` semaphore does.
+"""
+import asyncio
+import datetime
+import random
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 (HTTP/2 support of httpx)
+except ImportError:
+    h2 = None
+
+from odoo.addons.hr_expense_ocr_common.services import circuit_breaker, http_client, rate_limiter
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.hr_expense_ocr_common.services.multipart import MultipartStream
+from odoo.addons.structured_logging import get_logger
+
+from . import ocr_service
+
+_logger = get_logger(__name__)
+
+# Overall time allowed for one receipt, retries included
+DEFAULT_TIMEOUT = 180
+# Size of the chunks the multipart body is streamed in
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class AsyncOcrClient:
+    """Send receipts to the OCR API concurrently.
+
+    Use as an async context manager::
+
+        async with AsyncOcrClient(env, api_url, api_key, concurrency=8) as client:
+            results = await client.scan_all(receipts)
+
+    Args:
+        env: Odoo environment of the caller, for the rate limiter and the
+            circuit breaker; None to call the API unguarded
+        api_url (str): OCR API endpoint
+        api_key (str): OCR API key
+        concurrency (int): maximum number of requests in flight
+        timeout (float): seconds allowed for each receipt
+        http2 (bool): negotiate HTTP/2 when httpx and h2 are installed
+    """
+
+    def __init__(self, env, api_url, api_key, concurrency=8, timeout=DEFAULT_TIMEOUT, http2=True):
+        self.env = env
+        self.api_url = api_url
+        self.api_key = api_key
+        self.concurrency = max(int(concurrency), 1)
+        self.timeout = timeout
+        self.http2 = bool(http2 and h2 is not None)
+        self.timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._semaphore = None
+        self._client = None
+
+    async def __aenter__(self):
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        if httpx is not None:
+            limits = httpx.Limits(max_connections=self.concurrency,
+                                  max_keepalive_connections=self.concurrency)
+            # Connection errors are retried by the transport, error statuses by _send()
+            transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=limits,
+                                                 retries=http_client.RETRY_TOTAL)
+            self._client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+        else:
+            _logger.info("httpx is not installed, scanning receipts with %d threads instead",
+                         self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _send_once(self, receipt):
+        body = MultipartStream(files=[('receipt', receipt)])
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": body.content_type,
+            "Content-Length": str(len(body)),
+        }
+        if self._client is None:
+            def post():
+                with body:
+                    return http_client.post(self.api_url, headers=headers, data=body, timeout=self.timeout)
+            return await asyncio.to_thread(post)
+
+        async def stream():
+            with body:
+                while True:
+                    chunk = body.read(STREAM_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        return await self._client.post(self.api_url, headers=headers, content=stream())
+
+    async def _send(self, receipt):
+        """Send one receipt, retrying the responses asking for it like the pooled session."""
+        if self._client is None:
+            # The pooled requests session retries by itself
+            return await self._send_once(receipt)
+        for attempt in range(http_client.RETRY_TOTAL + 1):
+            response = await self._send_once(receipt)
+            retry_after = response.headers.get('Retry-After', '')
+            # Scans are billed: only send them again when the service asks to
+            if (response.status_code not in http_client.RETRY_POST_STATUSES or not retry_after
+                    or attempt == http_client.RETRY_TOTAL):
+                return response
+            delay = min(http_client.RETRY_BACKOFF_FACTOR * (2 ** attempt), http_client.RETRY_BACKOFF_MAX)
+            if retry_after.isdigit():
+                delay = min(int(retry_after), http_client.RETRY_BACKOFF_MAX)
+            await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+        return response
+
+    async def scan(self, receipt):
+        """Scan one receipt.
+
+        Returns:
+            dict: OCR result data or False if processing failed
+
+        Raises:
+            OcrUnavailableError: the circuit breaker of the OCR API is open or
+                the OCR quota of the company is used up
+        """
+        if not receipt.mime_type:
+            _logger.error("[%s] Could not determine MIME type for file: %s", self.timestamp, receipt.name)
+            return False
+
+        async with self._semaphore:
+            try:
+                if self.env is None:
+                    response = await asyncio.wait_for(self._send(receipt), self.timeout)
+                else:
+                    response = await circuit_breaker.call_async(
+                        self.env, self.api_url,
+                        lambda: asyncio.wait_for(self._send(receipt), self.timeout),
+                        before_send=lambda: rate_limiter.acquire_async(self.env))
+            except OcrUnavailableError:
+                raise
+            except asyncio.TimeoutError:
+                _logger.error("[%s] OCR API did not answer within %s seconds for %s",
+                              self.timestamp, self.timeout, receipt.name)
+                return False
+            except Exception as e:  # pylint: disable=broad-except
+                # Transport errors of httpx or requests, depending on the client in use
+                _logger.error("[%s] Error sending request to OCR API for %s: %s",
+                              self.timestamp, receipt.name, str(e))
+                return False
+        return ocr_service._parse_receipt_response(response, False, self.timestamp)
+
+    async def scan_all(self, receipts):
+        """Scan several receipts concurrently.
+
+        When the OCR API becomes unavailable after some receipts were scanned,
+        the receipts it rejected are left unprocessed (False) rather than
+        losing the results already obtained.
+
+        Args:
+            receipts (list): ReceiptFile objects
+
+        Returns:
+            list: OCR result data or False for each receipt, in the same order
+
+        Raises:
+            OcrUnavailableError: the OCR API rejected every receipt
+        """
+        outcomes = await asyncio.gather(*(self.scan(receipt) for receipt in receipts),
+                                        return_exceptions=True)
+        results, unavailable = [], None
+        for receipt, outcome in zip(receipts, outcomes):
+            if isinstance(outcome, OcrUnavailableError):
+                unavailable = outcome
+                outcome = False
+            elif isinstance(outcome, BaseException):
+                _logger.error("[%s] Unexpected error in OCR processing of %s: %s",
+                              self.timestamp, receipt.name, str(outcome), exc_info=outcome)
+                outcome = False
+            results.append(outcome)
+        if unavailable and all(isinstance(outcome, OcrUnavailableError) for outcome in outcomes):
+            raise unavailable
+        if unavailable:
+            _logger.warning("[%s] OCR API became unavailable during the scan: %s", self.timestamp, str(unavailable))
+        return results
+
+
+def scan_receipt_files(env, receipts, concurrency=None, timeout=DEFAULT_TIMEOUT):
+    """Scan several receipts with concurrent OCR requests, blocking until done.
+
+    Runs an event loop in the calling thread: call it from scheduled actions
+    or command line jobs, not from HTTP requests. Receipts go to the OCR
+    engine of the company like with ocr_service.process_receipt_files(); only
+    the remote webhook is called concurrently.
+
+    Args:
+        env: Odoo environment of the caller
+        receipts (list): ReceiptFile objects
+        concurrency (int): maximum number of requests in flight, defaults to
+            the ocr_concurrency_max system parameter
+        timeout (float): seconds allowed for each receipt
+
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+
+    Raises:
+        OcrUnavailableError: the OCR API rejected every receipt
+    """
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if not receipts:
+        return []
+    ocr_config = ocr_service._get_ocr_config(env, timestamp)
+    if not ocr_config:
+        return [False] * len(receipts)
+    if not concurrency:
+        concurrency = env['ir.config_parameter']._get_ocr_breaker_config()['concurrency_max']
+
+    async def run(receipts):
+        async with AsyncOcrClient(env, ocr_config['api_url'], ocr_config['api_key'],
+                                  concurrency=concurrency, timeout=timeout) as client:
+            return await client.scan_all(receipts)
+
+    def scan(receipts):
+        _logger.info("[%s] Scanning %d receipts with up to %d concurrent OCR requests%s",
+                     timestamp, len(receipts), concurrency, " over HTTP/2" if httpx and h2 else "")
+        results = asyncio.run(run(receipts))
+        _logger.info("[%s] Concurrent OCR processing finished: %d/%d receipts extracted",
+                     timestamp, len([r for r in results if r]), len(receipts))
+        return results
+
+    # Only the remote webhook is scanned concurrently; local engines run as usual
+    return ocr_service._scan_with_engines(env, ocr_config, receipts, timestamp, webhook_scan=scan)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+Registry of the OCR engines.
+
+An engine turns receipts into OCR results in the webhook's format
+(``{'output': {...}}``). The remote webhook is the default; local engines run
+in-process, without a network round trip, and keep scans going while the
+remote service is unavailable. The engine of a company, and the one it falls
+back on, are chosen with the ``ocr_engine`` and ``ocr_engine_fallback``
+system parameters (``ocr_engine.<company id>`` for one company).
+"""
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_ENGINE = 'webhook'
+
+_engines = {}
+
+
+class OcrEngine:
+    """Base class of the OCR engines; subclasses are registered with @register"""
+
+    #: key of the engine in the system parameters and statistics
+    name = None
+    #: human readable name
+    label = None
+
+    def is_available(self):
+        """Return whether the engine can scan in this process (libraries, binaries)."""
+        return True
+
+    def scan(self, env, ocr_config, receipts, timestamp):
+        """Scan receipts.
+
+        Args:
+            env: Odoo environment of the caller, None for the legacy entry points
+            ocr_config (dict): OCR configuration, see _get_ocr_config()
+            receipts (list): ReceiptFile objects
+            timestamp (str): Timestamp used to correlate log lines
+
+        Returns:
+            list: OCR result data or False for each receipt, in the same order
+
+        Raises:
+            OcrUnavailableError: the engine cannot scan right now
+        """
+        raise NotImplementedError()
+
+
+def register(engine_class):
+    """Class decorator adding an engine to the registry."""
+    _engines[engine_class.name] = engine_class()
+    return engine_class
+
+
+def get_engine(name):
+    """Return the registered engine called ``name``, or None."""
+    return _engines.get(name)
+
+
+def get_engines():
+    """Return the registered engines by name."""
+    return dict(_engines)
+
+
+from . import webhook  # noqa: E402
+from . import tesseract  # noqa: E402
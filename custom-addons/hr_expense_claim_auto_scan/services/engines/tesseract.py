@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Local OCR engine: Tesseract, run in-process, with layout heuristics.
+
+Tesseract only returns words and their positions; the receipt fields are
+recovered from the layout of the text lines: the vendor is the first line of
+text at the top, totals, subtotals and taxes are the amounts at the end of
+lines labelled accordingly, and the other lines ending with an amount above
+them are the items. Good enough for simple printed receipts; the remote
+webhook remains the engine of choice for anything else.
+
+Needs the ``pytesseract`` package and the ``tesseract`` binary. Images only:
+PDF receipts are left to the other engines.
+"""
+import re
+
+try:
+    import pytesseract
+except ImportError:
+    pytesseract = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+from . import OcrEngine, register
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Amount at the end of a line: 1,234.56 / 1 234,56 / 12.50
+AMOUNT_RE = re.compile(r'(-?\d{1,3}(?:[ ,.]\d{3})*[.,]\d{2}|-?\d+[.,]\d{2})\s*$')
+QUANTITY_RE = re.compile(r'^(\d+)\s*(?:[xX@*]\s*)?(?=\D)')
+DATE_RES = [
+    (re.compile(r'\b(\d{4})-(\d{1,2})-(\d{1,2})\b'), ('y', 'm', 'd')),
+    (re.compile(r'\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})\b'), ('d', 'm', 'y')),
+    (re.compile(r'\b(\d{1,2})[/.-](\d{1,2})[/.-](\d{2})\b'), ('d', 'm', 'y')),
+]
+RECEIPT_NUMBER_RE = re.compile(
+    r'\b(?:receipt|invoice|inv|ticket|trans(?:action)?|order)\s*(?:no\.?|number|#)?\s*[:#]?\s*([A-Z0-9][A-Z0-9-]{2,})',
+    re.IGNORECASE)
+TOTAL_RE = re.compile(r'\b(?:grand\s+)?total\b|\bamount\s+due\b|\bbalance\s+due\b', re.IGNORECASE)
+SUBTOTAL_RE = re.compile(r'\bsub[\s-]?total\b|\bnet\s+amount\b', re.IGNORECASE)
+TAX_RE = re.compile(r'\b(?:tax|vat|gst|hst|pst)\b', re.IGNORECASE)
+# Lines that hold an amount but are not items
+NOT_ITEM_RE = re.compile(r'\b(?:cash|change|card|visa|mastercard|tender|payment|paid|discount|tip|rounding)\b',
+                         re.IGNORECASE)
+HEADER_SKIP_RE = re.compile(r'\b(?:receipt|invoice|tel|phone|fax|www\.|http|date|time)\b|@', re.IGNORECASE)
+
+
+def _parse_amount(text):
+    """Return the float value of an amount as printed on a receipt."""
+    text = text.replace(' ', '')
+    # The last separator is the decimal one
+    decimal = max(text.rfind('.'), text.rfind(','))
+    integer, fraction = text[:decimal], text[decimal + 1:]
+    return float(re.sub(r'[.,]', '', integer) + '.' + fraction)
+
+
+def _parse_date(text):
+    for regex, order in DATE_RES:
+        match = regex.search(text)
+        if not match:
+            continue
+        parts = dict(zip(order, (int(group) for group in match.groups())))
+        year = parts['y'] + 2000 if parts['y'] < 100 else parts['y']
+        month, day = parts['m'], parts['d']
+        if month > 12 and day <= 12:
+            month, day = day, month
+        if 1 <= month <= 12 and 1 <= day <= 31:
+            return '%04d-%02d-%02d' % (year, month, day)
+    return None
+
+
+def parse_receipt_lines(lines):
+    """Recover the receipt fields from its text lines, in reading order.
+
+    Args:
+        lines (list): text lines of the receipt
+
+    Returns:
+        dict: output in the webhook's format (business_name, receipt_number,
+            date, items, subtotal, tax, total_amount), with the fields found
+    """
+    lines = [' '.join(line.split()) for line in lines]
+    lines = [line for line in lines if line]
+    output = {}
+
+    for line in lines[:5]:
+        if sum(char.isalpha() for char in line) >= 3 and not HEADER_SKIP_RE.search(line) \
+                and not AMOUNT_RE.search(line):
+            output['business_name'] = line
+            break
+
+    items, totals_started = [], False
+    for line in lines:
+        if 'date' not in output:
+            date = _parse_date(line)
+            if date:
+                output['date'] = date
+        if 'receipt_number' not in output:
+            match = RECEIPT_NUMBER_RE.search(line)
+            if match and any(char.isdigit() for char in match.group(1)):
+                output['receipt_number'] = match.group(1)
+
+        match = AMOUNT_RE.search(line)
+        if not match:
+            continue
+        try:
+            amount = _parse_amount(match.group(1))
+        except ValueError:
+            continue
+        label = line[:match.start()].strip()
+
+        if SUBTOTAL_RE.search(label):
+            output['subtotal'] = amount
+            totals_started = True
+        elif TAX_RE.search(label):
+            output['tax'] = round(output.get('tax', 0.0) + amount, 2)
+            totals_started = True
+        elif TOTAL_RE.search(label):
+            # The last total wins: "Total" often follows "Total before tax"
+            output['total_amount'] = amount
+            totals_started = True
+        elif not totals_started and label and not NOT_ITEM_RE.search(label) and _parse_date(label) is None:
+            quantity = 1
+            quantity_match = QUANTITY_RE.match(label)
+            if quantity_match:
+                quantity = int(quantity_match.group(1))
+                label = label[quantity_match.end():].strip()
+            if sum(char.isalpha() for char in label) >= 2:
+                items.append({'quantity': quantity, 'description': label, 'amount': amount})
+
+    if items:
+        output['items'] = items
+    if 'total_amount' not in output:
+        if 'subtotal' in output:
+            output['total_amount'] = round(output['subtotal'] + output.get('tax', 0.0), 2)
+        elif items:
+            output['total_amount'] = round(sum(item['amount'] for item in items), 2)
+    return output
+
+
+@register
+class TesseractEngine(OcrEngine):
+    """Receipt images read in-process by Tesseract"""
+
+    name = 'tesseract'
+    label = 'Tesseract (local)'
+
+    _available = None
+
+    def is_available(self):
+        if self._available is None:
+            available = False
+            if pytesseract is not None and Image is not None:
+                try:
+                    pytesseract.get_tesseract_version()
+                    available = True
+                except (pytesseract.TesseractNotFoundError, OSError) as e:
+                    _logger.warning("Tesseract OCR engine unavailable: %s", str(e))
+            type(self)._available = available
+        return self._available
+
+    def _read_lines(self, receipt):
+        with receipt.open() as stream:
+            image = Image.open(stream)
+            image = ImageOps.exif_transpose(image).convert('L')
+            data = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+        lines, confidences = {}, []
+        for index, word in enumerate(data['text']):
+            word = (word or '').strip()
+            if not word:
+                continue
+            key = (data['block_num'][index], data['par_num'][index], data['line_num'][index])
+            lines.setdefault(key, []).append(word)
+            confidence = float(data['conf'][index])
+            if confidence >= 0:
+                confidences.append(confidence)
+        confidence = sum(confidences) / len(confidences) / 100.0 if confidences else 0.0
+        return [' '.join(words) for _key, words in sorted(lines.items())], confidence
+
+    def scan(self, env, ocr_config, receipts, timestamp):
+        results = []
+        for receipt in receipts:
+            if not (receipt.mime_type or '').startswith('image/'):
+                _logger.info("[%s] Tesseract engine only reads images, skipping %s (%s)",
+                             timestamp, receipt.name, receipt.mime_type)
+                results.append(False)
+                continue
+            try:
+                lines, confidence = self._read_lines(receipt)
+            except Exception as e:  # pylint: disable=broad-except
+                _logger.error("[%s] Tesseract could not read %s: %s", timestamp, receipt.name, str(e))
+                results.append(False)
+                continue
+            output = parse_receipt_lines(lines)
+            if not output.get('total_amount'):
+                _logger.info("[%s] Tesseract found no total on %s", timestamp, receipt.name)
+                results.append(False)
+                continue
+            results.append({'output': output, 'confidence': round(confidence, 2)})
+        return results
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Remote OCR engine: the HTTP webhook configured with ocr_api_url.
+"""
+from . import OcrEngine, register
+
+
+@register
+class WebhookEngine(OcrEngine):
+    """Receipts sent to the OCR webhook, in batches when there are several"""
+
+    name = 'webhook'
+    label = 'Remote Webhook'
+
+    def scan(self, env, ocr_config, receipts, timestamp):
+        from .. import ocr_service
+        if len(receipts) == 1:
+            return [ocr_service._process_receipt_with_config(env, ocr_config, receipts[0], timestamp)]
+        return ocr_service._process_receipts_with_config(env, ocr_config, receipts, timestamp)
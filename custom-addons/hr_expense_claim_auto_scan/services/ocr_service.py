@@ -1,15 +1,26 @@
 # -*- coding: utf-8 -*-
-import logging
 import requests
 import mimetypes
 import json
 import datetime
+import time
 import odoo
 from odoo import api, SUPERUSER_ID
 from odoo.modules.registry import Registry
 import threading
 
-_logger = logging.getLogger(__name__)
+from odoo.addons.hr_expense_ocr_common.services import circuit_breaker, http_client, rate_limiter
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.hr_expense_ocr_common.services.multipart import MultipartStream
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+from odoo.addons.structured_logging import get_logger, payload
+
+from . import engines
+
+_logger = get_logger(__name__)
+
+# Longest wait for the answer to the scan of one receipt, in seconds
+RECEIPT_TIMEOUT = 180
 
 def get_mime_type(file_data, file_name):
     """
@@ -37,23 +48,46 @@ def get_mime_type(file_data, file_name):
     _logger.debug("Determined MIME type for %s: %s", file_name, mime_type)
     return mime_type
 
-def process_receipt_ocr(file_data, file_name):
+def _get_ocr_config(env, timestamp):
     """
-    Process receipt OCR using external API
+    Return the OCR API configuration using the caller's environment
+    
+    The configuration is cached in the registry, so this does not query the
+    database once it has been loaded.
     
     Args:
-        file_data (bytes): The binary data of the file to process
-        file_name (str): The name of the file
+        env: Odoo environment of the caller
+        timestamp (str): Timestamp used to correlate log lines
         
     Returns:
-        dict: OCR result data or False if processing failed
+        dict: api_key, api_url, test_mode and the batching limits, or None if
+            the OCR API is not configured
     """
-    # Get current timestamp using standard datetime
-    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ocr_config = env['ir.config_parameter']._get_ocr_config()
+    engine_config = env['ir.config_parameter']._get_ocr_engine_config(env.company.id)
+    uses_webhook = engines.DEFAULT_ENGINE in (engine_config['engine'], engine_config['fallback'])
+    if not ocr_config['api_key'] and not ocr_config['test_mode'] and uses_webhook:
+        _logger.error("[%s] OCR API key not configured in system parameters", timestamp)
+        return None
+    _logger.debug("[%s] OCR test mode is %s", timestamp, "enabled" if ocr_config['test_mode'] else "disabled")
+    return ocr_config
+
+def _load_ocr_config(timestamp):
+    """
+    Read the OCR API configuration without an environment (legacy)
     
-    _logger.info("[%s] Starting OCR processing for file: %s", 
-               timestamp, file_name)
+    Guesses the database from the server configuration, the current thread,
+    the HTTP request or the loaded registries, and opens a cursor of its own.
+    Only used by the legacy process_receipt_ocr() and process_receipts_ocr()
+    entry points; callers holding an environment should use process_receipt().
     
+    Args:
+        timestamp (str): Timestamp used to correlate log lines
+        
+    Returns:
+        dict: api_key, api_url, test_mode and the batching limits, or None if
+            the configuration could not be read
+    """
     # Get the current database name from the Odoo registry
     db_name = odoo.tools.config.get('db_name')
     
@@ -87,7 +121,7 @@ def process_receipt_ocr(file_data, file_name):
     
     if not db_name:
         _logger.error("[%s] Could not determine database name for OCR processing", timestamp)
-        return False
+        return None
         
     _logger.info("[%s] Using database: %s for OCR processing", timestamp, db_name)
     
@@ -96,58 +130,172 @@ def process_receipt_ocr(file_data, file_name):
         with Registry(db_name).cursor() as cr:
             env = api.Environment(cr, SUPERUSER_ID, {})
             
-            # Get API key and URL from system parameters
-            ICP = env['ir.config_parameter'].sudo()
-            api_key = ICP.get_param('ocr_api_key', False)
-            api_url = ICP.get_param('ocr_api_url', 'https://n8n.cre8or-lab.com/webhook/extract-receipt-details')
-            test_mode = ICP.get_param('ocr_test_mode', 'False').lower() == 'true'
-            
-            if not api_key and not test_mode:
-                _logger.error("[%s] OCR API key not configured in system parameters", timestamp)
-                return False
-                
-            _logger.info("[%s] OCR test mode is %s", timestamp, "enabled" if test_mode else "disabled")
+            return _get_ocr_config(env, timestamp)
     except (ValueError, TypeError, KeyError) as e:
         _logger.error("[%s] Error accessing database for OCR configuration: %s", 
                     timestamp, str(e), exc_info=True)
-        return False
+        return None
     except Exception as e:  # pylint: disable=broad-except
         # We catch all exceptions here to provide detailed error logging
         # but still fail gracefully if database access fails
         _logger.error("[%s] Unexpected error accessing database for OCR configuration: %s", 
                     timestamp, str(e), exc_info=True)
+        return None
+
+def _post(env, url, **kwargs):
+    """
+    Send a request to the OCR API through the pooled session
+    
+    When the caller has an environment, the call is guarded by the circuit
+    breaker shared by the workers and, once the breaker lets it through, takes
+    a token from the OCR rate limiter of its company: calls rejected by an open
+    breaker do not use up the quota. The legacy entry points call the API
+    unguarded.
+    
+    Raises:
+        OcrUnavailableError: the circuit breaker of the OCR API is open, too
+            many scans are in progress or the OCR quota of the company is used up
+    """
+    if env is None:
+        return http_client.post(url, **kwargs)
+    return circuit_breaker.post(env, url, before_send=lambda: rate_limiter.acquire(env), **kwargs)
+
+def _get_mock_result():
+    """
+    Build the mock OCR result returned when test mode is enabled
+    
+    Returns:
+        dict: OCR result in the new (nested 'output') format
+    """
+    return {
+        'output': {
+            'business_name': 'Test Vendor Inc.',
+            'receipt_number': 'TEST-1234',
+            'date': datetime.datetime.now().strftime('%Y-%m-%d'),
+            'items': [
+                {
+                    'quantity': 1,
+                    'description': 'Test Product',
+                    'amount': 100.00
+                },
+                {
+                    'quantity': 2,
+                    'description': 'Another Test Item',
+                    'amount': 23.45
+                }
+            ],
+            'subtotal': 123.45,
+            'tax': 10.45,
+            'total_amount': 133.90
+        }
+    }
+
+def process_receipt(env, file_data, file_name):
+    """
+    Process receipt OCR using external API
+    
+    Reads the configuration through the caller's environment, so no database
+    connection other than the caller's is used.
+    
+    Args:
+        env: Odoo environment of the caller
+        file_data (bytes): The binary data of the file to process
+        file_name (str): The name of the file
+        
+    Returns:
+        dict: OCR result data or False if processing failed
+    """
+    # Get current timestamp using standard datetime
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    _logger.info("[%s] Starting OCR processing for file: %s", 
+               timestamp, file_name)
+    
+    ocr_config = _get_ocr_config(env, timestamp)
+    if not ocr_config:
         return False
+    return _scan_with_engines(env, ocr_config, [ReceiptFile(file_name, data=file_data)], timestamp)[0]
+
+def process_receipt_file(env, receipt):
+    """
+    Process receipt OCR using external API, streaming the receipt file
+    
+    Same as process_receipt() for a receipt read from the filestore, which is
+    uploaded chunk by chunk instead of being loaded in memory.
+    
+    Args:
+        env: Odoo environment of the caller
+        receipt (ReceiptFile): The receipt to process
+        
+    Returns:
+        dict: OCR result data or False if processing failed
+    """
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    _logger.info("[%s] Starting OCR processing for file: %s", 
+               timestamp, receipt.name)
+    
+    ocr_config = _get_ocr_config(env, timestamp)
+    if not ocr_config:
+        return False
+    return _scan_with_engines(env, ocr_config, [receipt], timestamp)[0]
+
+def process_receipt_ocr(file_data, file_name):
+    """
+    Process receipt OCR using external API (legacy entry point)
+    
+    Kept for callers without an environment: the database is guessed and a
+    second connection is opened to read the configuration. Use
+    process_receipt() instead whenever an environment is available.
+    
+    Args:
+        file_data (bytes): The binary data of the file to process
+        file_name (str): The name of the file
+        
+    Returns:
+        dict: OCR result data or False if processing failed
+    """
+    # Get current timestamp using standard datetime
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    
+    _logger.info("[%s] Starting OCR processing for file: %s", 
+               timestamp, file_name)
+    
+    ocr_config = _load_ocr_config(timestamp)
+    if not ocr_config:
+        return False
+    return _process_receipt_with_config(None, ocr_config, ReceiptFile(file_name, data=file_data), timestamp)
+
+def _process_receipt_with_config(env, ocr_config, receipt, timestamp):
+    """
+    Send one receipt to the OCR API
+    
+    Args:
+        env: Odoo environment of the caller, None for the legacy entry points
+        ocr_config (dict): OCR configuration, see _get_ocr_config()
+        receipt (ReceiptFile): The receipt to process
+        timestamp (str): Timestamp used to correlate log lines
+        
+    Returns:
+        dict: OCR result data or False if processing failed
+        
+    Raises:
+        OcrUnavailableError: the circuit breaker of the OCR API is open
+    """
+    api_key = ocr_config['api_key']
+    api_url = ocr_config['api_url']
+    test_mode = ocr_config['test_mode']
     
     # Check if test mode is enabled - if so, return mock data without calling API
     if test_mode:
         _logger.info("[%s] Test mode is enabled. Returning mock OCR data without calling API", timestamp)
-        mock_data = {
-            'output': {
-                'business_name': 'Test Vendor Inc.',
-                'receipt_number': 'TEST-1234',
-                'date': datetime.datetime.now().strftime('%Y-%m-%d'),
-                'items': [
-                    {
-                        'quantity': 1,
-                        'description': 'Test Product',
-                        'amount': 100.00
-                    },
-                    {
-                        'quantity': 2,
-                        'description': 'Another Test Item',
-                        'amount': 23.45
-                    }
-                ],
-                'subtotal': 123.45,
-                'tax': 10.45,
-                'total_amount': 133.90
-            }
-        }
-        _logger.info("[%s] Mock OCR data: %s", timestamp, json.dumps(mock_data))
+        mock_data = _get_mock_result()
+        _logger.debug("[%s] Mock OCR data: %s", timestamp, payload(mock_data))
         return mock_data
     
     # Determine MIME type
-    mime_type = get_mime_type(file_data, file_name)
+    file_name = receipt.name
+    mime_type = receipt.mime_type
     if not mime_type:
         _logger.error("[%s] Could not determine MIME type for file: %s", timestamp, file_name)
         return False
@@ -157,13 +305,12 @@ def process_receipt_ocr(file_data, file_name):
     # --form 'receipt=@"receipt_1.png"' --form 'receipt=@"receipt_2.png"' 
     # --header 'Authorization: Bearer <API Key>'
     
-    headers = {
-        "Authorization": f"Bearer {api_key}"
-    }
+    # Stream the file with 'receipt' as the form field name
+    body = MultipartStream(files=[('receipt', receipt)])
     
-    # Create a files dictionary with 'receipt' as the key
-    files = {
-        'receipt': (file_name, file_data, mime_type)
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": body.content_type,
     }
     
     try:
@@ -171,108 +318,462 @@ def process_receipt_ocr(file_data, file_name):
         _logger.info("[%s] Sending request to OCR API: %s", timestamp, api_url)
         _logger.debug("[%s] Request details - Headers: %s", timestamp, headers)
         _logger.debug("[%s] Request details - File: %s, Size: %d bytes, MIME: %s", 
-                     timestamp, file_name, len(file_data), mime_type)
+                     timestamp, file_name, receipt.size, mime_type)
         
         # Send request to OCR API using multipart/form-data
-        response = requests.post(
-            url=api_url,
-            headers=headers,
-            files=files,
-            timeout=180  # 3 minute timeout
-        )
+        # Send through the pooled keep-alive session, which retries transient failures
+        with body:
+            response = _post(
+                env,
+                api_url,
+                headers=headers,
+                data=body,
+                timeout=RECEIPT_TIMEOUT
+            )
         
-        # Log response status and headers for debugging
-        _logger.debug("[%s] Response status: %d", timestamp, response.status_code)
-        _logger.debug("[%s] Response headers: %s", timestamp, response.headers)
+        return _parse_receipt_response(response, test_mode, timestamp)
+            
+    except requests.exceptions.RequestException as e:
+        _logger.error("[%s] Error sending request to OCR API: %s", timestamp, str(e))
+        return False
+    except OcrUnavailableError:
+        # Not a failure of this receipt: let the caller fail fast or defer the scan
+        raise
+    except Exception as e:  # pylint: disable=broad-except
+        _logger.error("[%s] Unexpected error in OCR processing: %s", timestamp, str(e), exc_info=True)
+        return False
+
+def _parse_receipt_response(response, test_mode, timestamp):
+    """
+    Map the response of the OCR API for a single receipt to its OCR result
+    
+    Works with requests and httpx responses alike.
+    
+    Args:
+        response: HTTP response of the OCR API
+        test_mode (bool): Whether OCR test mode is enabled
+        timestamp (str): Timestamp used to correlate log lines
         
-        # Check response status
-        if response.status_code != 200:
-            # Special handling for webhook not registered error (common in test environments)
-            if response.status_code == 404:
-                try:
-                    # Check if response has content before trying to parse as JSON
-                    if response.text and response.text.strip():
-                        error_data = response.json()
-                        error_message = error_data.get('message', '').lower()
-                        error_hint = error_data.get('hint', '')
+    Returns:
+        dict: OCR result data or False if processing failed
+    """
+    # Log response status and headers for debugging
+    _logger.debug("[%s] Response status: %d", timestamp, response.status_code)
+    _logger.debug("[%s] Response headers: %s", timestamp, response.headers)
+    
+    # Check response status
+    if response.status_code != 200:
+        # Special handling for webhook not registered error (common in test environments)
+        if response.status_code == 404:
+            try:
+                # Check if response has content before trying to parse as JSON
+                if response.text and response.text.strip():
+                    error_data = response.json()
+                    error_message = error_data.get('message', '').lower()
+                    error_hint = error_data.get('hint', '')
+                    
+                    if "webhook" in error_message and "not registered" in error_message:
+                        _logger.warning("[%s] OCR API webhook not registered. This is common in test environments. "
+                                      "Message: %s, Hint: %s", 
+                                      timestamp, error_data.get('message', ''), error_hint)
                         
-                        if "webhook" in error_message and "not registered" in error_message:
-                            _logger.warning("[%s] OCR API webhook not registered. This is common in test environments. "
-                                          "Message: %s, Hint: %s", 
-                                          timestamp, error_data.get('message', ''), error_hint)
-                            
-                            # Only return mock data for webhook errors if test_mode is enabled
-                            if test_mode:
-                                _logger.info("[%s] Returning mock OCR data for webhook error (test_mode enabled)", timestamp)
-                                mock_data = {
-                                    'output': {
-                                        'business_name': 'Test Vendor Inc.',
-                                        'receipt_description': 'Miscellaneous Expenses from Test Vendor Inc.',
-                                        'receipt_category': 'EXP_GEN',
-                                        'receipt_number': 'TEST-1234',
-                                        'date': datetime.datetime.now().strftime('%Y-%m-%d'),
-                                        'items': [
-                                            {
-                                                'quantity': 1,
-                                                'description': 'Test Product (Webhook Fallback)',
-                                                'amount': 100.00
-                                            }
-                                        ],
-                                        'subtotal': 100.00,
-                                        'tax': 10.00,
-                                        'total_amount': 110.00
-                                    }
+                        # Only return mock data for webhook errors if test_mode is enabled
+                        if test_mode:
+                            _logger.info("[%s] Returning mock OCR data for webhook error (test_mode enabled)", timestamp)
+                            mock_data = {
+                                'output': {
+                                    'business_name': 'Test Vendor Inc.',
+                                    'receipt_description': 'Miscellaneous Expenses from Test Vendor Inc.',
+                                    'receipt_category': 'EXP_GEN',
+                                    'receipt_number': 'TEST-1234',
+                                    'date': datetime.datetime.now().strftime('%Y-%m-%d'),
+                                    'items': [
+                                        {
+                                            'quantity': 1,
+                                            'description': 'Test Product (Webhook Fallback)',
+                                            'amount': 100.00
+                                        }
+                                    ],
+                                    'subtotal': 100.00,
+                                    'tax': 10.00,
+                                    'total_amount': 110.00
                                 }
-                                _logger.info("[%s] Mock OCR data: %s", timestamp, json.dumps(mock_data))
-                                return mock_data
-                            else:
-                                _logger.error("[%s] OCR API webhook not registered and test_mode is disabled. Cannot process receipt.", timestamp)
-                                return False
-                except (ValueError, json.JSONDecodeError) as e:
-                    _logger.error("[%s] Error parsing OCR API error response: %s", timestamp, str(e))
+                            }
+                            _logger.debug("[%s] Mock OCR data: %s", timestamp, payload(mock_data))
+                            return mock_data
+                        else:
+                            _logger.error("[%s] OCR API webhook not registered and test_mode is disabled. Cannot process receipt.", timestamp)
+                            return False
+            except (ValueError, json.JSONDecodeError) as e:
+                _logger.error("[%s] Error parsing OCR API error response: %s", timestamp, str(e))
+        
+        # Log the error for other status codes
+        _logger.error("[%s] OCR API returned error status code: %s, Response: %s", 
+                    timestamp, response.status_code, response.text[:500])
+        return False
+    
+    # Parse response JSON
+    try:
+        # Check if response has content before trying to parse as JSON
+        if not response.text or not response.text.strip():
+            _logger.error("[%s] OCR API returned empty response", timestamp)
+            return False
             
-            # Log the error for other status codes
-            _logger.error("[%s] OCR API returned error status code: %s, Response: %s", 
-                        timestamp, response.status_code, response.text[:500])
+        result = response.json()
+        
+        # Handle the new response format which is an array with a single object
+        if isinstance(result, list) and len(result) > 0:
+            _logger.info("[%s] Processing array response format", timestamp)
+            result = result[0]
+        
+        # Validate result structure
+        if not isinstance(result, dict):
+            _logger.error("[%s] OCR API returned invalid result format: %s", 
+                        timestamp, type(result).__name__)
             return False
         
-        # Parse response JSON
+        # Check for error in the response
+        if 'error' in result:
+            error_message = result.get('error')
+            _logger.error("[%s] OCR API returned an error: %s", timestamp, error_message)
+            return result  # Return the error result to be handled by the expense model
+        
+        _logger.info("[%s] OCR processing successful", timestamp)
+        _logger.debug("[%s] OCR result: %s", timestamp, payload(result, 500))
+        return result
+        
+    except (ValueError, json.JSONDecodeError) as e:
+        _logger.error("[%s] Error parsing OCR API response: %s", timestamp, str(e))
+        return False
+
+def _chunk_receipts(receipts, batch_size, max_bytes):
+    """
+    Split receipts into batches respecting the receipt count and payload limits
+    
+    A receipt larger than max_bytes on its own is sent in a batch of one.
+    
+    Args:
+        receipts (list): (index, ReceiptFile) tuples
+        batch_size (int): Maximum number of receipts per batch
+        max_bytes (int): Maximum total file size per batch
+        
+    Yields:
+        list: (index, ReceiptFile) tuples of one batch
+    """
+    batch, batch_bytes = [], 0
+    for receipt in receipts:
+        size = receipt[1].size
+        if batch and (len(batch) >= batch_size or batch_bytes + size > max_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(receipt)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+def _send_receipt_batch(env, batch, api_url, api_key, timestamp, max_timeout):
+    """
+    Send several receipts to the OCR API in one multipart request
+    
+    Args:
+        env: Odoo environment of the caller, None for the legacy entry points
+        batch (list): (index, ReceiptFile) tuples
+        api_url (str): OCR API endpoint
+        api_key (str): OCR API key
+        timestamp (str): Timestamp used to correlate log lines
+        max_timeout (int): longest wait for the answer, in seconds, whatever
+            the number of receipts (ocr_batch_timeout system parameter)
+        
+    Returns:
+        list: OCR results (or False) in the order of the batch, or None if the
+            response does not hold one result per receipt
+    """
+    # The webhook accepts several 'receipt' form parts in the same request
+    body = MultipartStream(files=[('receipt', receipt) for _index, receipt in batch])
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": body.content_type,
+    }
+    
+    _logger.info("[%s] Sending batch of %d receipts (%d bytes) to OCR API: %s", 
+               timestamp, len(batch), len(body), api_url)
+    with body:
+        response = _post(
+            env,
+            api_url,
+            headers=headers,
+            data=body,
+            timeout=min(RECEIPT_TIMEOUT * len(batch), max_timeout)
+        )
+    
+    if response.status_code != 200:
+        _logger.error("[%s] OCR API returned error status code for batch: %s, Response: %s", 
+                    timestamp, response.status_code, response.text[:500])
+        return [False] * len(batch)
+    if not response.text or not response.text.strip():
+        _logger.error("[%s] OCR API returned empty response for batch", timestamp)
+        return [False] * len(batch)
+    
+    try:
+        result = response.json()
+    except (ValueError, json.JSONDecodeError) as e:
+        _logger.error("[%s] Error parsing OCR API batch response: %s", timestamp, str(e))
+        return [False] * len(batch)
+    
+    # The API answers with one result per receipt part, in the order they were sent
+    if not isinstance(result, list) or len(result) != len(batch):
+        _logger.warning("[%s] OCR API returned %s result(s) for a batch of %d receipts", 
+                      timestamp, len(result) if isinstance(result, list) else type(result).__name__,
+                      len(batch))
+        return None
+    
+    results = []
+    for item in result:
+        if not isinstance(item, dict):
+            _logger.error("[%s] OCR API returned invalid result format in batch: %s", 
+                        timestamp, type(item).__name__)
+            item = False
+        elif 'error' in item:
+            _logger.error("[%s] OCR API returned an error in batch: %s", timestamp, item.get('error'))
+        results.append(item)
+    return results
+
+def process_receipts(env, receipts):
+    """
+    Process several receipts using as few OCR API requests as possible
+    
+    Receipts are packed up to the ocr_batch_size system parameter per request,
+    without exceeding ocr_batch_max_bytes of file data. When a batch response
+    cannot be mapped back to its receipts, they are sent one by one instead.
+    
+    Args:
+        env: Odoo environment of the caller
+        receipts (list): (file_data, file_name) tuples
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+    """
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if not receipts:
+        return []
+    _logger.info("[%s] Starting batched OCR processing for %d files", timestamp, len(receipts))
+    ocr_config = _get_ocr_config(env, timestamp)
+    if not ocr_config:
+        return [False] * len(receipts)
+    return _scan_with_engines(
+        env, ocr_config, [ReceiptFile(file_name, data=file_data) for file_data, file_name in receipts], timestamp)
+
+def process_receipt_files(env, receipts):
+    """
+    Process several receipts using as few OCR API requests as possible, streaming the receipt files
+    
+    Same as process_receipts() for receipts read from the filestore.
+    
+    Args:
+        env: Odoo environment of the caller
+        receipts (list): ReceiptFile objects
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+    """
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if not receipts:
+        return []
+    _logger.info("[%s] Starting batched OCR processing for %d files", timestamp, len(receipts))
+    ocr_config = _get_ocr_config(env, timestamp)
+    if not ocr_config:
+        return [False] * len(receipts)
+    return _scan_with_engines(env, ocr_config, receipts, timestamp)
+
+def process_receipts_ocr(receipts):
+    """
+    Process several receipts using as few OCR API requests as possible (legacy entry point)
+    
+    Same as process_receipts() for callers without an environment.
+    
+    Args:
+        receipts (list): (file_data, file_name) tuples
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+    """
+    timestamp = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    if not receipts:
+        return []
+    _logger.info("[%s] Starting batched OCR processing for %d files", timestamp, len(receipts))
+    ocr_config = _load_ocr_config(timestamp)
+    if not ocr_config:
+        return [False] * len(receipts)
+    return _process_receipts_with_config(
+        None, ocr_config, [ReceiptFile(file_name, data=file_data) for file_data, file_name in receipts], timestamp)
+
+def _process_receipts_with_config(env, ocr_config, receipts, timestamp):
+    """
+    Send several receipts to the OCR API in batches
+    
+    When the circuit breaker opens after some receipts were sent, the
+    remaining receipts are left unprocessed (False) rather than losing the
+    results already obtained.
+    
+    Args:
+        env: Odoo environment of the caller, None for the legacy entry points
+        ocr_config (dict): OCR configuration, see _get_ocr_config()
+        receipts (list): ReceiptFile objects
+        timestamp (str): Timestamp used to correlate log lines
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+        
+    Raises:
+        OcrUnavailableError: the circuit breaker of the OCR API is open
+    """
+    results = [False] * len(receipts)
+    
+    if ocr_config['test_mode']:
+        _logger.info("[%s] Test mode is enabled. Returning mock OCR data without calling API", timestamp)
+        return [_get_mock_result() for _receipt in receipts]
+    
+    to_send = []
+    for index, receipt in enumerate(receipts):
+        if not receipt.mime_type:
+            _logger.error("[%s] Could not determine MIME type for file: %s", timestamp, receipt.name)
+            continue
+        to_send.append((index, receipt))
+    
+    sent = 0
+    for batch in _chunk_receipts(to_send, ocr_config['batch_size'], ocr_config['batch_max_bytes']):
+        batch_results = None
         try:
-            # Check if response has content before trying to parse as JSON
-            if not response.text or not response.text.strip():
-                _logger.error("[%s] OCR API returned empty response", timestamp)
-                return False
-                
-            result = response.json()
-            
-            # Handle the new response format which is an array with a single object
-            if isinstance(result, list) and len(result) > 0:
-                _logger.info("[%s] Processing array response format", timestamp)
-                result = result[0]
-            
-            # Validate result structure
-            if not isinstance(result, dict):
-                _logger.error("[%s] OCR API returned invalid result format: %s", 
-                            timestamp, type(result).__name__)
-                return False
-            
-            # Check for error in the response
-            if 'error' in result:
-                error_message = result.get('error')
-                _logger.error("[%s] OCR API returned an error: %s", timestamp, error_message)
-                return result  # Return the error result to be handled by the expense model
-            
-            _logger.info("[%s] OCR processing successful. Result: %s", 
-                       timestamp, json.dumps(result)[:500])
-            return result
-            
-        except (ValueError, json.JSONDecodeError) as e:
-            _logger.error("[%s] Error parsing OCR API response: %s", timestamp, str(e))
-            return False
+            if len(batch) > 1:
+                try:
+                    batch_results = _send_receipt_batch(
+                        env, batch, ocr_config['api_url'], ocr_config['api_key'], timestamp,
+                        ocr_config['batch_timeout'])
+                except requests.exceptions.RequestException as e:
+                    _logger.error("[%s] Error sending batch request to OCR API: %s", timestamp, str(e))
+                    batch_results = [False] * len(batch)
             
-    except requests.exceptions.RequestException as e:
-        _logger.error("[%s] Error sending request to OCR API: %s", timestamp, str(e))
-        return False
-    except Exception as e:  # pylint: disable=broad-except
-        _logger.error("[%s] Unexpected error in OCR processing: %s", timestamp, str(e), exc_info=True)
-        return False
+            if batch_results is None:
+                # Single receipt, or a response that cannot be mapped back: one request per receipt
+                batch_results = []
+                for _index, receipt in batch:
+                    batch_results.append(_process_receipt_with_config(env, ocr_config, receipt, timestamp))
+                    sent += 1
+            else:
+                sent += len(batch)
+        except OcrUnavailableError as e:
+            if not sent:
+                raise
+            _logger.warning("[%s] OCR API became unavailable after %d receipts: %s", timestamp, sent, str(e))
+            batch_results = batch_results or []
+        
+        for (index, _receipt), result in zip(batch, batch_results):
+            results[index] = result
+        if len(batch_results) < len(batch):
+            break
+    
+    _logger.info("[%s] Batched OCR processing finished: %d/%d receipts extracted", 
+               timestamp, len([r for r in results if r]), len(receipts))
+    return results
+
+def _get_engines(env, timestamp):
+    """
+    Return the OCR engine of the company of the environment and its fallback
+    
+    An engine that is unknown or cannot run in this process (e.g. Tesseract
+    is not installed) is replaced by the remote webhook.
+    
+    Args:
+        env: Odoo environment of the caller
+        timestamp (str): Timestamp used to correlate log lines
+        
+    Returns:
+        tuple: (engine, fallback engine or None)
+    """
+    engine_config = env['ir.config_parameter']._get_ocr_engine_config(env.company.id)
+    engine = engines.get_engine(engine_config['engine'])
+    if engine is None or not engine.is_available():
+        _logger.warning("[%s] OCR engine %r is not available, using %r instead", 
+                      timestamp, engine_config['engine'], engines.DEFAULT_ENGINE)
+        engine = engines.get_engine(engines.DEFAULT_ENGINE)
+    fallback = engine_config['fallback'] and engines.get_engine(engine_config['fallback'])
+    if fallback and (fallback is engine or not fallback.is_available()):
+        _logger.debug("[%s] OCR fallback engine %r ignored", timestamp, engine_config['fallback'])
+        fallback = None
+    return engine, fallback or None
+
+def _scan_with_engine(env, engine, ocr_config, receipts, timestamp, scan=None):
+    """
+    Scan receipts with one engine, recording its statistics
+    
+    Args:
+        env: Odoo environment of the caller
+        engine (OcrEngine): engine to scan with
+        ocr_config (dict): OCR configuration, see _get_ocr_config()
+        receipts (list): ReceiptFile objects
+        timestamp (str): Timestamp used to correlate log lines
+        scan (callable): replaces engine.scan(), called with the receipts
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order,
+            the results tagged with the name of the engine
+        
+    Raises:
+        OcrUnavailableError: the engine cannot scan right now
+    """
+    Stat = env['hr.expense.ocr.engine.stat']
+    start = time.monotonic()
+    try:
+        if scan is not None:
+            results = scan(receipts)
+        else:
+            results = engine.scan(env, ocr_config, receipts, timestamp)
+    except OcrUnavailableError:
+        Stat._record_unavailable(engine.name, env.company.id)
+        raise
+    Stat._record_scan(engine.name, env.company.id, results, time.monotonic() - start)
+    for result in results:
+        if isinstance(result, dict):
+            result['engine'] = engine.name
+    return results
+
+def _scan_with_engines(env, ocr_config, receipts, timestamp, webhook_scan=None):
+    """
+    Scan receipts with the OCR engine of the company
+    
+    The engine is chosen with the ocr_engine system parameter. When it is
+    unavailable (e.g. the circuit breaker of the OCR API is open), the
+    receipts are scanned by the ocr_engine_fallback engine if one is set.
+    
+    Args:
+        env: Odoo environment of the caller
+        ocr_config (dict): OCR configuration, see _get_ocr_config()
+        receipts (list): ReceiptFile objects
+        timestamp (str): Timestamp used to correlate log lines
+        webhook_scan (callable): replaces the scan of the remote webhook,
+            e.g. with concurrent requests, called with the receipts
+        
+    Returns:
+        list: OCR result data or False for each receipt, in the same order
+        
+    Raises:
+        OcrUnavailableError: the engine is unavailable and there is no fallback
+    """
+    if ocr_config['test_mode']:
+        _logger.info("[%s] Test mode is enabled. Returning mock OCR data without calling API", timestamp)
+        return [_get_mock_result() for _receipt in receipts]
+    
+    engine, fallback = _get_engines(env, timestamp)
+    
+    def scan(engine):
+        override = webhook_scan if engine.name == engines.DEFAULT_ENGINE else None
+        return _scan_with_engine(env, engine, ocr_config, receipts, timestamp, scan=override)
+    
+    try:
+        return scan(engine)
+    except OcrUnavailableError as e:
+        if fallback is None:
+            raise
+        _logger.warning("[%s] OCR engine %s unavailable (%s), scanning %d receipt(s) with %s", 
+                      timestamp, engine.name, str(e), len(receipts), fallback.name)
+        return scan(fallback)
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Receipt preprocessing applied before the upload to the OCR API.
+
+Phone photos of receipts are often several megabytes. Images are rotated
+according to their EXIF orientation, downscaled and re-encoded in grayscale;
+PDFs are stripped of their blank pages, and of the pages beyond
+``max_pdf_pages`` when that limit is set (0, the default, keeps them all: the
+total of an invoice or a hotel folio is often on its last page). The pages
+dropped are reported so they can be logged on the expense. Receipts are read
+from their file, and a receipt that cannot be made smaller keeps being
+streamed from the filestore.
+"""
+import io
+import os
+
+from PIL import Image, ImageOps
+
+from odoo.tools.pdf import PdfFileReader, PdfFileWriter
+
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+IMAGE_FORMATS = {
+    'jpeg': ('JPEG', '.jpg'),
+    'webp': ('WEBP', '.webp'),
+}
+
+
+def _preprocess_image(stream, file_name, options):
+    """Rotate, downscale and re-encode an image to grayscale."""
+    image = Image.open(stream)
+    image = ImageOps.exif_transpose(image)
+
+    max_px = options['max_px']
+    if max_px and max(image.size) > max_px:
+        image.thumbnail((max_px, max_px), Image.LANCZOS)
+
+    if options['grayscale']:
+        image = image.convert('L')
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+
+    pil_format, extension = IMAGE_FORMATS.get(options['format'], IMAGE_FORMATS['jpeg'])
+    output = io.BytesIO()
+    image.save(output, format=pil_format, quality=options['quality'], optimize=True)
+    return output.getvalue(), os.path.splitext(file_name)[0] + extension
+
+
+def _is_blank_page(page):
+    """Return True if a PDF page has neither text nor images."""
+    if (page.extractText() or '').strip():
+        return False
+    resources = page.get('/Resources')
+    if resources is not None:
+        resources = resources.getObject()
+        if resources.get('/XObject'):
+            return False
+    return True
+
+
+def _preprocess_pdf(stream, options):
+    """Drop blank pages, and pages beyond the configured maximum if any.
+
+    Returns:
+        tuple: (PDF data or None to send the original, list of the
+            (page number, 'blank' or 'limit') tuples of the pages dropped)
+    """
+    reader = PdfFileReader(stream, strict=False)
+    page_count = reader.getNumPages()
+    writer = PdfFileWriter()
+    kept = 0
+    dropped = []
+    for index in range(page_count):
+        if options['max_pdf_pages'] and kept >= options['max_pdf_pages']:
+            dropped.extend((number, 'limit') for number in range(index + 1, page_count + 1))
+            break
+        page = reader.getPage(index)
+        if _is_blank_page(page):
+            dropped.append((index + 1, 'blank'))
+            continue
+        writer.addPage(page)
+        kept += 1
+
+    if not kept or not dropped:
+        # Nothing to strip (or nothing recognisable left): send the original
+        return None, []
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue(), dropped
+
+
+def preprocess_receipt_file(receipt, options):
+    """
+    Shrink a receipt before it is sent to the OCR API
+
+    The processed file is only used when it is smaller than the original; any
+    error leaves the receipt untouched so preprocessing can never make a scan
+    fail. An untouched receipt is returned as is, so a receipt read from the
+    filestore is still streamed from its file.
+
+    Args:
+        receipt (ReceiptFile): The receipt to process
+        options (dict): max_px, grayscale, format, quality and max_pdf_pages
+
+    Returns:
+        tuple: (receipt, original_size, processed_size, dropped_pages), the
+            latter being the (page number, 'blank' or 'limit') tuples of the
+            PDF pages left out of the processed receipt
+    """
+    original_size = receipt.size
+    processed = None
+    dropped_pages = []
+    try:
+        mime_type = receipt.mime_type
+        with receipt.open() as stream:
+            if mime_type and mime_type.startswith('image/'):
+                processed = _preprocess_image(stream, receipt.name, options)
+            elif mime_type == 'application/pdf':
+                processed_data, dropped_pages = _preprocess_pdf(stream, options)
+                if processed_data is not None:
+                    processed = (processed_data, receipt.name)
+    except Exception as e:  # pylint: disable=broad-except
+        _logger.warning("Could not preprocess receipt %s, sending it unchanged: %s", receipt.name, str(e))
+        processed = None
+
+    if processed is not None and len(processed[0]) < original_size:
+        receipt = ReceiptFile(processed[1], data=processed[0])
+    else:
+        dropped_pages = []
+
+    _logger.info("Preprocessed receipt %s: %d -> %d bytes", receipt.name, original_size, receipt.size)
+    if dropped_pages:
+        _logger.info("Dropped pages %s from receipt %s", dropped_pages, receipt.name)
+    return receipt, original_size, receipt.size, dropped_pages
+
+
+def preprocess_receipt(file_data, file_name, mime_type, options):
+    """
+    Shrink a receipt held in memory before it is sent to the OCR API
+
+    See preprocess_receipt_file().
+
+    Args:
+        file_data (bytes): The binary data of the file
+        file_name (str): The name of the file
+        mime_type (str): MIME type of the file
+        options (dict): max_px, grayscale, format, quality and max_pdf_pages
+
+    Returns:
+        tuple: (file_data, file_name, original_size, processed_size)
+    """
+    receipt, original_size, processed_size, _dropped_pages = preprocess_receipt_file(
+        ReceiptFile(file_name, data=file_data, mime_type=mime_type), options)
+    return receipt.read(), receipt.name, original_size, processed_size
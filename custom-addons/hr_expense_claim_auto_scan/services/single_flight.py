@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+Single-flight coordination of concurrent scans of the same receipt.
+
+The same receipt can be requested several times at once: ``create()`` queues
+it, a write of ``message_main_attachment_id`` queues it again, a user clicks
+"Scan Receipt" meanwhile. Each requester first claims the receipt, keyed by
+attachment checksum and OCR API URL, with a PostgreSQL advisory lock. The
+first one scans it and stores the result in the OCR cache; the others do not
+wait for it; they put their scan back in the OCR queue, which finds the
+result in the cache on its next run.
+
+The locks are transaction-level locks taken on the caller's cursor: no other
+connection is used, and they are released when the caller's transaction,
+which also commits the cached result, ends or when the worker dies.
+"""
+import hashlib
+
+from psycopg2.errors import SerializationFailure
+
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Advisory lock key space of the receipts being scanned ('OCRS')
+LOCK_NAMESPACE = 0x4f435253
+# Seconds before a receipt another request was scanning is looked up again in the OCR cache
+FLIGHT_RETRY_DELAY = 30
+
+
+def flight_key(checksum, api_url):
+    """Return the advisory lock key of the scans of a receipt by an OCR API."""
+    digest = hashlib.sha1(('%s|%s' % (checksum, api_url)).encode()).digest()
+    return int.from_bytes(digest[:4], 'big', signed=True)
+
+
+class SingleFlight:
+    """Claims on in-flight scans, held until the caller's transaction ends.
+
+    Usage::
+
+        flight = SingleFlight(env, api_url)
+        if flight.claim(checksum):
+            flight.store(checksum, scan())
+        else:
+            defer()
+
+    Args:
+        env: Odoo environment of the caller
+        api_url (str): OCR API the receipts are sent to
+        enabled (bool): False turns every claim into a no-op, e.g. when
+            results are not cached
+    """
+
+    def __init__(self, env, api_url, enabled=True):
+        self.env = env
+        self.api_url = api_url
+        self.enabled = bool(enabled and api_url)
+        self._held = set()
+
+    def claim(self, checksum):
+        """Claim the scan of a receipt, without waiting.
+
+        Args:
+            checksum (str): checksum of the receipt
+
+        Returns:
+            bool: True if the caller holds the claim and should scan the
+                receipt, False if another requester is scanning it
+        """
+        if not self.enabled or not checksum:
+            return True
+        if checksum in self._held:
+            return True
+        self.env.cr.execute("SELECT pg_try_advisory_xact_lock(%s, %s)",
+                            (LOCK_NAMESPACE, flight_key(checksum, self.api_url)))
+        if self.env.cr.fetchone()[0]:
+            self._held.add(checksum)
+            return True
+        _logger.info("Receipt %s is being scanned by another request", checksum)
+        return False
+
+    def store(self, checksum, result):
+        """Cache the OCR result of a receipt, committed with the caller's transaction.
+
+        A requester that claimed the receipt as another one committed its
+        result may not see that result in its snapshot; the result it got
+        itself is then kept out of the cache instead of failing the caller's
+        transaction.
+        """
+        if not self.enabled or not checksum:
+            return
+        try:
+            with self.env.cr.savepoint():
+                self.env['hr.expense.ocr.cache'].sudo()._store(checksum, self.api_url, result)
+        except SerializationFailure:
+            _logger.info("OCR result of receipt %s was cached by another request meanwhile", checksum)
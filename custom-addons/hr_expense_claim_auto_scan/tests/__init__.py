@@ -1,2 +1,16 @@
 # -*- coding: utf-8 -*-
 from . import test_ocr_processing
+from . import test_ocr_job
+from . import test_ocr_cache
+from . import test_ocr_batch
+from . import test_ocr_config
+from . import test_ocr_service
+from . import test_ocr_preprocess
+from . import test_ocr_streaming
+from . import test_ocr_backfill
+from . import test_ocr_async
+from . import test_ocr_engines
+from . import test_ocr_stub_server
+from . import test_ocr_queries
+from . import test_ocr_vendor_profile
+from . import test_expense_category_index
@@ -95,7 +95,7 @@ def test_ocr_legacy_format(env):
 
 def test_ocr_service(env):
     """Test the OCR service with mock data"""
-    from ..services.ocr_service import process_receipt_ocr
+    from ..services.ocr_service import process_receipt
     
     # Create a simple PDF file for testing
     test_data = b'%PDF-1.4\n1 0 obj\n<</Type/Catalog/Pages 2 0 R>>\nendobj\n2 0 obj\n<</Type/Pages/Count 1/Kids[3 0 R]>>\nendobj\n3 0 obj\n<</Type/Page/MediaBox[0 0 612 792]/Parent 2 0 R/Resources<<>>>>\nendobj\nxref\n0 4\n0000000000 65535 f\n0000000010 00000 n\n0000000053 00000 n\n0000000102 00000 n\ntrailer\n<</Size 4/Root 1 0 R>>\nstartxref\n178\n%%EOF\n'
@@ -107,7 +107,7 @@ def test_ocr_service(env):
     _logger.info("Testing OCR service with mock data")
     
     # Process the test data
-    result = process_receipt_ocr(test_data, 'test.pdf')
+    result = process_receipt(env, test_data, 'test.pdf')
     
     # Log the result
     _logger.info("OCR service result: %s", result)
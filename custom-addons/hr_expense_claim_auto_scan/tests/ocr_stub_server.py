@@ -0,0 +1,363 @@
+# -*- coding: utf-8 -*-
+"""
+Local stand-in for the OCR API, recording and replaying real exchanges.
+
+In record mode the server forwards every request to the real OCR API and
+stores the exchange (status, headers, body and latency; never the API key)
+in a cassette. In replay mode it answers from a cassette, keyed by the
+checksums of the uploaded receipts, with a configurable latency distribution
+and a mix of faults: "webhook not registered" 404s, 5xx responses and
+requests left unanswered until the client times out.
+
+It has no dependency on Odoo, so it also runs on its own, e.g. to benchmark
+the OCR client, its retries and the queue against a running server::
+
+    python ocr_stub_server.py --cassette cassettes/receipts.json --port 8069 \\
+        --latency lognormal:0.7,0.4 --fault webhook_404=0.02 --fault server_error=0.05
+
+    python ocr_stub_server.py --record https://ocr.example.com/extract --cassette new.json
+
+and in tests::
+
+    with OcrStubServer(cassette=CASSETTE, latency='fixed:0.05', seed=1) as server:
+        ICP.set_param('ocr_api_url', server.url)
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import logging
+import math
+import random
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+_logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+# Server errors picked at random for the server_error fault
+SERVER_ERROR_STATUSES = (500, 502, 503, 504)
+# The OCR client gives up after 180 seconds
+DEFAULT_HANG = 190
+FAULTS = ('webhook_404', 'server_error', 'timeout')
+WEBHOOK_NOT_REGISTERED = {
+    'code': 404,
+    'message': 'The requested webhook "POST extract-receipt-details" is not registered.',
+    'hint': "Click the 'Test workflow' button on the canvas, then try again.",
+}
+# Answer of receipts missing from the cassette
+NOT_RECORDED = {'error': 'Receipt not recorded in the cassette'}
+
+
+def receipt_key(content_type, body):
+    """Return the cassette key of a request: the checksums of its receipt parts.
+
+    Args:
+        content_type (str): Content-Type header of the request
+        body (bytes): multipart/form-data body
+
+    Returns:
+        str: checksums of the uploaded files, in order, or of the whole body
+            when it is not multipart
+    """
+    message = BytesParser(policy=HTTP).parsebytes(
+        b'Content-Type: ' + (content_type or '').encode('latin-1') + b'\r\n\r\n' + body)
+    if not message.is_multipart():
+        return hashlib.sha1(body).hexdigest()
+    checksums = [hashlib.sha1(part.get_payload(decode=True) or b'').hexdigest()
+                 for part in message.iter_parts() if part.get_filename() is not None]
+    return ','.join(checksums)
+
+
+def parse_latency(spec):
+    """Return a latency model from its specification.
+
+    Args:
+        spec (str): ``fixed:<seconds>``, ``uniform:<low>,<high>``,
+            ``normal:<mean>,<stddev>``, ``lognormal:<median>,<sigma>`` or
+            ``recorded[:<factor>]`` (the latency of the cassette, scaled);
+            None for no delay
+
+    Returns:
+        callable: (random.Random, recorded latency) -> seconds to wait
+    """
+    if not spec:
+        return lambda rng, recorded: 0.0
+    kind, _sep, args = spec.partition(':')
+    params = [float(arg) for arg in args.split(',') if arg.strip()]
+    if kind == 'fixed':
+        value, = params
+        return lambda rng, recorded: value
+    if kind == 'uniform':
+        low, high = params
+        return lambda rng, recorded: rng.uniform(low, high)
+    if kind == 'normal':
+        mean, stddev = params
+        return lambda rng, recorded: max(rng.gauss(mean, stddev), 0.0)
+    if kind == 'lognormal':
+        median, sigma = params
+        return lambda rng, recorded: rng.lognormvariate(math.log(median), sigma)
+    if kind == 'recorded':
+        factor = params[0] if params else 1.0
+        return lambda rng, recorded: (recorded or 0.0) * factor
+    raise ValueError("Unknown latency distribution: %s" % spec)
+
+
+class Cassette:
+    """Recorded exchanges with the OCR API, stored as JSON.
+
+    Args:
+        path (str): file the cassette is loaded from and saved to, None to
+            keep it in memory
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.upstream = None
+        self.interactions = []
+        self._by_key = {}
+        self._lock = threading.Lock()
+        if path:
+            try:
+                with open(path) as cassette_file:
+                    data = json.load(cassette_file)
+            except FileNotFoundError:
+                data = {}
+            self.upstream = data.get('upstream')
+            for interaction in data.get('interactions', []):
+                self.add(interaction)
+
+    def add(self, interaction):
+        with self._lock:
+            self.interactions.append(interaction)
+            self._by_key.setdefault(interaction['key'], interaction)
+
+    def find(self, key, rng):
+        """Return the exchange recorded for a request, or a random one when
+        the cassette has no key (e.g. hand-written payload shapes)."""
+        interaction = self._by_key.get(key)
+        if interaction is None:
+            unkeyed = self._by_key.get('*')
+            if unkeyed is not None:
+                candidates = [i for i in self.interactions if i['key'] == '*']
+                interaction = rng.choice(candidates)
+        return interaction
+
+    def save(self, path=None):
+        path = path or self.path
+        with self._lock:
+            data = {
+                'version': CASSETTE_VERSION,
+                'upstream': self.upstream,
+                'interactions': list(self.interactions),
+            }
+        with open(path, 'w') as cassette_file:
+            json.dump(data, cassette_file, indent=2, sort_keys=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        _logger.debug("OCR stub: " + format, *args)
+
+    def _send(self, status, body, headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        body = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            if name.lower() not in ('content-length', 'transfer-encoding', 'connection', 'content-encoding'):
+                self.send_header(name, value)
+        if not any(name.lower() == 'content-type' for name in (headers or {})):
+            self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        key = receipt_key(self.headers.get('Content-Type'), body)
+        if stub.record:
+            interaction = stub._forward(self.headers, body, key)
+            outcome = 'recorded'
+        else:
+            fault, delay, interaction = stub._draw(key)
+            if fault == 'timeout':
+                stub._count('timeout')
+                # Answer nothing; the connection is dropped once the client has given up
+                stub._stopping.wait(stub.hang)
+                self.close_connection = True
+                return
+            stub._stopping.wait(delay)
+            if fault == 'webhook_404':
+                interaction = {'status': 404, 'body': WEBHOOK_NOT_REGISTERED}
+            elif fault == 'server_error':
+                status = stub._rng_choice(SERVER_ERROR_STATUSES)
+                interaction = {'status': status, 'body': {'message': 'Stub server error %d' % status}}
+            elif interaction is None:
+                fault = 'not_recorded'
+                interaction = {'status': 200, 'body': NOT_RECORDED}
+            outcome = fault or 'replayed'
+        stub._count(outcome)
+        self._send(interaction['status'], interaction['body'], interaction.get('headers'))
+
+
+class OcrStubServer:
+    """Stand-in OCR API on a local port, run in a background thread.
+
+    Args:
+        cassette (str): cassette file to replay, or to record into
+        latency (str): latency distribution of the replayed answers, see
+            parse_latency()
+        faults (dict): probability of each fault per request: webhook_404,
+            server_error and timeout
+        seed (int): seed of the random draws, for reproducible runs
+        hang (float): seconds an unanswered request is held open
+        upstream (str): URL of the real OCR API to record from, None to replay
+        api_key (str): API key sent to the real OCR API when recording;
+            defaults to the Authorization header of the client
+        host (str): interface to listen on
+        port (int): port to listen on, 0 for any free port
+    """
+
+    def __init__(self, cassette=None, latency=None, faults=None, seed=None, hang=DEFAULT_HANG,
+                 upstream=None, api_key=None, host='127.0.0.1', port=0):
+        unknown = set(faults or {}) - set(FAULTS)
+        if unknown:
+            raise ValueError("Unknown faults: %s" % ', '.join(sorted(unknown)))
+        self.cassette = Cassette(cassette)
+        self.latency = parse_latency(latency)
+        self.faults = dict(faults or {})
+        self.hang = hang
+        self.record = bool(upstream)
+        self.upstream = upstream
+        self.api_key = api_key
+        self.stats = {}
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self
+        self._thread = None
+        if self.record:
+            self.cassette.upstream = upstream
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return 'http://%s:%d/webhook/extract-receipt-details' % (host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name='ocr-stub-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopping.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+        if self.record and self.cassette.path:
+            self.cassette.save()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _count(self, outcome):
+        with self._rng_lock:
+            self.stats[outcome] = self.stats.get(outcome, 0) + 1
+
+    def _rng_choice(self, choices):
+        with self._rng_lock:
+            return self._rng.choice(choices)
+
+    def _draw(self, key):
+        """Draw the fault and the latency of a request, and find its answer."""
+        with self._rng_lock:
+            fault, roll = None, self._rng.random()
+            for name in FAULTS:
+                probability = self.faults.get(name, 0.0)
+                if roll < probability:
+                    fault = name
+                    break
+                roll -= probability
+            interaction = self.cassette.find(key, self._rng)
+            delay = self.latency(self._rng, interaction and interaction.get('latency'))
+        return fault, delay, interaction
+
+    def _forward(self, headers, body, key):
+        """Send a request to the real OCR API and record the exchange."""
+        parts = urlsplit(self.upstream)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        connection = connection_class(parts.hostname, parts.port, timeout=DEFAULT_HANG)
+        forward_headers = {
+            'Content-Type': headers.get('Content-Type'),
+            'Authorization': 'Bearer %s' % self.api_key if self.api_key else headers.get('Authorization', ''),
+        }
+        start = time.monotonic()
+        try:
+            connection.request('POST', parts.path or '/', body=body, headers=forward_headers)
+            response = connection.getresponse()
+            response_body = response.read()
+            interaction = {
+                'key': key,
+                'status': response.status,
+                'headers': {'Content-Type': response.getheader('Content-Type', 'application/json')},
+                'body': response_body.decode('utf-8', 'replace'),
+                'latency': round(time.monotonic() - start, 3),
+            }
+        finally:
+            connection.close()
+        self.cassette.add(interaction)
+        return interaction
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stand-in OCR API recording and replaying real exchanges")
+    parser.add_argument('--cassette', required=True, help="cassette file to replay, or to record into")
+    parser.add_argument('--record', metavar='URL', help="record the exchanges with the OCR API at URL")
+    parser.add_argument('--api-key', help="API key sent to the OCR API when recording")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', help="latency distribution, e.g. fixed:0.5, lognormal:0.7,0.4 or recorded")
+    parser.add_argument('--fault', action='append', default=[], metavar='NAME=PROBABILITY',
+                        help="fault probability per request: %s" % ', '.join(FAULTS))
+    parser.add_argument('--hang', type=float, default=DEFAULT_HANG,
+                        help="seconds unanswered requests are held open")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    faults = {}
+    for fault in args.fault:
+        name, _sep, probability = fault.partition('=')
+        faults[name] = float(probability)
+    logging.basicConfig(level=logging.INFO)
+    server = OcrStubServer(cassette=args.cassette, latency=args.latency, faults=faults, seed=args.seed,
+                           hang=args.hang, upstream=args.record, api_key=args.api_key,
+                           host=args.host, port=args.port)
+    _logger.info("OCR stub server %s %s on %s", "recording" if server.record else "replaying",
+                 args.cassette, server.url)
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        _logger.info("OCR stub server answers: %s", server.stats)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the expense category index of the OCR result mapping
+"""
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestExpenseCategoryIndex(common.TransactionCase):
+    """Test the resolution of the receipt categories to expense categories"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestExpenseCategoryIndex, cls).setUpClass()
+        cls.Product = cls.env['product.product']
+        cls.meals = cls.Product.create({
+            'name': 'Business Meals',
+            'default_code': 'EXP_IDX_MEALS',
+            'can_be_expensed': True,
+        })
+        cls.taxi = cls.Product.create({
+            'name': 'Taxi Rides',
+            'default_code': 'EXP_IDX_TAXI',
+            'can_be_expensed': True,
+        })
+
+    def test_01_matching(self):
+        """Codes then names, exact then partial, case-insensitive"""
+        self.assertEqual(self.Product._find_expense_category('EXP_IDX_MEALS'), self.meals)
+        self.assertEqual(self.Product._find_expense_category(' exp_idx_taxi '), self.taxi)
+        self.assertEqual(self.Product._find_expense_category('IDX_MEAL'), self.meals)
+        self.assertEqual(self.Product._find_expense_category('taxi rides'), self.taxi)
+        self.assertEqual(self.Product._find_expense_category('business'), self.meals)
+        self.assertFalse(self.Product._find_expense_category('EXP_IDX_NOWHERE'))
+        self.assertFalse(self.Product._find_expense_category(None))
+
+    def test_02_zero_queries(self):
+        """Once built, the index resolves categories without any query"""
+        self.Product._find_expense_category('EXP_IDX_MEALS')
+        with self.assertQueryCount(0):
+            self.Product._find_expense_category('EXP_IDX_MEALS')
+            self.Product._find_expense_category('business')
+            self.Product._find_expense_category('EXP_IDX_NOWHERE')
+
+    def test_03_invalidation(self):
+        """Created, written and deleted expense categories are seen at once"""
+        self.assertFalse(self.Product._find_expense_category('EXP_IDX_HOTEL'))
+        hotel = self.Product.create({'name': 'Hotel Nights', 'default_code': 'EXP_IDX_HOTEL', 'can_be_expensed': True})
+        self.assertEqual(self.Product._find_expense_category('EXP_IDX_HOTEL'), hotel)
+
+        hotel.default_code = 'EXP_IDX_LODGING'
+        self.assertEqual(self.Product._find_expense_category('EXP_IDX_LODGING'), hotel)
+
+        hotel.product_tmpl_id.can_be_expensed = False
+        self.assertFalse(self.Product._find_expense_category('EXP_IDX_LODGING'))
+
+        self.taxi.unlink()
+        self.assertFalse(self.Product._find_expense_category('EXP_IDX_TAXI'))
+
+    def test_04_companies(self):
+        """The expense categories of other companies are not matched"""
+        other_company = self.env['res.company'].create({'name': 'Category Index Company'})
+        self.meals.company_id = other_company
+        self.assertFalse(self.Product._find_expense_category('EXP_IDX_MEALS'))
+        self.assertEqual(
+            self.Product.with_context(allowed_company_ids=[other_company.id])._find_expense_category('EXP_IDX_MEALS'),
+            self.meals)
+
+    def test_05_fuzzy(self):
+        """Noisy categories the index misses are matched by trigram similarity"""
+        if not self.env.registry.has_trigram:
+            self.skipTest("pg_trgm extension unavailable")
+        self.assertEqual(self.Product._find_expense_category('EXP IDX MEALS'), self.meals)
+        self.assertEqual(self.Product._find_expense_category('Exp_Idx_Taxi.'), self.taxi)
+        self.assertEqual(self.Product._find_expense_category('Busines Meal'), self.meals)
+        self.assertFalse(self.Product._find_expense_category('Zebra'))
+
+        self.env['ir.config_parameter'].sudo().set_param('ocr_category_similarity', '1.0')
+        self.assertFalse(self.Product._find_expense_category('Busines Meal'))
+
+    def test_06_fuzzy_single_query(self):
+        """A fuzzy match costs one query"""
+        if not self.env.registry.has_trigram:
+            self.skipTest("pg_trgm extension unavailable")
+        self.Product._find_expense_category('EXP IDX MEALS')
+        self.env['ir.config_parameter'].sudo()._get_ocr_config()
+        with self.assertQueryCount(1):
+            self.assertEqual(self.Product._find_expense_category('EXP IDX MEALS'), self.meals)
+
+    def test_07_invalidation_scope(self):
+        """Only writes changing an indexed value of an expense category clear the cache"""
+        other = self.Product.create({'name': 'Office Chair', 'default_code': 'IDX_CHAIR'})
+        self.Product._find_expense_category('EXP_IDX_MEALS')
+        with patch.object(type(self.Product), '_clear_expense_category_index', autospec=True) as clear:
+            other.write({'name': 'Desk Chair', 'default_code': 'IDX_DESK', 'active': False})
+            other.product_tmpl_id.name = 'Standing Desk'
+            self.meals.write({'name': 'Business Meals', 'default_code': 'EXP_IDX_MEALS'})
+            self.meals.product_tmpl_id.write({'company_id': False})
+            self.assertEqual(clear.call_count, 0)
+
+            for product, vals in ((self.meals, {'default_code': 'EXP_IDX_DINNERS'}),
+                                  (self.taxi.product_tmpl_id, {'name': 'Cab Rides'}),
+                                  # Becoming an expense category, and no longer being one
+                                  (other, {'active': True, 'can_be_expensed': True}),
+                                  (self.taxi.product_tmpl_id, {'can_be_expensed': False})):
+                clear.reset_mock()
+                product.write(vals)
+                self.assertTrue(clear.called, vals)
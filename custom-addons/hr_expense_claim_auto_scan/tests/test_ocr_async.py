@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the asyncio OCR client used by batch scans
+"""
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+
+from ..services import async_ocr
+from .test_ocr_batch import FakeResponse, PNG_DATA
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestOCRAsync(common.TransactionCase):
+    """Test concurrent scans with the requests fallback of the asyncio client"""
+
+    def setUp(self):
+        super(TestOCRAsync, self).setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        ICP.set_param('ocr_api_url', 'https://ocr.example.com/extract')
+        # Exercise the fallback: the test server may or may not have httpx
+        patcher = patch.object(async_ocr, 'httpx', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.receipts = [ReceiptFile('r%d.png' % index, data=PNG_DATA + bytes([index])) for index in range(6)]
+
+    def test_01_concurrency_is_capped_and_order_kept(self):
+        """Receipts are scanned concurrently, at most `concurrency` at a time, results in order"""
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, peak
+
+        def post(url, data=None, **kwargs):
+            with lock:
+                in_flight[0] += 1
+                in_flight[1] = max(in_flight)
+            body = data.read()
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            name = body.split(b'filename="', 1)[1].split(b'"', 1)[0].decode()
+            return FakeResponse([{'output': {'business_name': name}}])
+
+        with patch.object(async_ocr.http_client, 'post', side_effect=post):
+            results = async_ocr.scan_receipt_files(self.env, self.receipts, concurrency=3)
+
+        self.assertEqual([r['output']['business_name'] for r in results],
+                         ['r%d.png' % index for index in range(6)])
+        self.assertLessEqual(in_flight[1], 3)
+        self.assertGreater(in_flight[1], 1, "Receipts should be scanned concurrently")
+
+    def test_02_failures_do_not_stop_the_others(self):
+        """A failed receipt yields False without affecting the other results"""
+        def post(url, data=None, **kwargs):
+            body = data.read()
+            if b'filename="r2.png"' in body:
+                return FakeResponse({'message': 'boom'}, status_code=400)
+            return FakeResponse([{'output': {'business_name': 'Vendor'}}])
+
+        with patch.object(async_ocr.http_client, 'post', side_effect=post):
+            results = async_ocr.scan_receipt_files(self.env, self.receipts, concurrency=2)
+
+        self.assertFalse(results[2])
+        self.assertEqual(len([r for r in results if r]), 5)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the resumable OCR backfill of existing expenses
+"""
+import base64
+import logging
+
+from odoo.exceptions import ValidationError
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+PNG_DATA = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+@tagged('post_install', '-at_install')
+class TestOCRBackfill(common.TransactionCase):
+    """Test the chunked, checkpointed scan of existing expenses"""
+
+    def setUp(self):
+        super(TestOCRBackfill, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('ocr_test_mode', 'True')
+        self.expenses = self.env['hr.expense']
+        for index in range(5):
+            expense = self.env['hr.expense'].create({
+                'name': 'Backfill Expense %d' % index,
+                'employee_id': self.env.ref('hr.employee_admin').id,
+                'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+                'total_amount': 10.0,
+            })
+            attachment = self.env['ir.attachment'].create({
+                'name': 'backfill_receipt_%d.png' % index,
+                'datas': base64.b64encode(PNG_DATA + bytes([index])),
+                'res_model': 'hr.expense',
+                'res_id': expense.id,
+            })
+            expense.message_main_attachment_id = attachment
+            self.expenses |= expense
+        # Existing expenses: attached before the module queued scans
+        self.env['hr.expense.ocr.job'].search([('expense_id', 'in', self.expenses.ids)]).unlink()
+        self.expenses.ocr_status = False
+
+    def _create_backfill(self, **vals):
+        return self.env['hr.expense.ocr.backfill'].create(dict({
+            'domain': str([('id', 'in', self.expenses.ids)]),
+            'workers': 2,
+            'chunk_size': 2,
+        }, **vals))
+
+    def test_01_backfill_scans_all_expenses(self):
+        """A backfill scans every selected expense and records its progress"""
+        backfill = self._create_backfill()
+        backfill._mark_running()
+        self.assertEqual(backfill.total_count, 5)
+
+        processed = backfill._run()
+
+        self.assertEqual(processed, 5)
+        self.assertEqual(backfill.state, 'done')
+        self.assertEqual(backfill.done_count, 5)
+        self.assertEqual(backfill.failed_count, 0)
+        self.assertEqual(backfill.last_expense_id, max(self.expenses.ids))
+        self.assertEqual(backfill.progress, 100.0)
+        self.assertEqual(set(self.expenses.mapped('ocr_status')), {'processed'})
+
+    def test_02_backfill_resumes_from_checkpoint(self):
+        """A backfill stopped after a wave resumes after its checkpoint"""
+        backfill = self._create_backfill(workers=1)
+        backfill._mark_running()
+
+        # A negligible time budget stops after the first wave of one chunk
+        backfill._run(max_duration=1e-9)
+        first_wave = self.expenses.sorted('id')[:2]
+        self.assertEqual(backfill.state, 'running')
+        self.assertEqual(backfill.last_expense_id, first_wave[-1].id)
+        self.assertEqual(set(first_wave.mapped('ocr_status')), {'processed'})
+        self.assertFalse(any((self.expenses - first_wave).mapped('ocr_status')))
+
+        backfill.action_pause()
+        self.assertEqual(backfill._run(), 0, "A paused backfill must not scan")
+
+        backfill._mark_running()
+        self.assertEqual(backfill.total_count, 5, "Resuming must not recount the expenses")
+        backfill._run()
+        self.assertEqual(backfill.state, 'done')
+        self.assertEqual(backfill.done_count, 5)
+
+    def test_03_invalid_settings(self):
+        """Backfills reject unusable domains and worker counts"""
+        with self.assertRaises(ValidationError):
+            self._create_backfill(domain="[('id', '=',")
+        with self.assertRaises(ValidationError):
+            self._create_backfill(workers=0)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for batched submission of receipts to the OCR API
+"""
+import base64
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+
+from ..services import ocr_service
+
+_logger = logging.getLogger(__name__)
+
+PNG_DATA = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response"""
+
+    def __init__(self, payload, status_code=200):
+        self.payload = payload
+        self.status_code = status_code
+        self.text = repr(payload)
+        self.headers = {}
+
+    def json(self):
+        return self.payload
+
+
+@tagged('post_install', '-at_install')
+class TestOCRBatch(common.TransactionCase):
+    """Test packing of receipts into batches and mapping of batch responses"""
+
+    def setUp(self):
+        super(TestOCRBatch, self).setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        ICP.set_param('ocr_batch_size', '2')
+
+    def test_01_chunking_respects_limits(self):
+        """Batches respect both the receipt count and the payload size"""
+        receipts = [(index, ReceiptFile('r%d.png' % index, data=b'x' * size))
+                    for index, size in enumerate([10, 10, 10, 50, 10])]
+        batches = list(ocr_service._chunk_receipts(receipts, batch_size=2, max_bytes=40))
+        self.assertEqual([[r[0] for r in batch] for batch in batches], [[0, 1], [2], [3], [4]])
+
+    def test_02_batch_response_is_mapped_in_order(self):
+        """One request carries several receipts and results come back in order"""
+        payload = [
+            {'output': {'business_name': 'Vendor A'}},
+            {'output': {'business_name': 'Vendor B'}},
+        ]
+        bodies = []
+
+        def post(url, data=None, **kwargs):
+            bodies.append(data.read())
+            return FakeResponse(payload)
+
+        with patch.object(ocr_service, '_load_ocr_config', return_value={
+                'api_key': 'test-key', 'api_url': 'https://ocr.example.com', 'test_mode': False,
+                'batch_size': 2, 'batch_max_bytes': 1024 * 1024, 'batch_timeout': 300}), \
+             patch.object(ocr_service.http_client, 'post', side_effect=post):
+            results = ocr_service.process_receipts_ocr([(PNG_DATA, 'a.png'), (PNG_DATA, 'b.png')])
+
+        self.assertEqual(len(bodies), 1, "Both receipts should be sent in one request")
+        self.assertEqual(bodies[0].count(b'name="receipt"'), 2)
+        self.assertEqual([r['output']['business_name'] for r in results], ['Vendor A', 'Vendor B'])
+
+    def test_03_batch_timeout_capped(self):
+        """A batch waits longer than a single receipt, but never beyond ocr_batch_timeout"""
+        self.env['ir.config_parameter'].sudo().set_param('ocr_batch_size', '10')
+        self.env['ir.config_parameter'].sudo().set_param('ocr_batch_timeout', '240')
+        receipts = [ReceiptFile('r%d.png' % index, data=PNG_DATA + bytes([index])) for index in range(10)]
+        timeouts = []
+
+        def post(url, data=None, timeout=None, **kwargs):
+            timeouts.append(timeout)
+            return FakeResponse([{'output': {}}] * 10)
+
+        with patch.object(ocr_service.http_client, 'post', side_effect=post):
+            ocr_service.process_receipt_files(self.env, receipts)
+            ocr_service.process_receipt_files(self.env, receipts[:1])
+        self.assertEqual(timeouts, [240, ocr_service.RECEIPT_TIMEOUT])
+
+    def test_04_batched_expense_scan(self):
+        """Several expenses are scanned together and each gets its own result"""
+        self.env['ir.config_parameter'].sudo().set_param('ocr_test_mode', 'True')
+        expenses = self.env['hr.expense']
+        for index in range(3):
+            expense = self.env['hr.expense'].create({
+                'name': 'Batch Expense %d' % index,
+                'employee_id': self.env.ref('hr.employee_admin').id,
+                'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+                'total_amount': 10.0,
+            })
+            attachment = self.env['ir.attachment'].create({
+                'name': 'batch_receipt_%d.png' % index,
+                'datas': base64.b64encode(PNG_DATA + bytes([index])),
+                'res_model': 'hr.expense',
+                'res_id': expense.id,
+            })
+            expense.message_main_attachment_id = attachment
+            expenses |= expense
+
+        outcome = expenses._auto_scan_attachments()
+
+        self.assertEqual(outcome, {expense.id: True for expense in expenses})
+        self.assertEqual(set(expenses.mapped('ocr_status')), {'processed'})
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the content-addressed OCR result cache
+"""
+import base64
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from ..services import ocr_service, single_flight
+
+_logger = logging.getLogger(__name__)
+
+API_URL = 'https://ocr.example.com/webhook/extract-receipt-details'
+
+
+@tagged('post_install', '-at_install')
+class TestOCRCache(common.TransactionCase):
+    """Test lookup, hit/miss counting and eviction of cached OCR results"""
+
+    def setUp(self):
+        super(TestOCRCache, self).setUp()
+        self.Cache = self.env['hr.expense.ocr.cache'].sudo()
+        self.result = {'output': {'business_name': 'Cached Vendor', 'total_amount': 42.0}}
+
+    def test_01_store_and_lookup(self):
+        """A stored result is returned for the same checksum and API only"""
+        self.assertIsNone(self.Cache._lookup('abc123', API_URL))
+        self.Cache._store('abc123', API_URL, self.result)
+
+        self.assertEqual(self.Cache._lookup('abc123', API_URL), self.result)
+        self.assertIsNone(self.Cache._lookup('abc123', API_URL + '-v2'),
+                          "Results from another OCR API must not be reused")
+
+        entry = self.Cache.search([('checksum', '=', 'abc123')])
+        self.assertEqual(entry.hit_count, 1)
+        self.assertEqual(entry.miss_count, 1)
+
+    def test_02_errors_are_not_cached(self):
+        """Error payloads from the API are never cached"""
+        self.Cache._store('def456', API_URL, {'error': 'unreadable receipt'})
+        self.assertFalse(self.Cache.search([('checksum', '=', 'def456')]))
+
+    def test_03_eviction_keeps_max_entries(self):
+        """Eviction trims the cache down to ocr_cache_max_entries"""
+        self.env['ir.config_parameter'].sudo().set_param('ocr_cache_max_entries', '2')
+        for checksum in ('c1', 'c2', 'c3'):
+            self.Cache._store(checksum, API_URL, self.result)
+
+        self.Cache._cron_evict()
+        self.assertEqual(self.Cache.search_count([]), 2)
+
+    def test_04_concurrent_scan_is_deferred(self):
+        """A receipt being scanned by another request is not scanned again, its scan is queued"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        ICP.set_param('ocr_api_url', API_URL)
+        expense = self.env['hr.expense'].create({
+            'name': 'Single Flight Expense',
+            'employee_id': self.env.ref('hr.employee_admin').id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 10.0,
+        })
+        attachment = self.env['ir.attachment'].create({
+            'name': 'single_flight.png',
+            'datas': base64.b64encode(b'\x89PNG\r\n\x1a\n' + b'\x01' * 64),
+            'res_model': 'hr.expense',
+            'res_id': expense.id,
+        })
+        key = single_flight.flight_key(attachment.checksum, API_URL)
+
+        # Another worker is scanning the same receipt, in a transaction still open
+        with self.registry.cursor() as other_cr, \
+                patch.object(ocr_service.http_client, 'post') as post:
+            other_cr.execute("SELECT pg_advisory_xact_lock(%s, %s)", (single_flight.LOCK_NAMESPACE, key))
+            self.assertEqual(expense._ocr_scan_attachments(attachment), {attachment.id: None})
+            self.assertFalse(expense.auto_scan_attachment(attachment))
+            other_cr.rollback()
+        post.assert_not_called()
+        self.assertEqual(expense.ocr_status, 'pending')
+        job = expense.ocr_job_ids.filtered(lambda j: j.state == 'pending')
+        self.assertEqual(len(job), 1)
+        self.assertTrue(job.eta)
+
+        # Its result is committed: the queued scan reads it from the cache
+        self.Cache._store(attachment.checksum, API_URL, self.result)
+        with patch.object(ocr_service.http_client, 'post') as post:
+            self.assertEqual(expense._ocr_scan_attachments(attachment), {attachment.id: self.result})
+        post.assert_not_called()
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the registry-cached OCR configuration
+"""
+import logging
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestOCRConfig(common.TransactionCase):
+    """Test that the OCR configuration is cached and invalidated on parameter changes"""
+
+    def test_01_cached_read_has_no_query(self):
+        """Once loaded, reading the configuration costs no database round trip"""
+        ICP = self.env['ir.config_parameter']
+        ICP._get_ocr_config()
+        with self.assertQueryCount(0):
+            ICP._get_ocr_config()
+
+    def test_02_invalidated_on_write(self):
+        """Writing a parameter is reflected by the next read"""
+        ICP = self.env['ir.config_parameter']
+        ICP.sudo().set_param('ocr_test_mode', 'False')
+        self.assertFalse(ICP._get_ocr_config()['test_mode'])
+
+        ICP.sudo().set_param('ocr_test_mode', 'True')
+        self.assertTrue(ICP._get_ocr_config()['test_mode'])
+
+        ICP.sudo().set_param('ocr_batch_size', 'not a number')
+        self.assertEqual(ICP._get_ocr_config()['batch_size'], 5)
@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the OCR engine registry, the local engine's layout heuristics and
+the fallback between engines
+"""
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+
+from ..models import hr_expense_ocr_engine_stat
+from ..services import engines, ocr_service
+from ..services.engines.tesseract import parse_receipt_lines
+from .test_ocr_batch import PNG_DATA
+
+_logger = logging.getLogger(__name__)
+
+RECEIPT_LINES = [
+    'CORNER COFFEE SHOP',
+    '12 Main Street',
+    'Tel: 555-0100',
+    'Receipt No: A-10234',
+    'Date: 14/03/2024 09:41',
+    '2 x Cappuccino 7.00',
+    'Blueberry Muffin 3.25',
+    'Subtotal 10.25',
+    'VAT 12% 1.23',
+    'TOTAL 11.48',
+    'Cash 20.00',
+    'Change 8.52',
+]
+
+
+@tagged('post_install', '-at_install')
+class TestOCREngines(common.TransactionCase):
+    """Test the selection of the OCR engine of a company and its statistics"""
+
+    def setUp(self):
+        super(TestOCREngines, self).setUp()
+        self.ICP = self.env['ir.config_parameter'].sudo()
+        self.ICP.set_param('ocr_test_mode', 'False')
+        self.ICP.set_param('ocr_api_key', 'test-key')
+        self.ICP.set_param('ocr_api_url', 'https://ocr.example.com/extract')
+        self.receipt = ReceiptFile('receipt.png', data=PNG_DATA)
+        self.Stat = self.env['hr.expense.ocr.engine.stat']
+        # Counters other tests left in memory
+        for state in (hr_expense_ocr_engine_stat._pending, hr_expense_ocr_engine_stat._flushed_at):
+            patcher = patch.dict(state, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _stat(self, engine):
+        self.Stat._flush()
+        return self.Stat.search([('engine', '=', engine), ('company_id', '=', self.env.company.id)])
+
+    def test_01_registry(self):
+        """The webhook and the local engine are registered"""
+        self.assertIn('webhook', engines.get_engines())
+        self.assertIn('tesseract', engines.get_engines())
+        self.assertIsNone(engines.get_engine('unknown'))
+        self.assertEqual(self.ICP._get_ocr_engine_config(self.env.company.id)['engine'], 'webhook')
+
+    def test_02_company_engine(self):
+        """ocr_engine.<company id> overrides the engine of all companies"""
+        self.ICP.set_param('ocr_engine.%s' % self.env.company.id, 'Tesseract')
+        self.ICP.set_param('ocr_engine_fallback', 'webhook')
+        config = self.ICP._get_ocr_engine_config(self.env.company.id)
+        self.assertEqual(config['engine'], 'tesseract')
+        self.assertEqual(config['fallback'], 'webhook')
+        self.assertEqual(self.ICP._get_ocr_engine_config(self.env.company.id + 1000)['engine'], 'webhook')
+
+    def test_03_layout_heuristics(self):
+        """Vendor, number, date, items and totals are recovered from the text lines"""
+        output = parse_receipt_lines(RECEIPT_LINES)
+        self.assertEqual(output['business_name'], 'CORNER COFFEE SHOP')
+        self.assertEqual(output['receipt_number'], 'A-10234')
+        self.assertEqual(output['date'], '2024-03-14')
+        self.assertEqual(output['items'], [
+            {'quantity': 2, 'description': 'Cappuccino', 'amount': 7.0},
+            {'quantity': 1, 'description': 'Blueberry Muffin', 'amount': 3.25},
+        ])
+        self.assertEqual(output['subtotal'], 10.25)
+        self.assertEqual(output['tax'], 1.23)
+        self.assertEqual(output['total_amount'], 11.48)
+
+    def test_04_results_tagged_and_counted(self):
+        """Results carry the engine that produced them, which counts them"""
+        result = {'output': {'business_name': 'Vendor', 'total_amount': 5.0}}
+        with patch.object(engines.get_engine('webhook'), 'scan', return_value=[result]):
+            self.assertEqual(ocr_service.process_receipt_file(self.env, self.receipt)['engine'], 'webhook')
+
+        stat = self._stat('webhook')
+        self.assertEqual(stat.receipt_count, 1)
+        self.assertEqual(stat.extracted_count, 1)
+
+    def test_05_fallback_when_unavailable(self):
+        """Receipts go to the fallback engine while the configured one is unavailable"""
+        self.ICP.set_param('ocr_engine_fallback', 'tesseract')
+        local = engines.get_engine('tesseract')
+        result = {'output': {'business_name': 'Local', 'total_amount': 5.0}}
+        with patch.object(engines.get_engine('webhook'), 'scan', side_effect=OcrUnavailableError("open")), \
+             patch.object(type(local), 'is_available', return_value=True), \
+             patch.object(local, 'scan', return_value=[result]) as local_scan:
+            self.assertEqual(ocr_service.process_receipt_file(self.env, self.receipt)['engine'], 'tesseract')
+
+        local_scan.assert_called_once()
+        self.assertEqual(self._stat('webhook').unavailable_count, 1)
+        self.assertEqual(self._stat('tesseract').receipt_count, 1)
+
+    def test_06_no_fallback(self):
+        """Without a fallback engine the caller still sees the OCR API as unavailable"""
+        with patch.object(engines.get_engine('webhook'), 'scan', side_effect=OcrUnavailableError("open")):
+            with self.assertRaises(OcrUnavailableError):
+                ocr_service.process_receipt_file(self.env, self.receipt)
+
+    def test_07_accuracy(self):
+        """A submitted total equal to the extracted one counts as correct"""
+        expenses = self.env['hr.expense'].create([{
+            'name': 'Engine Accuracy %s' % index,
+            'employee_id': self.env.ref('hr.employee_admin').id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+        } for index in range(2)])
+        for expense, total in zip(expenses, (11.48, 9.0)):
+            expense.update_from_ocr_result({'engine': 'webhook', 'output': {'total_amount': 11.48}})
+            expense.total_amount_currency = total
+
+        expenses._record_ocr_accuracy()
+        expenses._record_ocr_accuracy()
+
+        stat = self._stat('webhook')
+        self.assertEqual(stat.checked_count, 2)
+        self.assertEqual(stat.correct_count, 1)
+        self.assertEqual(stat.accuracy, 0.5)
+
+    def test_08_counters_flushed_periodically(self):
+        """Scans add up their counters in memory, written in one transaction once a minute"""
+        with patch.object(hr_expense_ocr_engine_stat, 'state_cursor',
+                          wraps=hr_expense_ocr_engine_stat.state_cursor) as state_cursor, \
+                patch.object(hr_expense_ocr_engine_stat.time, 'monotonic', return_value=1000.0):
+            self.Stat._flush()
+            for latency in (0.5, 1.5):
+                self.Stat._record_scan('webhook', self.env.company.id, [{'output': {}}, False], latency)
+            self.Stat._record_unavailable('webhook', self.env.company.id)
+            self.assertEqual(state_cursor.call_count, 0)
+            self.assertFalse(self.Stat.search([('engine', '=', 'webhook')]))
+
+        with patch.object(hr_expense_ocr_engine_stat, 'state_cursor',
+                          wraps=hr_expense_ocr_engine_stat.state_cursor) as state_cursor, \
+                patch.object(hr_expense_ocr_engine_stat.time, 'monotonic',
+                             return_value=1000.0 + hr_expense_ocr_engine_stat.FLUSH_INTERVAL):
+            self.Stat._record_scan('webhook', self.env.company.id, [{'output': {}}], 1.0)
+            self.assertEqual(state_cursor.call_count, 1)
+
+        stat = self._stat('webhook')
+        self.assertEqual(stat.receipt_count, 5)
+        self.assertEqual(stat.extracted_count, 3)
+        self.assertEqual(stat.unavailable_count, 1)
+        self.assertEqual(stat.total_latency, 3.0)
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the background OCR job queue
+"""
+import base64
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.circuit_breaker import OcrUnavailableError
+
+_logger = logging.getLogger(__name__)
+
+PDF_DATA = b'%PDF-1.4\n1 0 obj\n<</Type/Catalog/Pages 2 0 R>>\nendobj\ntrailer\n<</Root 1 0 R>>\n%%EOF\n'
+
+
+@tagged('post_install', '-at_install')
+class TestOCRJob(common.TransactionCase):
+    """Test that expenses enqueue OCR scans instead of calling the API inline"""
+
+    def setUp(self):
+        super(TestOCRJob, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('ocr_test_mode', 'True')
+        self.expense = self.env['hr.expense'].create({
+            'name': 'Queued Expense',
+            'employee_id': self.env.ref('hr.employee_admin').id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 100.0,
+        })
+        self.attachment = self.env['ir.attachment'].create({
+            'name': 'queued_receipt.pdf',
+            'datas': base64.b64encode(PDF_DATA),
+            'res_model': 'hr.expense',
+            'res_id': self.expense.id,
+        })
+
+    def test_01_write_enqueues_job(self):
+        """Setting the main attachment queues exactly one job and does not scan"""
+        self.expense.message_main_attachment_id = self.attachment
+        self.expense.message_main_attachment_id = self.attachment
+
+        jobs = self.env['hr.expense.ocr.job'].search([('expense_id', '=', self.expense.id)])
+        self.assertEqual(len(jobs), 1, "Repeated writes should not queue duplicate jobs")
+        self.assertEqual(jobs.state, 'pending')
+        self.assertEqual(self.expense.ocr_status, 'pending')
+        self.assertFalse(self.expense.business_name, "The scan must not run inline")
+
+    def test_02_cron_drains_queue(self):
+        """The scheduled action claims the job and applies the OCR result"""
+        self.expense.message_main_attachment_id = self.attachment
+        job = self.expense.ocr_job_ids
+
+        processed = self.env['hr.expense.ocr.job']._cron_process_jobs()
+
+        self.assertEqual(processed, 1)
+        self.assertEqual(job.state, 'done')
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(self.expense.ocr_status, 'processed')
+
+    def test_03_replaced_attachment_is_skipped(self):
+        """A job whose attachment is no longer the main one finishes without scanning"""
+        self.expense.message_main_attachment_id = self.attachment
+        job = self.expense.ocr_job_ids
+        self.expense.message_main_attachment_id = False
+
+        job._claim()
+        job._run()
+
+        self.assertEqual(job.state, 'done')
+        self.assertFalse(self.expense.business_name)
+
+    def test_04_open_breaker_postpones_queue(self):
+        """Nothing is claimed while the circuit breaker of the OCR API is open"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        self.expense.message_main_attachment_id = self.attachment
+        job = self.expense.ocr_job_ids
+        Breaker = self.env['hr.expense.ocr.breaker']
+        Breaker.create({
+            'endpoint': Breaker._get_endpoint(ICP.get_param('ocr_api_url')),
+            'state': 'open',
+            'retry_at': fields.Datetime.now() + timedelta(minutes=1),
+        })
+
+        processed = self.env['hr.expense.ocr.job']._cron_process_jobs()
+
+        self.assertEqual(processed, 0)
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.attempts, 0)
+
+    def test_05_unavailable_api_defers_jobs(self):
+        """Jobs hitting an unavailable OCR API are deferred without using up an attempt"""
+        self.expense.message_main_attachment_id = self.attachment
+        job = self.expense.ocr_job_ids
+        retry_at = fields.Datetime.now() + timedelta(minutes=1)
+
+        job._claim()
+        with patch.object(type(self.env['hr.expense']), '_auto_scan_attachments',
+                          side_effect=OcrUnavailableError('breaker open', retry_at=retry_at)):
+            job._run()
+
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.attempts, 0)
+        self.assertEqual(job.eta, retry_at)
+
+    def test_06_receipt_in_flight_defers_jobs(self):
+        """Jobs whose receipt another request is scanning are deferred without using up an attempt"""
+        self.expense.message_main_attachment_id = self.attachment
+        job = self.expense.ocr_job_ids
+
+        job._claim()
+        with patch.object(type(self.env['hr.expense']), '_auto_scan_attachments',
+                          return_value={self.expense.id: None}):
+            outcome = job._run()
+
+        self.assertEqual(outcome, {job.id: False})
+        self.assertEqual(job.state, 'pending')
+        self.assertEqual(job.attempts, 0)
+        self.assertGreater(job.eta, fields.Datetime.now())
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the receipt preprocessing stage
+"""
+import io
+import logging
+
+from PIL import Image
+from reportlab.pdfgen import canvas
+
+from odoo.tests import common, tagged
+from odoo.tools.pdf import PdfFileReader
+
+from ..services.preprocess import _preprocess_pdf, preprocess_receipt
+
+_logger = logging.getLogger(__name__)
+
+OPTIONS = {
+    'max_px': 1000,
+    'grayscale': True,
+    'format': 'jpeg',
+    'quality': 85,
+    'max_pdf_pages': 0,
+}
+
+
+@tagged('post_install', '-at_install')
+class TestOCRPreprocess(common.TransactionCase):
+    """Test that receipts are shrunk before upload"""
+
+    def _make_png(self, size, exif_orientation=None):
+        image = Image.effect_noise(size, 64).convert('RGB')
+        output = io.BytesIO()
+        exif = Image.Exif()
+        if exif_orientation:
+            exif[0x0112] = exif_orientation
+        image.save(output, format='PNG', exif=exif)
+        return output.getvalue()
+
+    def _make_pdf(self, pages):
+        output = io.BytesIO()
+        pdf = canvas.Canvas(output)
+        for text in pages:
+            if text:
+                pdf.drawString(72, 720, text)
+            pdf.showPage()
+        pdf.save()
+        return output
+
+    def test_01_image_downscaled_and_reencoded(self):
+        """Large images are downscaled, converted to grayscale JPEG and renamed"""
+        data = self._make_png((3000, 1500))
+        processed, name, original_size, processed_size = preprocess_receipt(
+            data, 'receipt.png', 'image/png', OPTIONS)
+
+        image = Image.open(io.BytesIO(processed))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.mode, 'L')
+        self.assertEqual(max(image.size), 1000)
+        self.assertEqual(name, 'receipt.jpg')
+        self.assertEqual(original_size, len(data))
+        self.assertLess(processed_size, original_size)
+
+    def test_02_exif_rotation_applied(self):
+        """Images are rotated according to their EXIF orientation"""
+        data = self._make_png((800, 400), exif_orientation=6)
+        processed = preprocess_receipt(data, 'receipt.png', 'image/png', OPTIONS)[0]
+        self.assertEqual(Image.open(io.BytesIO(processed)).size, (400, 800))
+
+    def test_03_unreadable_file_unchanged(self):
+        """A file that cannot be processed is sent unchanged"""
+        data = b'not an image at all'
+        processed, name, original_size, processed_size = preprocess_receipt(
+            data, 'receipt.png', 'image/png', OPTIONS)
+        self.assertEqual((processed, name), (data, 'receipt.png'))
+        self.assertEqual(original_size, processed_size)
+
+    def test_04_pdf_pages_kept(self):
+        """Only blank PDF pages are dropped by default: the total may be on the last page"""
+        pages = ['Hotel Folio', '', 'Room 3 nights', 'Minibar', 'TOTAL 412.50']
+        data, dropped = _preprocess_pdf(self._make_pdf(pages), OPTIONS)
+        self.assertEqual(dropped, [(2, 'blank')])
+        self.assertEqual(PdfFileReader(io.BytesIO(data)).getNumPages(), 4)
+
+        data, dropped = _preprocess_pdf(self._make_pdf(pages), dict(OPTIONS, max_pdf_pages=2))
+        self.assertEqual(dropped, [(2, 'blank'), (4, 'limit'), (5, 'limit')])
+
+        self.assertEqual(_preprocess_pdf(self._make_pdf(pages[:1]), OPTIONS), (None, []))
+
+    def test_05_dropped_pages_note(self):
+        """Dropped pages are told apart in the note logged on the expense"""
+        note = self.env['hr.expense']._dropped_pages_note([(2, 'blank'), (4, 'limit'), (5, 'limit')])
+        self.assertIn('blank pages 2', note)
+        self.assertIn('pages 4, 5, beyond', note)
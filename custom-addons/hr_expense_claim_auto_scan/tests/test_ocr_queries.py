@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Query budgets and writes of the OCR result mapping
+
+The budgets are upper bounds: a change that makes the mapping issue more
+queries fails here, one that saves queries is only logged by
+assertQueryCount(). Each case is run once beforehand to warm the caches.
+"""
+import base64
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, new_test_user, tagged
+
+from .test_ocr_batch import PNG_DATA
+
+_logger = logging.getLogger(__name__)
+
+OUTPUT = {
+    'business_name': 'Query Count Vendor',
+    'receipt_number': 'QC-0001',
+    'date': '2024-03-14',
+    'items': [
+        {'quantity': 2, 'description': 'Cappuccino', 'amount': 7.0},
+        {'quantity': 1, 'description': 'Blueberry Muffin', 'amount': 3.25},
+    ],
+    'subtotal': 10.25,
+    'tax': 1.23,
+    'total_amount': 11.48,
+}
+
+
+@tagged('post_install', '-at_install')
+class TestOCRQueries(common.TransactionCase):
+    """SQL cost of update_from_ocr_result()"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestOCRQueries, cls).setUpClass()
+        cls.product = cls.env.ref('hr_expense.product_product_fixed_cost')
+        cls.product.default_code = 'EXP_QC'
+        cls.expenses = cls.env['hr.expense'].create([{
+            'name': 'Query Count Expense %s' % index,
+            'employee_id': cls.env.ref('hr.employee_admin').id,
+            'product_id': cls.product.id,
+            'total_amount': 1.0,
+        } for index in range(2)])
+
+    def _map(self, output, budget):
+        warm_up, measured = self.expenses
+        warm_up.update_from_ocr_result({'output': dict(output)})
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(__system__=budget):
+            measured.update_from_ocr_result({'output': dict(output)})
+            self.env.flush_all()
+        self.assertEqual(measured.ocr_status, 'processed')
+        return measured
+
+    def test_01_no_category(self):
+        """Plain receipts: the expense is written once, the vendor profile read and upserted"""
+        expense = self._map(OUTPUT, 22)
+        self.assertEqual(expense.business_name, 'Query Count Vendor')
+
+    def test_02_category_by_code(self):
+        """A category matching a product code: learned by the vendor profile, no product search"""
+        expense = self._map(dict(OUTPUT, receipt_category='EXP_QC'), 40)
+        self.assertEqual(expense.product_id, self.product)
+
+    def test_03_unknown_category(self):
+        """An unknown category: the expense category index misses, one trigram query"""
+        expense = self._map(dict(OUTPUT, receipt_category='EXP_NOWHERE'), 28)
+        self.assertEqual(expense.product_id, self.product)
+
+    def _count_writes(self):
+        Expense = type(self.env['hr.expense'])
+        calls = []
+        write = Expense.write
+
+        def counting_write(records, vals):
+            calls.append((records.ids, set(vals), records.env.context.get('tracking_disable'), records.env.su))
+            return write(records, vals)
+        return calls, patch.object(Expense, 'write', counting_write)
+
+    def test_04_single_write(self):
+        """An OCR result is written in one write, without tracking, with the changed fields only"""
+        expense = self.expenses[0]
+        calls, counting = self._count_writes()
+        with counting:
+            expense.update_from_ocr_result({'output': dict(OUTPUT)})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], expense.ids)
+        self.assertTrue(calls[0][2])
+
+        calls.clear()
+        with counting:
+            expense.update_from_ocr_result({'output': dict(OUTPUT)})
+        self.assertFalse(calls, "The same result again changes nothing")
+
+        # With preprocessing, the sizes of the receipt are written with the result
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'True')
+        ICP.set_param('ocr_preprocess_enabled', 'True')
+        expense = self.expenses[1]
+        expense.message_main_attachment_id = self.env['ir.attachment'].create({
+            'name': 'query_count.png',
+            'datas': base64.b64encode(PNG_DATA),
+            'res_model': 'hr.expense',
+            'res_id': expense.id,
+        })
+        calls.clear()
+        with counting:
+            self.assertTrue(expense.auto_scan_attachment())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0][0], expense.ids)
+        self.assertIn('ocr_original_size', calls[0][1])
+        self.assertIn('ocr_processed_size', calls[0][1])
+        self.assertEqual(expense.ocr_original_size, len(PNG_DATA))
+
+    def test_05_batch_write(self):
+        """Expenses getting the same values share one write"""
+        failure = {'ocr_status': 'failed', 'ocr_message': 'No receipt attachment found to scan.'}
+        calls, counting = self._count_writes()
+        with counting:
+            self.expenses._write_ocr_values({expense.id: dict(failure) for expense in self.expenses})
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(calls[0][0]), sorted(self.expenses.ids))
+        self.assertEqual(set(self.expenses.mapped('ocr_status')), {'failed'})
+
+    def test_06_employee_scan(self):
+        """Scans of employees write the expense with their rights, the receipt items as superuser"""
+        user = new_test_user(self.env, 'ocr_query_employee', groups='base.group_user')
+        expense = self.env['hr.expense'].create({
+            'name': 'Employee Expense',
+            'employee_id': self.env['hr.employee'].create({'name': 'OCR Employee', 'user_id': user.id}).id,
+            'product_id': self.product.id,
+            'total_amount': 1.0,
+        })
+        calls, counting = self._count_writes()
+        with counting:
+            self.assertTrue(expense.with_user(user).update_from_ocr_result({'output': dict(OUTPUT)}))
+        self.assertEqual(len(calls), 1)
+        self.assertNotIn('receipt_line_ids', calls[0][1])
+        self.assertFalse(calls[0][3], "The expense must be written with the rights of the employee")
+        self.assertEqual(expense.receipt_line_ids.mapped('description'), ['Cappuccino', 'Blueberry Muffin'])
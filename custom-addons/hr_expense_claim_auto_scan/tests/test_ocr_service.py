@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the environment-aware OCR service entry points
+"""
+import base64
+import logging
+from contextlib import ExitStack
+from unittest.mock import patch
+
+from odoo.modules.registry import Registry
+from odoo.sql_db import ConnectionPool
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.models import hr_expense_ocr_breaker, hr_expense_ocr_rate_limit
+from odoo.addons.hr_expense_ocr_common.services import rate_limiter
+
+from ..models import hr_expense_ocr_engine_stat
+from ..services import ocr_service
+from .test_ocr_batch import PNG_DATA, FakeResponse
+
+_logger = logging.getLogger(__name__)
+
+PDF_DATA = b'%PDF-1.4\n1 0 obj\n<</Type/Catalog/Pages 2 0 R>>\nendobj\ntrailer\n<</Root 1 0 R>>\n%%EOF\n'
+
+
+@tagged('post_install', '-at_install')
+class TestOCRService(common.TransactionCase):
+    """Test that scans reuse the caller's environment"""
+
+    def setUp(self):
+        super(TestOCRService, self).setUp()
+        self.env['ir.config_parameter'].sudo().set_param('ocr_test_mode', 'True')
+
+    def test_01_no_connection_checkout_per_scan(self):
+        """process_receipt() never borrows a connection from the pool"""
+        with patch.object(ConnectionPool, 'borrow', autospec=True,
+                          side_effect=ConnectionPool.borrow) as borrow:
+            result = ocr_service.process_receipt(self.env, PDF_DATA, 'receipt.pdf')
+            results = ocr_service.process_receipts(self.env, [(PDF_DATA, 'a.pdf'), (PDF_DATA, 'b.pdf')])
+
+        self.assertTrue(result)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(borrow.call_count, 0, "Scanning must not check out another database connection")
+
+    def test_02_uses_caller_transaction(self):
+        """Uncommitted configuration of the caller's transaction is honoured"""
+        self.env['ir.config_parameter'].sudo().set_param('ocr_test_mode', 'False')
+        self.env['ir.config_parameter'].sudo().set_param('ocr_api_key', '')
+
+        self.assertFalse(ocr_service.process_receipt(self.env, PDF_DATA, 'receipt.pdf'),
+                         "Without API key nor test mode the scan must be refused")
+
+    def test_03_connections_per_scan(self):
+        """Scans borrow no cursor once the breaker and the rate limit lease exist"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        ICP.set_param('ocr_api_url', 'https://ocr.example.com/extract')
+        ICP.set_param('ocr_preprocess_enabled', 'False')
+        self.env.company.write({'ocr_rate_limit': 600, 'ocr_rate_burst': 100})
+        expenses = self.env['hr.expense'].create([{
+            'name': 'Connection Expense %d' % index,
+            'employee_id': self.env.ref('hr.employee_admin').id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 10.0,
+        } for index in range(5)])
+        for index, expense in enumerate(expenses):
+            expense.message_main_attachment_id = self.env['ir.attachment'].create({
+                'name': 'connection_%d.png' % index,
+                'datas': base64.b64encode(PNG_DATA + bytes([index])),
+                'res_model': 'hr.expense',
+                'res_id': expense.id,
+            })
+        response = FakeResponse({'output': {'business_name': 'Corner Coffee Shop', 'total_amount': 11.48}})
+
+        # State cursors are the test cursor here: count them instead of the connections they would take
+        with ExitStack() as stack:
+            for state in (rate_limiter._leases, hr_expense_ocr_breaker._local_states,
+                          hr_expense_ocr_engine_stat._pending, hr_expense_ocr_engine_stat._flushed_at):
+                stack.enter_context(patch.dict(state, clear=True))
+            state_cursors = [
+                stack.enter_context(patch.object(module, 'state_cursor', wraps=module.state_cursor))
+                for module in (hr_expense_ocr_breaker, hr_expense_ocr_rate_limit, hr_expense_ocr_engine_stat)
+            ]
+            registry_cursor = stack.enter_context(
+                patch.object(Registry, 'cursor', autospec=True, side_effect=Registry.cursor))
+            stack.enter_context(patch.object(ocr_service.http_client, 'post', return_value=response))
+
+            checkouts = []
+            for expense in expenses:
+                before = sum(mock.call_count for mock in state_cursors)
+                self.assertTrue(expense.auto_scan_attachment())
+                checkouts.append(sum(mock.call_count for mock in state_cursors) - before)
+
+        _logger.info("Cursors checked out by each scan: %s", checkouts)
+        # The first scan creates the breaker of the OCR API and leases 10 tokens of the bucket
+        self.assertLessEqual(checkouts[0], 2)
+        self.assertEqual(checkouts[1:], [0, 0, 0, 0])
+        self.assertEqual(registry_cursor.call_count, 0)
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for streaming receipts from the filestore to the OCR API
+"""
+import base64
+import email
+import logging
+import os
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.multipart import MultipartStream
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+
+from ..services import ocr_service
+from .test_ocr_batch import FakeResponse
+
+_logger = logging.getLogger(__name__)
+
+PDF_DATA = b'%PDF-1.4\n' + os.urandom(200 * 1024) + b'\n%%EOF\n'
+
+
+@tagged('post_install', '-at_install')
+class TestOCRStreaming(common.TransactionCase):
+    """Test that receipts are uploaded without being loaded in memory"""
+
+    def setUp(self):
+        super(TestOCRStreaming, self).setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_test_mode', 'False')
+        ICP.set_param('ocr_api_key', 'test-key')
+        ICP.set_param('ocr_preprocess_enabled', 'False')
+        self.attachment = self.env['ir.attachment'].create({
+            'name': 'streamed_receipt.pdf',
+            'datas': base64.b64encode(PDF_DATA),
+        })
+
+    def _parse(self, body):
+        message = email.message_from_bytes(
+            b'Content-Type: ' + body.content_type.encode() + b'\r\n\r\n' + body.read())
+        return message.get_payload()
+
+    def test_01_receipt_read_from_filestore(self):
+        """Attachments stored in the filestore are read from their file"""
+        if not self.attachment.store_fname:
+            self.skipTest("Attachments are stored in the database")
+        receipt = ReceiptFile.from_attachment(self.attachment)
+        self.assertTrue(receipt.path)
+        self.assertIsNone(receipt.data)
+        self.assertEqual(receipt.size, len(PDF_DATA))
+        self.assertEqual(receipt.mime_type, 'application/pdf')
+
+    def test_02_multipart_body(self):
+        """The streamed body is a valid multipart/form-data payload with a known length"""
+        receipt = ReceiptFile.from_attachment(self.attachment)
+        with MultipartStream(fields=[('expense_id', 42)], files=[('receipt', receipt)]) as body:
+            length = len(body)
+            chunks = iter(lambda: body.read(8192), b'')
+            self.assertEqual(sum(len(chunk) for chunk in chunks), length)
+            body.seek(0)
+            parts = self._parse(body)
+        self.assertEqual(parts[0].get_payload(), '42')
+        self.assertEqual(parts[1].get_filename(), 'streamed_receipt.pdf')
+        self.assertEqual(parts[1].get_payload(decode=True), PDF_DATA)
+
+    def test_03_body_rewinds_for_retries(self):
+        """A retried request can rewind the body to any position"""
+        receipt = ReceiptFile.from_attachment(self.attachment)
+        with MultipartStream(files=[('receipt', receipt)]) as body:
+            payload = body.read()
+            body.seek(1000)
+            self.assertEqual(body.tell(), 1000)
+            self.assertEqual(body.read(), payload[1000:])
+
+    def test_04_scan_streams_attachment(self):
+        """Scanning an attachment sends a streamed body instead of in-memory files"""
+        bodies = []
+
+        def post(url, data=None, **kwargs):
+            self.assertNotIn('files', kwargs)
+            self.assertIsInstance(data, MultipartStream)
+            bodies.append(data.read())
+            return FakeResponse({'output': {'business_name': 'Streamed Vendor'}})
+
+        expense = self.env['hr.expense']
+        with patch.object(ocr_service.http_client, 'post', side_effect=post):
+            result = expense._ocr_scan_attachment(self.attachment)
+
+        self.assertEqual(result['output']['business_name'], 'Streamed Vendor')
+        self.assertEqual(len(bodies), 1)
+        self.assertIn(PDF_DATA, bodies[0])
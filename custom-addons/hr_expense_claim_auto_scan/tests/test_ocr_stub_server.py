@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the OCR client against the record/replay stand-in OCR API
+"""
+import logging
+import os
+
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.receipt_file import ReceiptFile
+
+from ..services import async_ocr, ocr_service
+from .ocr_stub_server import OcrStubServer
+from .test_ocr_batch import PNG_DATA
+
+_logger = logging.getLogger(__name__)
+
+CASSETTE = os.path.join(os.path.dirname(__file__), 'cassettes', 'receipts.json')
+
+
+@tagged('post_install', '-at_install')
+class TestOCRStubServer(common.TransactionCase):
+    """Test the OCR client over HTTP with replayed answers and injected faults"""
+
+    def setUp(self):
+        super(TestOCRStubServer, self).setUp()
+        self.ICP = self.env['ir.config_parameter'].sudo()
+        self.ICP.set_param('ocr_test_mode', 'False')
+        self.ICP.set_param('ocr_api_key', 'test-key')
+        self.receipt = ReceiptFile('coffee.png', data=PNG_DATA)
+
+    def _serve(self, **kwargs):
+        server = OcrStubServer(cassette=CASSETTE, seed=42, **kwargs).start()
+        self.addCleanup(server.stop)
+        self.ICP.set_param('ocr_api_url', server.url)
+        return server
+
+    def test_01_replay(self):
+        """A recorded receipt gets its recorded answer"""
+        server = self._serve(latency='fixed:0.01')
+        result = ocr_service.process_receipt_file(self.env, self.receipt)
+        self.assertEqual(result['output']['business_name'], 'Corner Coffee Shop')
+        self.assertEqual(server.stats, {'replayed': 1})
+
+    def test_02_payload_shapes(self):
+        """Unrecorded receipts get the unkeyed answers of the cassette, whatever their shape"""
+        self._serve()
+        receipts = [ReceiptFile('r%d.png' % index, data=PNG_DATA + bytes([index + 1])) for index in range(8)]
+        results = [ocr_service.process_receipt_file(self.env, receipt) for receipt in receipts]
+        self.assertTrue(all(results), "Every answer of the cassette maps to an OCR result")
+        shapes = {next(iter(result)) for result in results}
+        self.assertEqual(shapes - {'output', 'error', 'engine'}, set())
+
+    def test_03_webhook_not_registered(self):
+        """The 404 of an unregistered webhook fails the scan outside test mode"""
+        server = self._serve(faults={'webhook_404': 1.0})
+        self.assertFalse(ocr_service.process_receipt_file(self.env, self.receipt))
+        self.assertEqual(server.stats, {'webhook_404': 1})
+
+    def test_04_server_errors_not_retried(self):
+        """Gateway errors fail the scan without uploading the receipt again"""
+        server = self._serve(faults={'server_error': 1.0})
+        self.assertFalse(ocr_service.process_receipt_file(self.env, self.receipt))
+        self.assertEqual(server.stats, {'server_error': 1})
+
+    def test_05_timeout(self):
+        """An unanswered request fails its receipt once the client's timeout is over"""
+        server = self._serve(faults={'timeout': 1.0}, hang=2)
+        results = async_ocr.scan_receipt_files(self.env, [self.receipt], concurrency=1, timeout=0.5)
+        self.assertEqual(results, [False])
+        self.assertEqual(set(server.stats), {'timeout'})
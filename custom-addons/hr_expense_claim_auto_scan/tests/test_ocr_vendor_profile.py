@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the parse profiles of the receipt vendors
+"""
+import logging
+from datetime import date
+from unittest.mock import patch
+
+from odoo.exceptions import ValidationError
+from odoo.tests import common, tagged
+
+from odoo.addons.hr_expense_ocr_common.services.extraction import extract_ocr_values
+
+from ..models.hr_expense_ocr_vendor_profile import vendor_key
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestOCRVendorProfile(common.TransactionCase):
+    """Test the vendor profiles learned from the scanned receipts"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestOCRVendorProfile, cls).setUpClass()
+        cls.Profile = cls.env['hr.expense.ocr.vendor.profile']
+        cls.product = cls.env.ref('hr_expense.product_product_fixed_cost')
+        cls.product.default_code = 'EXP_VP'
+        cls.expenses = cls.env['hr.expense'].create([{
+            'name': 'Vendor Profile Expense %s' % index,
+            'employee_id': cls.env.ref('hr.employee_admin').id,
+            'product_id': cls.env.ref('hr_expense.product_product_zero_cost').id,
+            'total_amount': 1.0,
+        } for index in range(2)])
+
+    def _profile(self, business_name):
+        return self.Profile._lookup(business_name, self.env.company.id)
+
+    def test_01_hints(self):
+        """The extraction core learns the date format and the decimal separator"""
+        hints = {}
+        vals, _category, _items = extract_ocr_values(
+            {'business_name': 'Bäckerei', 'date': '14/03/2024', 'total_amount': '1.234,50', 'tax': '12,30'},
+            profile=hints)
+        self.assertEqual(hints, {'decimal_separator': ',', 'date_format': '%d/%m/%Y'})
+        self.assertEqual(vals['total_amount_currency'], 1234.5)
+        self.assertEqual(vals['tax_amount_currency'], 12.3)
+
+        # "04/03/2024" parses with the first format too: the vendor's one wins
+        vals, _category, _items = extract_ocr_values(
+            {'date': '04/03/2024', 'total_amount': '1.000'}, profile=hints)
+        self.assertEqual(vals['date'], date(2024, 3, 4))
+        self.assertEqual(vals['total_amount_currency'], 1000.0)
+
+    def test_02_learn(self):
+        """Scanned receipts create and update the profile of their vendor"""
+        expense, other = self.expenses
+        output = {
+            'business_name': '  Corner  Coffee Shop ',
+            'date': '03/14/2024',
+            'total_amount': '11.48',
+            'receipt_category': 'EXP_VP',
+        }
+        expense.update_from_ocr_result({'output': output})
+        profile = self._profile('corner coffee shop')
+        self.assertEqual(profile.vendor_key, vendor_key('Corner Coffee Shop'))
+        self.assertEqual(profile.date_format, '%m/%d/%Y')
+        self.assertEqual(profile.decimal_separator, '.')
+        self.assertEqual(profile.category_code, 'EXP_VP')
+        self.assertEqual(profile.product_id, self.product)
+        self.assertEqual(profile.receipt_count, 1)
+
+        other.update_from_ocr_result({'output': dict(output, receipt_category=None, date='2024-03-15')})
+        profile = self._profile('Corner Coffee Shop')
+        self.assertEqual(profile.receipt_count, 2)
+        self.assertEqual(profile.date_format, '%Y-%m-%d')
+        self.assertEqual(profile.product_id, self.product, "A receipt without category keeps the learned one")
+
+    def test_03_known_vendor(self):
+        """The category of a known vendor is taken from its profile, without product search"""
+        expense, other = self.expenses
+        output = {'business_name': 'Known Vendor', 'total_amount': 20.0, 'receipt_category': 'EXP_VP'}
+        expense.update_from_ocr_result({'output': output})
+
+        with patch.object(type(self.env['product.product']), 'search',
+                          side_effect=AssertionError("product search")):
+            other.update_from_ocr_result({'output': output})
+        self.assertEqual(other.product_id, self.product)
+
+    def test_04_stale_category(self):
+        """A learned category that is no longer an expense category is searched again"""
+        expense, other = self.expenses
+        output = {'business_name': 'Stale Vendor', 'total_amount': 20.0, 'receipt_category': 'EXP_VP'}
+        expense.update_from_ocr_result({'output': output})
+        self.assertEqual(self._profile('Stale Vendor').product_id, self.product)
+
+        self.product.can_be_expensed = False
+        other.update_from_ocr_result({'output': output})
+        self.assertNotEqual(other.product_id, self.product)
+        self.assertFalse(self._profile('Stale Vendor').product_id)
+
+    def test_05_unchanged_profile_not_written(self):
+        """A receipt matching the profile of its vendor does not write it"""
+        expense, other = self.expenses
+        output = {'business_name': 'Steady Vendor', 'date': '03/14/2024', 'total_amount': 20.0,
+                  'receipt_category': 'EXP_VP'}
+        expense.update_from_ocr_result({'output': output})
+        profile = self._profile('Steady Vendor')
+        hints = profile._get_hints()
+        profile.read(['category_code', 'product_id'])
+
+        with self.assertQueryCount(0):
+            profile._learn('Steady Vendor', self.env.company.id, dict(hints), category_code='EXP_VP',
+                           product=self.product)
+            profile._learn('Steady Vendor', self.env.company.id, {}, category_code=None)
+
+        other.update_from_ocr_result({'output': output})
+        self.assertEqual(self._profile('Steady Vendor').receipt_count, 1)
+
+    def test_06_rejected_values_not_learned(self):
+        """The profile is only updated once the values of the receipt are written"""
+        expense = self.expenses[0]
+        output = {'business_name': 'Rejected Vendor', 'date': '14/03/2024', 'total_amount': '12,50'}
+        Expense = type(expense)
+        write = Expense.write
+
+        def rejecting_write(records, vals):
+            if 'ocr_payload' in vals:
+                raise ValidationError("Rejected")
+            return write(records, vals)
+
+        with patch.object(Expense, 'write', rejecting_write):
+            expense.update_from_ocr_result({'output': output})
+        self.assertEqual(expense.ocr_status, 'failed')
+        self.assertFalse(self._profile('Rejected Vendor'))
+
+        expense.update_from_ocr_result({'output': output})
+        self.assertEqual(self._profile('Rejected Vendor').date_format, '%d/%m/%Y')
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+{
+    'name': 'HR Expense OCR Common',
+    'version': '18.0.1.0.0',
+    'summary': 'Shared plumbing for the expense receipt scanning modules',
+    'description': """
+        Technical module holding the code shared by the receipt scanning modules
+        (HR Expense Claim Auto Scan and Expense Claim with Receipt Scanning).
+        
+        Features:
+        - Per-process pooled keep-alive HTTP sessions for the OCR services
+        - Bounded exponential-backoff retries on transient failures
+        - Connection warm-up when a worker loads the registry
+        - Streaming multipart uploads read straight from the filestore
+        - Circuit breaker and adaptive concurrency limit shared by all workers
+        - Per-company OCR rate limiter shared by all workers and nodes
+        - Raw OCR payloads of the expenses stored as JSONB, with a GIN index
+        - Receipt line items of the expenses, with full-text search
+    """,
+    'category': 'Human Resources/Expenses',
+    'author': 'Alvin Paul L. Azurin',
+    'website': 'https://www.cre8or-lab.com',
+    'depends': ['hr_expense', 'structured_logging'],
+    'data': [
+        'security/ir.model.access.csv',
+        'security/hr_expense_receipt_line_security.xml',
+        'data/system_parameters.xml',
+        'views/hr_expense_ocr_breaker_views.xml',
+        'views/res_config_settings_views.xml',
+        'views/hr_expense_views.xml',
+    ],
+    'installable': True,
+    'application': False,
+    'auto_install': False,
+    'license': 'LGPL-3',
+}
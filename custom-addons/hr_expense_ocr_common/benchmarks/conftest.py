@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Microbenchmarks of the extraction core, run without Odoo::
+
+    pip install pytest pytest-benchmark
+    pytest custom-addons/hr_expense_ocr_common/benchmarks --benchmark-json=extraction.json
+
+services/extraction.py is loaded from its file, so that the Odoo addon
+packages (and Odoo itself) are never imported.
+"""
+import importlib.util
+import logging
+import os
+
+import pytest
+
+EXTRACTION_PATH = os.path.join(os.path.dirname(__file__), os.pardir, 'services', 'extraction.py')
+
+
+@pytest.fixture(scope='session')
+def extraction():
+    spec = importlib.util.spec_from_file_location('ocr_extraction', EXTRACTION_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    # Warnings on malformed payloads are expected; don't measure the log handlers
+    logging.getLogger(module.__name__).setLevel(logging.ERROR)
+    return module
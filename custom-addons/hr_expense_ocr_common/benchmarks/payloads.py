@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Generator of varied OCR payloads, reproducible from a seed.
+
+The payloads mix what the OCR services return in production: nested and
+flat formats, amounts as numbers or strings with thousands separators,
+every supported date format plus unparsable dates, taxes as amounts or
+lists, receipts with no item up to long itemised ones, and missing fields.
+"""
+import random
+from datetime import date, timedelta
+
+VENDORS = ['Corner Coffee Shop', 'City Taxi', 'Hotel Bellevue', 'Büro & Papier GmbH', 'Sushi 寿司 Bar',
+           'Office Depot #4412', 'Gas Station 24/7', 'The Very Long Restaurant Name That Exceeds Sixty-Four '
+           'Characters On Purpose Ltd']
+ITEMS = ['Cappuccino', 'Blueberry Muffin', 'Room, 1 night', 'Taxi fare', 'A4 paper (500 sheets)', 'Unleaded 95',
+         'Parking', 'Lunch menu', 'Sparkling water', 'Printer toner']
+CATEGORIES = ['EXP_GEN', 'EXP_TRANSPORT', 'EXP_MEALS', 'EXP_HOTEL', 'exp_meals ', None]
+OCR_DATE_FORMATS = ['%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%m/%d/%Y %I:%M %p',
+                    '%Y-%m-%dT%H:%M:%S', '%B %d, %Y', '%d %B %Y']
+SCAN_DATE_FORMATS = ['%b %d, %y %I:%M %p', '%Y-%m-%d', '%d/%m/%Y', '%b %d, %Y']
+BAD_DATES = ['yesterday', '31/31/2024', '', '2024-13-45', 'N/A']
+
+
+def _amount(rng, value):
+    """Return an amount the way an OCR service may print it."""
+    kind = rng.random()
+    if kind < 0.6:
+        return round(value, 2)
+    if kind < 0.9:
+        return '{:,.2f}'.format(value)
+    if kind < 0.95:
+        return str(int(value))
+    return 'n/a'
+
+
+def _date(rng, formats):
+    if rng.random() < 0.05:
+        return rng.choice(BAD_DATES)
+    day = date(2023, 1, 1) + timedelta(days=rng.randrange(700))
+    return day.strftime(rng.choice(formats))
+
+
+def vendor_date_format(vendor):
+    """Return the date format of a recurring vendor, one of the last formats tried."""
+    return OCR_DATE_FORMATS[-1 - VENDORS.index(vendor) % 4]
+
+
+def _items(rng, max_items=20):
+    count = rng.choice([0, 0, 1, 2, 3, 5, rng.randrange(1, max_items + 1)])
+    items = []
+    for _index in range(count):
+        item = {
+            'quantity': rng.choice([1, 1, 2, 3, '', '1']),
+            'description': rng.choice(ITEMS),
+            'amount': round(rng.uniform(0.5, 300), 2),
+        }
+        if rng.random() < 0.2:
+            item['tax'] = round(item['amount'] * 0.1, 2)
+        if rng.random() < 0.05:
+            del item['description']
+        items.append(item)
+    return items
+
+
+def ocr_payloads(count, seed=0, recurring=False):
+    """Return ``count`` results of the OCR webhook (``hr_expense_claim_auto_scan``).
+
+    With ``recurring``, each vendor prints its dates in one format of its own,
+    see vendor_date_format(), as real vendors do.
+    """
+    rng = random.Random(seed)
+    payloads = []
+    for _index in range(count):
+        subtotal = rng.uniform(1, 5000)
+        tax = subtotal * rng.choice([0.0, 0.05, 0.1, 0.2])
+        output = {}
+        vendor = rng.choice(VENDORS)
+        output['business_name' if rng.random() < 0.8 else 'vendor'] = vendor
+        if rng.random() < 0.7:
+            output['receipt_number'] = 'INV-%08d' % rng.randrange(10 ** 8)
+        output['total_amount' if rng.random() < 0.8 else 'total'] = _amount(rng, subtotal + tax)
+        if tax and rng.random() < 0.8:
+            output['tax_amount' if rng.random() < 0.3 else 'tax'] = _amount(rng, tax)
+        if rng.random() < 0.9:
+            output['date'] = _date(rng, [vendor_date_format(vendor)] if recurring else OCR_DATE_FORMATS)
+        items = _items(rng)
+        if items:
+            output['items'] = items
+        elif rng.random() < 0.3:
+            output['description'] = rng.choice(ITEMS)
+        if rng.random() < 0.5:
+            output['receipt_description'] = 'Expenses at %s' % rng.choice(VENDORS)
+        category = rng.choice(CATEGORIES)
+        if category:
+            output['receipt_category'] = category
+        payloads.append(output)
+    return payloads
+
+
+def scan_payloads(count, seed=0):
+    """Return ``count`` outputs of the receipt scanner (``expense_claim``)."""
+    rng = random.Random(seed)
+    payloads = []
+    for _index in range(count):
+        subtotal = round(rng.uniform(1, 5000), 2)
+        tax = round(subtotal * rng.choice([0.0, 0.05, 0.1, 0.2]), 2)
+        output = {'business_name': rng.choice(VENDORS)}
+        if rng.random() < 0.9:
+            output['date'] = _date(rng, SCAN_DATE_FORMATS)
+        if rng.random() < 0.6:
+            output['subtotal'] = _amount(rng, subtotal)
+        tax_field = rng.choice(['tax', 'taxes', 'tax_amount', 'vat', 'gst', None])
+        if tax_field and tax:
+            if rng.random() < 0.2:
+                output[tax_field] = [{'name': 'VAT', 'amount': tax / 2}, {'name': 'City tax', 'amount': tax / 2}]
+            else:
+                output[tax_field] = _amount(rng, tax)
+        total_field = rng.choice(['total_amount', 'total', 'amount', 'grand_total'])
+        output[total_field] = _amount(rng, subtotal + tax)
+        items = _items(rng)
+        if items:
+            output['items'] = items
+        payloads.append(output)
+    return payloads
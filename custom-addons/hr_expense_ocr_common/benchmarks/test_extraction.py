@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput and allocations of the extraction core over thousands of payloads.
+
+Each benchmark maps the whole corpus once per round and records, in the
+``extra_info`` of the pytest-benchmark report:
+
+- ``payloads_per_second``: corpus size divided by the mean round time;
+- ``allocated_bytes_per_payload`` and ``allocated_blocks_per_payload``:
+  memory allocated while mapping the corpus once, measured with tracemalloc
+  outside the timed rounds;
+- ``peak_bytes``: the peak of traced memory during that run.
+
+Compare runs with ``pytest-benchmark compare`` to catch regressions.
+"""
+import tracemalloc
+
+import pytest
+
+from payloads import ocr_payloads, scan_payloads
+
+CORPUS_SIZE = 5000
+
+
+@pytest.fixture(scope='module')
+def ocr_corpus():
+    return ocr_payloads(CORPUS_SIZE, seed=20240314)
+
+
+@pytest.fixture(scope='module')
+def recurring_corpus():
+    return ocr_payloads(CORPUS_SIZE, seed=20240314, recurring=True)
+
+
+@pytest.fixture(scope='module')
+def scan_corpus():
+    return scan_payloads(CORPUS_SIZE, seed=20240314)
+
+
+def _measure_allocations(benchmark, run):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        run()
+        _current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    stats = after.compare_to(before, 'filename')
+    allocated = sum(stat.size_diff for stat in stats if stat.size_diff > 0)
+    blocks = sum(stat.count_diff for stat in stats if stat.count_diff > 0)
+    benchmark.extra_info['allocated_bytes_per_payload'] = round(allocated / CORPUS_SIZE, 1)
+    benchmark.extra_info['allocated_blocks_per_payload'] = round(blocks / CORPUS_SIZE, 2)
+    benchmark.extra_info['peak_bytes'] = peak
+
+
+def _bench(benchmark, run):
+    results = benchmark.pedantic(run, rounds=5, warmup_rounds=1)
+    if benchmark.stats:
+        benchmark.extra_info['payloads_per_second'] = round(CORPUS_SIZE / benchmark.stats.stats.mean)
+    _measure_allocations(benchmark, run)
+    return results
+
+
+def test_extract_ocr_values(benchmark, extraction, ocr_corpus):
+    """hr_expense_claim_auto_scan: OCR webhook output to expense values"""
+    def run():
+        return [extraction.extract_ocr_values(output) for output in ocr_corpus]
+
+    results = _bench(benchmark, run)
+    assert len(results) == CORPUS_SIZE
+    assert sum(1 for vals, _category, _lines in results if 'total_amount_currency' in vals) == CORPUS_SIZE
+
+
+def test_extract_ocr_values_recurring(benchmark, extraction, recurring_corpus):
+    """Recurring vendors, without their profiles: every date tries the formats in order"""
+    def run():
+        return [extraction.extract_ocr_values(output) for output in recurring_corpus]
+
+    results = _bench(benchmark, run)
+    assert len(results) == CORPUS_SIZE
+
+
+def test_extract_ocr_values_profiles(benchmark, extraction, recurring_corpus):
+    """Recurring vendors with their profiles: the learned date format parses in one attempt"""
+    def run():
+        profiles = {}
+        return [extraction.extract_ocr_values(
+            output, profile=profiles.setdefault(output.get('business_name') or output.get('vendor'), {}))
+            for output in recurring_corpus]
+
+    results = _bench(benchmark, run)
+    assert len(results) == CORPUS_SIZE
+    assert sum(1 for vals, _category, _lines in results if 'date' in vals) > CORPUS_SIZE * 0.8
+
+
+def test_extract_scan_values(benchmark, extraction, scan_corpus):
+    """expense_claim: receipt scanner output to expense values"""
+    def run():
+        return [extraction.extract_scan_values(output, description='Trip to Berlin') for output in scan_corpus]
+
+    results = _bench(benchmark, run)
+    assert len(results) == CORPUS_SIZE
+    assert all(vals['name'] for vals in results)
+
+
+def test_parse_date(benchmark, extraction, ocr_corpus):
+    """Date parsing alone, the costliest step: up to ten strptime() formats per payload"""
+    dates = [output['date'] for output in ocr_corpus if output.get('date')]
+
+    def run():
+        return [extraction.parse_date(value, extraction.OCR_DATE_FORMATS) for value in dates]
+
+    results = _bench(benchmark, run)
+    assert sum(1 for value in results if value) > len(dates) * 0.9
+
+
+def test_format_item_lines(benchmark, extraction, ocr_corpus):
+    """Chatter lines of the receipt items"""
+    items = [output['items'] for output in ocr_corpus if output.get('items')]
+
+    def run():
+        return [extraction.format_item_lines(receipt_items) for receipt_items in items]
+
+    _bench(benchmark, run)
@@ -0,0 +1,7 @@
+from . import ir_config_parameter
+from . import hr_expense_ocr_breaker
+from . import hr_expense_ocr_rate_limit
+from . import res_company
+from . import res_config_settings
+from . import hr_expense
+from . import hr_expense_receipt_line
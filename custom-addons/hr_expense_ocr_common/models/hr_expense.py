@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Raw OCR payloads and receipt items of the expenses, queryable in SQL.
+
+Both scanning modules store the ``output`` of the OCR result of an expense
+as is in the ``ocr_payload`` JSONB column. A GIN index (default jsonb_ops
+operator class) serves containment (``@>``), key existence (``?``) and
+SQL/JSON path (``@?``, ``@@``) queries, e.g.::
+
+    env['hr.expense']._search_ocr_payload('$.business_name == "City Taxi"')
+    env['hr.expense']._search_ocr_payload('exists($.items[*] ? (@.amount > 500))')
+    env['hr.expense']._search_ocr_payload('!(exists($.tax) || exists($.tax_amount))')
+
+The items of the receipts are stored as hr.expense.receipt.line records,
+searched in full text through ``receipt_item_search``::
+
+    env['hr.expense'].search([('receipt_item_search', 'ilike', 'printer toner')])
+"""
+
+from odoo import _, api, fields, models
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+
+class HrExpense(models.Model):
+    _inherit = 'hr.expense'
+
+    # Not prefetched: payloads are only read when asked for
+    ocr_payload = fields.Json(string='OCR Payload', copy=False, readonly=True, prefetch=False,
+                              help="Raw output of the OCR service for the receipt of the expense")
+    receipt_line_ids = fields.One2many('hr.expense.receipt.line', 'expense_id', string='Receipt Items',
+                                       copy=False, readonly=True)
+    receipt_item_search = fields.Char(string='Receipt Item', compute='_compute_receipt_item_search',
+                                      search='_search_receipt_item_search',
+                                      help="Full-text search in the items of the receipts")
+
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'hr_expense_ocr_payload_gin_index', self._table, ['ocr_payload'],
+                     method='gin', where='ocr_payload IS NOT NULL')
+
+    def _compute_receipt_item_search(self):
+        self.receipt_item_search = False
+
+    def _search_receipt_item_search(self, operator, value):
+        if operator not in ('ilike', '='):
+            raise UserError(_("Receipt items can only be searched for words they contain."))
+        if not isinstance(value, str) or not value.strip():
+            return []
+        return [('id', 'in', self.env['hr.expense.receipt.line']._search_expense_ids(value))]
+
+    @api.model
+    def _search_ocr_payload(self, jsonpath, domain=None, limit=None):
+        """Return the expenses whose raw OCR payload matches a SQL/JSON path predicate.
+
+        The predicate is evaluated with the ``@@`` operator, which the GIN
+        index of the payloads serves; access rights and record rules apply.
+
+        Args:
+            jsonpath (str): SQL/JSON path predicate, e.g. ``'$.total_amount > 500'``
+            domain (list): additional domain on the expenses
+            limit (int): maximum number of expenses returned
+
+        Returns:
+            hr.expense: the matching expenses
+        """
+        query = self._search(domain or [], limit=limit)
+        query.add_where(SQL("%s @@ %s::jsonpath", SQL.identifier(self._table, 'ocr_payload'), jsonpath))
+        return self.browse(id_ for id_, in self.env.execute_query(query.select()))
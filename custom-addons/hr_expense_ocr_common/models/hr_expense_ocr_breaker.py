@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker state of the OCR endpoints, shared by all workers.
+
+Breaker rows are read on the caller's cursor, without locking them. They are
+only updated on state changes: failures, probe calls, the first success after
+failures. Each update runs in a short transaction of its own, so a caller
+waiting on the OCR API never holds a lock on them. Successful calls adjust the
+concurrency limit kept by each process and are counted in memory; the limit
+and the counts are written at most every STATS_FLUSH_INTERVAL seconds, so a
+healthy endpoint costs no extra database connection per call. The in-flight
+calls are counted with session-level advisory locks taken on the caller's
+connection, which PostgreSQL releases by itself if the worker dies.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.addons.structured_logging import get_logger
+
+from ..services import http_client
+from ..services.circuit_breaker import OcrUnavailableError
+from ..services.db import state_cursor
+
+_logger = get_logger(__name__)
+
+# Advisory lock key space of the concurrency slots ('OCRB')
+LOCK_NAMESPACE = 0x4f435242
+# Upper bound of the concurrency limit, i.e. slots per endpoint
+MAX_SLOTS = 64
+# Seconds between two attempts at getting a concurrency slot
+SLOT_POLL_INTERVAL = 0.25
+# Seconds between two writes of the statistics of the successful calls of a process
+STATS_FLUSH_INTERVAL = 60
+
+# Concurrency limit and unwritten success count of each breaker in this
+# process, by (database, endpoint)
+_local_states = {}
+_local_states_lock = threading.Lock()
+
+# Breaker updated when a call ends with a state change, see _release()
+TRIPS = "(%(probe)s OR (state = 'closed' AND consecutive_failures + 1 >= %(threshold)s))"
+
+
+class HrExpenseOcrBreaker(models.Model):
+    _name = 'hr.expense.ocr.breaker'
+    _description = 'OCR Service Circuit Breaker'
+    _order = 'endpoint'
+    _rec_name = 'endpoint'
+
+    endpoint = fields.Char(string='Endpoint', required=True, readonly=True,
+                           help="Scheme, host and port of the OCR service")
+    state = fields.Selection([
+        ('closed', 'Closed'),
+        ('open', 'Open'),
+        ('half_open', 'Half-Open'),
+    ], string='State', default='closed', required=True, readonly=True,
+        help="Closed: calls go through. Open: calls fail immediately until the retry date. "
+             "Half-Open: one probe call decides whether the breaker closes again.")
+    consecutive_failures = fields.Integer(string='Consecutive Failures', readonly=True)
+    success_count = fields.Integer(string='Successful Calls', readonly=True)
+    failure_count = fields.Integer(string='Failed Calls', readonly=True)
+    concurrency_limit = fields.Float(string='Concurrency Limit', digits=(16, 2), readonly=True,
+                                     help="Maximum number of calls in flight, adjusted after each call")
+    in_flight = fields.Integer(string='Calls In Flight', compute='_compute_in_flight')
+    opened_at = fields.Datetime(string='Opened On', readonly=True)
+    retry_at = fields.Datetime(string='Retry After', readonly=True)
+    last_failure_date = fields.Datetime(string='Last Failure', readonly=True)
+    last_error = fields.Text(string='Last Error', readonly=True)
+
+    _sql_constraints = [
+        ('endpoint_uniq', 'unique(endpoint)', 'Only one circuit breaker per OCR endpoint is allowed!'),
+    ]
+
+    def _compute_in_flight(self):
+        counts = {}
+        if self.ids:
+            self.env.cr.execute("""
+                SELECT objid::bigint / %s, count(*)
+                  FROM pg_locks
+                 WHERE locktype = 'advisory' AND granted
+                   AND database = (SELECT oid FROM pg_database WHERE datname = current_database())
+                   AND classid = %s::oid AND objsubid = 2
+                   AND objid::bigint / %s IN %s
+              GROUP BY 1
+            """, (MAX_SLOTS, LOCK_NAMESPACE, MAX_SLOTS, tuple(self.ids)))
+            counts = dict(self.env.cr.fetchall())
+        for breaker in self:
+            breaker.in_flight = counts.get(breaker.id, 0)
+
+    @api.model
+    def _get_endpoint(self, url):
+        """Return the endpoint key of a URL, e.g. https://ocr.example.com:443."""
+        return '%s://%s:%s' % http_client._endpoint_key(url)
+
+    def _fetch_state(self, cr, endpoint, config):
+        cr.execute("""
+            INSERT INTO hr_expense_ocr_breaker
+                   (endpoint, state, consecutive_failures, success_count, failure_count,
+                    concurrency_limit, create_uid, write_uid, create_date, write_date)
+            VALUES (%s, 'closed', 0, 0, 0, %s, %s, %s,
+                    (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+       ON CONFLICT (endpoint) DO NOTHING
+        """, (endpoint, config['concurrency_max'], self.env.uid, self.env.uid))
+        return self._read_state(cr, endpoint)
+
+    def _read_state(self, cr, endpoint):
+        cr.execute("""
+            SELECT id, endpoint, state, retry_at, concurrency_limit, consecutive_failures
+              FROM hr_expense_ocr_breaker
+             WHERE endpoint = %s
+        """, (endpoint,))
+        return cr.dictfetchone()
+
+    def _local_state(self, breaker, config):
+        """Return the state of a breaker kept by this process."""
+        key = (self.env.cr.dbname, breaker['endpoint'])
+        with _local_states_lock:
+            local = _local_states.get(key)
+            if local is None or local['id'] != breaker['id']:
+                local = _local_states[key] = {
+                    'id': breaker['id'],
+                    'limit': breaker['concurrency_limit'] or config['concurrency_max'],
+                    'successes': 0,
+                    'flushed_at': time.monotonic(),
+                }
+        return local
+
+    @api.model
+    def _get_retry_at(self, url):
+        """Return the date until which calls to ``url`` are rejected, or False."""
+        self.env.cr.execute("""
+            SELECT retry_at FROM hr_expense_ocr_breaker
+             WHERE endpoint = %s AND state != 'closed'
+               AND retry_at > (now() AT TIME ZONE 'UTC')
+        """, (self._get_endpoint(url),))
+        row = self.env.cr.fetchone()
+        return row[0] if row else False
+
+    def _reject(self, breaker):
+        _logger.info("OCR circuit breaker for %s is %s, rejecting call",
+                     breaker['endpoint'], breaker['state'], sample=10)
+        raise OcrUnavailableError(
+            _("The OCR service %s is unavailable, retry after %s.") % (breaker['endpoint'], breaker['retry_at']),
+            retry_at=breaker['retry_at'])
+
+    @api.model
+    def _acquire(self, url):
+        """Get permission to call ``url``.
+
+        Args:
+            url (str): URL of the OCR endpoint
+
+        Returns:
+            tuple: token to hand back to _release()
+
+        Raises:
+            OcrUnavailableError: the breaker is open, or no concurrency slot
+                freed up within the ocr_concurrency_wait delay
+        """
+        config = self.env['ir.config_parameter']._get_ocr_breaker_config()
+        endpoint = self._get_endpoint(url)
+        now = fields.Datetime.now()
+        probe = False
+        breaker = self._read_state(self.env.cr, endpoint)
+        if not breaker:
+            # First call to the endpoint: its breaker is created for all workers at once
+            with state_cursor(self.env) as cr:
+                breaker = self._fetch_state(cr, endpoint, config)
+        if breaker['state'] != 'closed':
+            if breaker['retry_at'] and breaker['retry_at'] > now:
+                self._reject(breaker)
+            with state_cursor(self.env) as cr:
+                # Only the call switching the breaker to half-open goes through as the probe
+                cr.execute("""
+                    UPDATE hr_expense_ocr_breaker
+                       SET state = 'half_open', retry_at = %s
+                     WHERE id = %s AND state != 'closed'
+                       AND (retry_at IS NULL OR retry_at <= %s)
+                 RETURNING id
+                """, (now + timedelta(seconds=config['reset_timeout']), breaker['id'], now))
+                probe = bool(cr.fetchone())
+                if not probe:
+                    # Another worker sent the probe, or closed the breaker already
+                    breaker = self._read_state(cr, endpoint)
+            if not probe and breaker['state'] != 'closed':
+                self._reject(breaker)
+            if probe:
+                _logger.info("OCR circuit breaker for %s is half-open, sending a probe call", endpoint)
+
+        local = self._local_state(breaker, config)
+        limit = 1 if probe else int(local['limit'])
+        limit = min(max(limit, config['concurrency_min']), MAX_SLOTS)
+        deadline = time.monotonic() + config['concurrency_wait']
+        while True:
+            for slot in range(limit):
+                key = breaker['id'] * MAX_SLOTS + slot
+                self.env.cr.execute("SELECT pg_try_advisory_lock(%s, %s)", (LOCK_NAMESPACE, key))
+                if self.env.cr.fetchone()[0]:
+                    return (breaker, key, probe)
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(SLOT_POLL_INTERVAL)
+
+        _logger.warning("OCR concurrency limit of %d call(s) reached for %s", limit, endpoint)
+        raise OcrUnavailableError(
+            _("Too many calls to the OCR service %s are in progress, try again later.") % endpoint,
+            retry_at=fields.Datetime.now() + timedelta(seconds=max(config['concurrency_wait'], 1)))
+
+    @api.model
+    def _release(self, token, success, error=None, elapsed=0.0):
+        """Free the concurrency slot of a call and record its outcome.
+
+        The concurrency limit of the process is adjusted right away (AIMD:
+        additive increase after a full limit's worth of fast successful calls,
+        halved after a failure or a slow call). The breaker row is only written
+        when the outcome changes its state, and otherwise at most every
+        STATS_FLUSH_INTERVAL seconds.
+
+        Args:
+            token (tuple): value returned by _acquire()
+            success (bool): outcome of the call, None if the call failed for a
+                reason unrelated to the OCR service
+            error (str): description of the failure
+            elapsed (float): duration of the call in seconds
+        """
+        breaker, key, probe = token
+        self.env.cr.execute("SELECT pg_advisory_unlock(%s, %s)", (LOCK_NAMESPACE, key))
+        if success is None:
+            return
+
+        config = self.env['ir.config_parameter']._get_ocr_breaker_config()
+        max_limit = min(config['concurrency_max'], MAX_SLOTS)
+        local = self._local_state(breaker, config)
+        with _local_states_lock:
+            limit = max(local['limit'], 1)
+            if success and elapsed < config['slow_call']:
+                local['limit'] = min(max_limit, limit + 1.0 / limit)
+            else:
+                # Failures and slow answers, a sign of congestion, halve the limit
+                local['limit'] = max(config['concurrency_min'], limit * 0.5)
+            if success:
+                local['successes'] += 1
+            if not (not success or probe or breaker['consecutive_failures']
+                    or time.monotonic() - local['flushed_at'] >= STATS_FLUSH_INTERVAL):
+                return
+            successes, local['successes'] = local['successes'], 0
+            local['flushed_at'] = time.monotonic()
+            limit = local['limit']
+
+        now = fields.Datetime.now()
+        params = {
+            'id': breaker['id'],
+            'success': bool(success),
+            'probe': probe,
+            'now': now,
+            'retry_at': now + timedelta(seconds=config['reset_timeout']),
+            'threshold': config['failure_threshold'],
+            'successes': successes,
+            'limit': limit,
+            'error': (error or '')[:2048],
+        }
+        with state_cursor(self.env) as cr:
+            cr.execute("""
+                UPDATE hr_expense_ocr_breaker
+                   SET success_count = success_count + %(successes)s,
+                       failure_count = failure_count + CASE WHEN %(success)s THEN 0 ELSE 1 END,
+                       consecutive_failures = CASE WHEN %(success)s THEN 0 ELSE consecutive_failures + 1 END,
+                       last_failure_date = CASE WHEN %(success)s THEN last_failure_date ELSE %(now)s END,
+                       last_error = CASE WHEN %(success)s THEN last_error ELSE %(error)s END,
+                       state = CASE WHEN %(success)s AND %(probe)s THEN 'closed'
+                                    WHEN NOT %(success)s AND {trips} THEN 'open'
+                                    ELSE state END,
+                       opened_at = CASE WHEN NOT %(success)s AND {trips} THEN %(now)s ELSE opened_at END,
+                       retry_at = CASE WHEN %(success)s AND %(probe)s THEN NULL
+                                       WHEN NOT %(success)s AND {trips} THEN %(retry_at)s
+                                       ELSE retry_at END,
+                       concurrency_limit = %(limit)s,
+                       write_date = %(now)s
+                 WHERE id = %(id)s
+             RETURNING endpoint, state, retry_at, opened_at = %(now)s
+            """.format(trips=TRIPS), params)
+            row = cr.fetchone()
+
+        if row and row[3]:
+            _logger.warning("OCR circuit breaker for %s opened until %s: %s", row[0], row[2], error)
+        elif row and probe and row[1] == 'closed':
+            _logger.info("OCR circuit breaker for %s closed after a successful probe", row[0])
+        self.invalidate_model()
+
+    def action_reset(self):
+        """Close the breakers and restore their concurrency limit.
+
+        The concurrency limits kept by the other processes grow back by
+        themselves with their next successful calls.
+        """
+        config = self.env['ir.config_parameter']._get_ocr_breaker_config()
+        with _local_states_lock:
+            for breaker in self:
+                _local_states.pop((self.env.cr.dbname, breaker.endpoint), None)
+        self.write({
+            'state': 'closed',
+            'consecutive_failures': 0,
+            'retry_at': False,
+            'concurrency_limit': min(config['concurrency_max'], MAX_SLOTS),
+        })
+        return True
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Token buckets of the OCR rate limiter, one per company.
+
+Buckets are refilled lazily: each take adds the tokens earned since the last
+one, using the database clock so all nodes agree on the elapsed time. A take
+may lease several tokens at once, which the process spends without going back
+to the database, and hands back the tokens of its previous lease it did not
+spend, see services/rate_limiter.py.
+"""
+
+from odoo import models, fields, api
+from odoo.addons.structured_logging import get_logger
+
+from ..services.db import state_cursor
+
+_logger = get_logger(__name__)
+
+
+class HrExpenseOcrRateLimit(models.Model):
+    _name = 'hr.expense.ocr.rate.limit'
+    _description = 'OCR Rate Limiter Token Bucket'
+    _order = 'company_id'
+    _rec_name = 'company_id'
+
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True,
+                                 ondelete='cascade')
+    tokens = fields.Float(string='Available Calls', digits=(16, 2), readonly=True,
+                          help="Calls left in the bucket at the last refill")
+    refilled_at = fields.Datetime(string='Last Refill', readonly=True)
+    granted_count = fields.Integer(string='Granted Calls', readonly=True)
+    throttled_count = fields.Integer(string='Throttled Calls', readonly=True,
+                                     help="Number of times a call found the bucket empty")
+
+    _sql_constraints = [
+        ('company_uniq', 'unique(company_id)', 'Only one OCR token bucket per company is allowed!'),
+    ]
+
+    @api.model
+    def _take(self, company_id, rate, burst, cost=1, lease=None, returned=0):
+        """Take ``cost`` tokens from the bucket of a company if it holds enough.
+
+        Args:
+            company_id (int): company owning the bucket
+            rate (float): tokens added per second
+            burst (int): capacity of the bucket
+            cost (int): tokens needed
+            lease (int): tokens to take if the bucket holds that many, at
+                least ``cost`` (default ``cost``)
+            returned (int): unspent tokens handed back to the bucket
+
+        Returns:
+            tuple: (tokens taken, 0 if they were taken, otherwise the number
+                of seconds until ``cost`` tokens are available)
+        """
+        params = {'company': company_id, 'rate': rate, 'burst': burst, 'cost': cost,
+                  'lease': max(lease or cost, cost), 'returned': returned, 'uid': self.env.uid}
+        with state_cursor(self.env) as cr:
+            cr.execute("""
+                INSERT INTO hr_expense_ocr_rate_limit
+                       (company_id, tokens, refilled_at, granted_count, throttled_count,
+                        create_uid, write_uid, create_date, write_date)
+                VALUES (%(company)s, %(burst)s, (now() AT TIME ZONE 'UTC'), 0, 0, %(uid)s, %(uid)s,
+                        (now() AT TIME ZONE 'UTC'), (now() AT TIME ZONE 'UTC'))
+           ON CONFLICT (company_id) DO NOTHING
+            """, params)
+            cr.execute("""
+                WITH bucket AS (
+                    SELECT id, LEAST(%(burst)s, tokens + %(returned)s + %(rate)s * EXTRACT(EPOCH FROM
+                                     ((now() AT TIME ZONE 'UTC') - refilled_at))) AS available
+                      FROM hr_expense_ocr_rate_limit
+                     WHERE company_id = %(company)s
+                       FOR UPDATE
+                ), lease AS (
+                    SELECT id, available,
+                           CASE WHEN available >= %(cost)s THEN LEAST(floor(available), %(lease)s)
+                                ELSE 0 END AS taken
+                      FROM bucket
+                )
+                UPDATE hr_expense_ocr_rate_limit AS rate_limit
+                   SET tokens = lease.available - lease.taken,
+                       refilled_at = (now() AT TIME ZONE 'UTC'),
+                       granted_count = granted_count + lease.taken::int - %(returned)s,
+                       throttled_count = throttled_count + (lease.taken = 0)::int
+                  FROM lease
+                 WHERE rate_limit.id = lease.id
+             RETURNING lease.taken, lease.available
+            """, params)
+            taken, available = cr.fetchone()
+        self.invalidate_model()
+        if taken:
+            return int(taken), 0
+        return 0, (cost - available) / rate
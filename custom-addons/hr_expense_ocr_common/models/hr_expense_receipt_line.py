@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Line items read on the receipts of the expenses.
+
+Both scanning modules create the items of a scan in one batch, alongside the
+formatted text they keep for the chatter and the description. Descriptions
+are indexed for full-text search (GIN index on their tsvector, 'simple'
+configuration: receipts come in every language), so the expenses that bought
+something are found with an index lookup.
+"""
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import create_index
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Text search configuration of the descriptions
+TEXT_SEARCH_CONFIG = 'simple'
+# Fields of a line, as mapped by receipt_line_values() of services/extraction.py
+LINE_FIELDS = ('sequence', 'quantity', 'description', 'amount', 'tax')
+
+
+def description_tsvector(column='description'):
+    """Return the tsvector expression of the descriptions; queries must use the one of the index."""
+    return "to_tsvector('%s', coalesce(%s, ''))" % (TEXT_SEARCH_CONFIG, column)
+
+
+class HrExpenseReceiptLine(models.Model):
+    _name = 'hr.expense.receipt.line'
+    _description = 'Receipt Line Item'
+    _order = 'expense_id, sequence, id'
+    _rec_name = 'description'
+
+    expense_id = fields.Many2one('hr.expense', string='Expense', required=True, index=True, ondelete='cascade')
+    company_id = fields.Many2one(related='expense_id.company_id', store=True)
+    sequence = fields.Integer(string='Sequence', default=10)
+    quantity = fields.Float(string='Quantity', digits='Product Unit of Measure', default=1.0)
+    description = fields.Char(string='Description')
+    amount = fields.Float(string='Amount', digits='Account')
+    tax = fields.Float(string='Tax', digits='Account')
+
+    def init(self):
+        super().init()
+        create_index(self.env.cr, 'hr_expense_receipt_line_description_tsv_index', self._table,
+                     [description_tsvector()], method='gin')
+
+    def _get_line_values(self):
+        """Return the values of the lines, in the format of receipt_line_values()."""
+        return [{name: line[name] for name in LINE_FIELDS} for line in self]
+
+    @api.model
+    def _search_expense_ids(self, text):
+        """Return the ids of the expenses with an item matching a full-text query.
+
+        Args:
+            text (str): query in web search syntax, e.g. ``coffee -decaf`` or
+                ``"printer toner"``
+
+        Returns:
+            list: expense ids; the access rules of the expenses still apply
+                to whoever reads them
+        """
+        query = self._search([])
+        column = SQL.identifier(self._table, 'description')
+        query.add_where(SQL("%s @@ websearch_to_tsquery(%s, %s)",
+                            SQL(description_tsvector('%s'), column), TEXT_SEARCH_CONFIG, text))
+        return list({expense_id for expense_id, in self.env.execute_query(
+            query.select(SQL.identifier(self._table, 'expense_id')))})
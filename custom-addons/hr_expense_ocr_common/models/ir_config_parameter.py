@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from odoo import api, models, tools
+from odoo.tools import frozendict
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+DEFAULT_BREAKER_FAILURE_THRESHOLD = 5
+DEFAULT_BREAKER_RESET_TIMEOUT = 60
+DEFAULT_BREAKER_SLOW_CALL = 60
+DEFAULT_CONCURRENCY_MIN = 1
+DEFAULT_CONCURRENCY_MAX = 8
+DEFAULT_CONCURRENCY_WAIT = 5
+
+
+class IrConfigParameter(models.Model):
+    _inherit = 'ir.config_parameter'
+
+    @api.model
+    @tools.ormcache()
+    def _get_ocr_breaker_config(self):
+        """Return the circuit breaker and concurrency settings of the OCR services.
+
+        Cached in the registry like the other OCR settings; ir.config_parameter
+        clears the cache whenever a parameter changes.
+
+        Returns:
+            frozendict: failure_threshold, reset_timeout, slow_call,
+                concurrency_min, concurrency_max and concurrency_wait
+        """
+        ICP = self.sudo()
+        try:
+            failure_threshold = int(ICP.get_param('ocr_breaker_failure_threshold',
+                                                  DEFAULT_BREAKER_FAILURE_THRESHOLD))
+            reset_timeout = int(ICP.get_param('ocr_breaker_reset_timeout', DEFAULT_BREAKER_RESET_TIMEOUT))
+            slow_call = float(ICP.get_param('ocr_breaker_slow_call', DEFAULT_BREAKER_SLOW_CALL))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR circuit breaker parameters, using defaults")
+            failure_threshold = DEFAULT_BREAKER_FAILURE_THRESHOLD
+            reset_timeout = DEFAULT_BREAKER_RESET_TIMEOUT
+            slow_call = DEFAULT_BREAKER_SLOW_CALL
+        try:
+            concurrency_min = int(ICP.get_param('ocr_concurrency_min', DEFAULT_CONCURRENCY_MIN))
+            concurrency_max = int(ICP.get_param('ocr_concurrency_max', DEFAULT_CONCURRENCY_MAX))
+            concurrency_wait = float(ICP.get_param('ocr_concurrency_wait', DEFAULT_CONCURRENCY_WAIT))
+        except (ValueError, TypeError):
+            _logger.warning("Invalid OCR concurrency parameters, using defaults")
+            concurrency_min = DEFAULT_CONCURRENCY_MIN
+            concurrency_max = DEFAULT_CONCURRENCY_MAX
+            concurrency_wait = DEFAULT_CONCURRENCY_WAIT
+
+        concurrency_min = max(concurrency_min, 1)
+        return frozendict({
+            'failure_threshold': max(failure_threshold, 1),
+            'reset_timeout': max(reset_timeout, 1),
+            'slow_call': slow_call,
+            'concurrency_min': concurrency_min,
+            'concurrency_max': max(concurrency_max, concurrency_min),
+            'concurrency_wait': max(concurrency_wait, 0),
+        })
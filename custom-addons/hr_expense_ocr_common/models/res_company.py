@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    ocr_rate_limit = fields.Integer(
+        string="OCR Calls per Minute",
+        default=0,
+        help="Maximum number of calls to the OCR services per minute for this company, "
+             "shared by all workers. 0 means no limit."
+    )
+    ocr_rate_burst = fields.Integer(
+        string="OCR Burst",
+        default=5,
+        help="Number of OCR calls that can be made in a row before the rate limit applies"
+    )
+    ocr_rate_limit_mode = fields.Selection(
+        [('wait', 'Wait for the quota'), ('defer', 'Defer the scan')],
+        string="When the OCR Quota is Used Up",
+        default='wait',
+        help="Wait: the scan waits for the quota to refill, up to the maximum wait. "
+             "Defer: the scan is queued for later right away."
+    )
+    ocr_rate_limit_max_wait = fields.Integer(
+        string="OCR Maximum Wait (seconds)",
+        default=30,
+        help="Longest time a scan waits for the OCR quota before being deferred"
+    )
@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from odoo import models, fields
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    ocr_breaker_ids = fields.Many2many(
+        'hr.expense.ocr.breaker',
+        string="OCR Service Status",
+        compute='_compute_ocr_breaker_ids',
+        help="Circuit breaker state of each OCR service endpoint"
+    )
+    ocr_rate_limit = fields.Integer(
+        related='company_id.ocr_rate_limit',
+        readonly=False
+    )
+    ocr_rate_burst = fields.Integer(
+        related='company_id.ocr_rate_burst',
+        readonly=False
+    )
+    ocr_rate_limit_mode = fields.Selection(
+        related='company_id.ocr_rate_limit_mode',
+        readonly=False
+    )
+    ocr_rate_limit_max_wait = fields.Integer(
+        related='company_id.ocr_rate_limit_max_wait',
+        readonly=False
+    )
+
+    def _compute_ocr_breaker_ids(self):
+        breakers = self.env['hr.expense.ocr.breaker'].sudo().search([])
+        for settings in self:
+            settings.ocr_breaker_ids = breakers
@@ -0,0 +1,7 @@
+from . import http_client
+from . import multipart
+from . import receipt_file
+from . import circuit_breaker
+from . import db
+from . import rate_limiter
+from . import extraction
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+Circuit breaker and adaptive concurrency limit around the OCR services.
+
+When an OCR service is slow or down, every worker calling it stays blocked
+until its request times out. ``post()`` wraps ``http_client.post()`` with the
+breaker stored in ``hr.expense.ocr.breaker``, shared by all workers through
+PostgreSQL:
+
+* after a number of consecutive failures the breaker opens and calls fail
+  immediately with ``OcrUnavailableError`` until the reset timeout expires;
+  one probe call then decides whether the breaker closes again;
+* the number of calls in flight to an endpoint is capped by an AIMD limit
+  (additive increase on success, multiplicative decrease on failures and slow
+  calls), enforced with PostgreSQL advisory locks.
+
+``call_async()`` applies the same breaker to calls made by asyncio clients.
+"""
+import time
+
+import requests
+
+from . import http_client
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+
+class OcrUnavailableError(Exception):
+    """The OCR service cannot be called right now (breaker open or concurrency limit reached)"""
+
+    def __init__(self, message, retry_at=None):
+        super().__init__(message)
+        self.retry_at = retry_at
+
+
+def is_failure(response):
+    """Return True if a response means the OCR service is unhealthy."""
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def post(env, url, before_send=None, **kwargs):
+    """Send a POST request through the pooled session, guarded by the circuit breaker.
+
+    Accepts the same keyword arguments as ``requests.post``.
+
+    Args:
+        env: Odoo environment of the caller
+        url (str): URL of the OCR endpoint
+        before_send: function without arguments called once the breaker let
+            the call through, e.g. ``rate_limiter.acquire``; an exception it
+            raises cancels the call without counting as a failure
+
+    Returns:
+        requests.Response: the response of the last attempt
+
+    Raises:
+        OcrUnavailableError: the breaker of the endpoint is open or too many
+            calls to the endpoint are in flight
+    """
+    Breaker = env['hr.expense.ocr.breaker'].sudo()
+    token = Breaker._acquire(url)
+    success, error = None, None
+    started = time.monotonic()
+    try:
+        if before_send is not None:
+            before_send()
+            started = time.monotonic()
+        response = http_client.post(url, **kwargs)
+        success = not is_failure(response)
+        if not success:
+            error = "HTTP %s" % response.status_code
+        return response
+    except requests.exceptions.RequestException as e:
+        success, error = False, str(e)
+        raise
+    finally:
+        Breaker._release(token, success, error, time.monotonic() - started)
+
+
+async def call_async(env, url, send, before_send=None):
+    """Await an OCR call guarded by the circuit breaker, for asyncio clients.
+
+    ``send`` performs the request with whatever client the caller uses; any
+    exception it raises counts as a failure of the OCR service, except a
+    cancellation, which is neutral. The breaker state is read and updated
+    synchronously, with short queries.
+
+    Args:
+        env: Odoo environment of the caller
+        url (str): URL of the OCR endpoint
+        send: coroutine function without arguments returning a response
+            with a ``status_code``
+        before_send: coroutine function without arguments awaited once the
+            breaker let the call through; an exception it raises cancels the
+            call without counting as a failure
+
+    Returns:
+        the response returned by ``send``
+
+    Raises:
+        OcrUnavailableError: the breaker of the endpoint is open
+    """
+    Breaker = env['hr.expense.ocr.breaker'].sudo()
+    token = Breaker._acquire(url)
+    try:
+        if before_send is not None:
+            await before_send()
+    except BaseException:
+        Breaker._release(token, None)
+        raise
+    success, error = None, None
+    started = time.monotonic()
+    try:
+        response = await send()
+        success = not is_failure(response)
+        if not success:
+            error = "HTTP %s" % response.status_code
+        return response
+    except Exception as e:
+        success, error = False, str(e) or type(e).__name__
+        raise
+    finally:
+        Breaker._release(token, success, error, time.monotonic() - started)
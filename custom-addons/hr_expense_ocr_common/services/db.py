@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+Database helpers shared by the OCR coordination models.
+"""
+import threading
+from contextlib import contextmanager
+
+
+@contextmanager
+def state_cursor(env):
+    """Cursor for short updates of state shared between workers.
+
+    The state is read and updated in a transaction of its own, committed on
+    exit, so callers waiting on an OCR API never hold locks on it. Tests run
+    in a single transaction and use the caller's cursor instead.
+
+    Args:
+        env: Odoo environment of the caller
+
+    Yields:
+        odoo.sql_db.Cursor
+    """
+    if getattr(threading.current_thread(), 'testing', False):
+        yield env.cr
+    else:
+        with env.registry.cursor() as cr:
+            yield cr
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+Pure-Python extraction of expense values from OCR results.
+
+Turning an OCR payload into expense values (probing the field names of the
+different OCR formats, coercing amounts, parsing dates, formatting items)
+needs no database. It lives here, apart from the ORM writes of the scanning
+modules, so it can be tested and benchmarked without Odoo (see
+``benchmarks/``): this module imports nothing from Odoo.
+
+- ``extract_ocr_values()`` maps a result of the OCR webhook for
+  ``hr_expense_claim_auto_scan``;
+- ``extract_scan_values()`` maps a result of the receipt scanner for
+  ``expense_claim``;
+- ``receipt_line_values()`` maps the items of either to receipt lines.
+"""
+import logging
+from datetime import datetime
+
+_logger = logging.getLogger(__name__)
+
+# Date formats of the OCR webhook, tried in order
+OCR_DATE_FORMATS = [
+    '%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y',
+    '%m/%d/%Y %I:%M %p', '%d/%m/%Y %H:%M', '%Y-%m-%dT%H:%M:%S',
+    '%B %d, %Y', '%d %B %Y',
+]
+# Date formats of the receipt scanner, tried in order; the first one is its usual "Jun 28, 15 01:35 PM"
+SCAN_DATE_FORMATS = ['%b %d, %y %I:%M %p', '%Y-%m-%d', '%d/%m/%Y', '%m/%d/%Y', '%b %d, %Y', '%B %d, %Y']
+# Field names of the amounts in the receipt scanner results, by priority
+SCAN_TAX_FIELDS = ['tax', 'taxes', 'tax_amount', 'vat', 'gst', 'hst']
+SCAN_TOTAL_FIELDS = ['total_amount', 'total', 'amount', 'grand_total']
+
+
+def amount_convention(value):
+    """Return the decimal separator an amount is printed with, when it shows.
+
+    ``"1.234,56"`` and ``"12,50"`` use a decimal comma, ``"1,234.56"`` and
+    ``"12.50"`` a decimal point; ``"1,234"`` or ``"12"`` do not tell.
+
+    Returns:
+        str: ``'.'``, ``','`` or None
+    """
+    if not isinstance(value, str):
+        return None
+    text = value.strip()
+    dot, comma = text.rfind('.'), text.rfind(',')
+    if dot >= 0 and comma >= 0:
+        return '.' if dot > comma else ','
+    separator = ',' if comma >= 0 else '.' if dot >= 0 else None
+    # A single separator followed by one or two digits is a decimal one
+    if separator and text.count(separator) == 1 and 0 < len(text) - max(dot, comma) - 1 < 3:
+        return separator
+    return None
+
+
+def parse_amount(value, decimal_separator='.'):
+    """Return an amount of an OCR result as a float.
+
+    Strings such as ``"1,234.50"`` (or ``"1.234,50"`` with a decimal comma)
+    are converted; a string that is not a number is returned unchanged, like
+    any other value.
+    """
+    if isinstance(value, str):
+        if decimal_separator == ',':
+            text = value.replace('.', '').replace(' ', '').replace(',', '.')
+        else:
+            text = value.replace(',', '')
+        try:
+            return float(text)
+        except (ValueError, TypeError):
+            _logger.warning("Could not convert amount '%s' to float", value)
+    return value
+
+
+def parse_date_format(value, formats, preferred=None):
+    """Return the date of an OCR result and the format it matched.
+
+    Args:
+        value (str): date as read on the receipt
+        formats (list): strptime formats to try, in order
+        preferred (str): format tried first, e.g. the one that parsed the
+            previous receipt of the vendor
+
+    Returns:
+        tuple: (date, format), or (None, None) if no format matches
+    """
+    if preferred:
+        try:
+            return datetime.strptime(value, preferred).date(), preferred
+        except ValueError:
+            pass
+    for fmt in formats:
+        if fmt == preferred:
+            continue
+        try:
+            return datetime.strptime(value, fmt).date(), fmt
+        except ValueError:
+            continue
+    return None, None
+
+
+def parse_date(value, formats):
+    """Return the date of an OCR result, trying each format in turn.
+
+    Args:
+        value (str): date as read on the receipt
+        formats (list): strptime formats to try
+
+    Returns:
+        date: the parsed date, or None if no format matches
+    """
+    return parse_date_format(value, formats)[0]
+
+
+def format_item_lines(items):
+    """Return the chatter lines of the items of an OCR result, e.g. ``  • 2× Coffee (7.0)``."""
+    item_lines = []
+    for item in items:
+        item_desc = item.get('description', '')
+        item_qty = item.get('quantity', '')
+        item_amount = item.get('amount', '')
+
+        item_parts = []
+        if item_qty:
+            item_parts.append(str(item_qty) + "×")
+        if item_desc:
+            item_parts.append(item_desc)
+        if item_amount:
+            item_parts.append("(" + str(item_amount) + ")")
+
+        if item_parts:
+            item_lines.append("  • " + " ".join(item_parts))
+    return item_lines
+
+
+def _line_number(value, decimal_separator='.'):
+    if value in (None, '', False):
+        return 0.0
+    number = parse_amount(value, decimal_separator)
+    return float(number) if isinstance(number, (int, float)) and not isinstance(number, bool) else 0.0
+
+
+def receipt_line_values(items, decimal_separator='.'):
+    """Return the values of the receipt lines of the items of an OCR result.
+
+    Args:
+        items (list): ``items`` of an OCR result, dicts with a description,
+            a quantity, an amount and, for the receipt scanner, a tax
+        decimal_separator (str): decimal separator of the amounts printed
+            as strings
+
+    Returns:
+        list: dicts of sequence, quantity, description, amount and tax, for
+            the items with a description or an amount
+    """
+    lines = []
+    if not isinstance(items, list):
+        return lines
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        description = item.get('description')
+        description = str(description)[:256] if description else False
+        amount = _line_number(item.get('amount'), decimal_separator)
+        if not description and not amount:
+            continue
+        lines.append({
+            'sequence': len(lines) + 1,
+            'quantity': _line_number(item.get('quantity'), decimal_separator) or 1.0,
+            'description': description,
+            'amount': amount,
+            'tax': _line_number(item.get('tax'), decimal_separator),
+        })
+    return lines
+
+
+def extract_ocr_values(ocr_data, has_name=False, profile=None):
+    """Map the output of the OCR webhook to expense values.
+
+    Args:
+        ocr_data (dict): ``output`` of an OCR result (new or legacy format)
+        has_name (bool): whether the expense already has a description,
+            which the first item only fills when it is empty
+        profile (dict): parse hints of the vendor, learned from its previous
+            receipts: ``date_format`` and ``decimal_separator``. Updated in
+            place with what this receipt shows
+
+    Returns:
+        tuple: (vals, category, item_lines) with the expense field values
+            found, the expense category code read on the receipt (or None)
+            and the chatter lines of the items
+    """
+    vals = {}
+
+    if ocr_data.get('business_name'):
+        vals['business_name'] = ocr_data.get('business_name')[:64]
+    elif ocr_data.get('vendor'):
+        vals['business_name'] = ocr_data.get('vendor')[:64]
+
+    if ocr_data.get('receipt_number'):
+        vals['receipt_number'] = ocr_data.get('receipt_number')[:32]
+
+    total_amount = ocr_data.get('total_amount') or ocr_data.get('total')
+    tax_amount = ocr_data.get('tax_amount') or ocr_data.get('tax')
+    decimal_separator = '.'
+    if profile is not None:
+        convention = amount_convention(total_amount) or amount_convention(tax_amount)
+        if convention:
+            profile['decimal_separator'] = convention
+        decimal_separator = profile.get('decimal_separator') or '.'
+
+    if total_amount:
+        vals['total_amount_currency'] = parse_amount(total_amount, decimal_separator)
+
+    if tax_amount:
+        vals['tax_amount_currency'] = parse_amount(tax_amount, decimal_separator)
+
+    date_str = ocr_data.get('date')
+    if date_str:
+        try:
+            expense_date, date_format = parse_date_format(
+                date_str, OCR_DATE_FORMATS, preferred=profile and profile.get('date_format'))
+            if expense_date:
+                vals['date'] = expense_date
+                if profile is not None:
+                    profile['date_format'] = date_format
+            else:
+                _logger.warning("Could not parse date '%s' with any known format", date_str)
+        except TypeError as e:
+            _logger.warning("Could not parse date '%s': %s", date_str, str(e))
+
+    items = ocr_data.get('items')
+    item_lines = []
+    if items and isinstance(items, list):
+        if not has_name and items[0].get('description'):
+            vals['name'] = items[0].get('description')
+        item_lines = format_item_lines(items)
+    elif ocr_data.get('description') and not has_name:
+        vals['name'] = ocr_data.get('description')
+
+    if ocr_data.get('receipt_description'):
+        vals['name'] = ocr_data.get('receipt_description')
+
+    return vals, ocr_data.get('receipt_category') or None, item_lines
+
+
+def _scan_float(output, field):
+    try:
+        return float(output.get(field, 0.0))
+    except (ValueError, TypeError) as e:
+        _logger.warning("Failed to parse '%s' from receipt scan, value: %s, error: %s",
+                        field, output.get(field), str(e))
+        return None
+
+
+def extract_scan_values(output, description=''):
+    """Map the output of the receipt scanner to expense values.
+
+    The amount of the expense is the subtotal, as the tax is recorded apart:
+    it is derived from the total and the tax when the receipt has no subtotal.
+    The items are appended to the description of the expense.
+
+    Args:
+        output (dict): ``output`` of a receipt scanner result
+        description (str): current description of the expense
+
+    Returns:
+        dict: expense field values found
+    """
+    vals = {}
+
+    if 'business_name' in output:
+        vals['name'] = output.get('business_name', '')
+
+    if 'date' in output:
+        try:
+            expense_date = parse_date(output.get('date', ''), SCAN_DATE_FORMATS)
+            if expense_date:
+                vals['date'] = expense_date.strftime('%Y-%m-%d')
+        except Exception as e:  # pylint: disable=broad-except
+            _logger.warning("Failed to parse date from receipt scan, date value: %s, error: %s",
+                            output.get('date', ''), str(e))
+
+    subtotal = tax = total = 0.0
+
+    if 'subtotal' in output:
+        subtotal = _scan_float(output, 'subtotal') or 0.0
+
+    for tax_field in SCAN_TAX_FIELDS:
+        if tax_field in output:
+            tax_value = output.get(tax_field, 0.0)
+            if isinstance(tax_value, list):
+                try:
+                    # A list of tax items
+                    tax = sum(float(item.get('amount', 0.0)) for item in tax_value if isinstance(item, dict))
+                    break
+                except (ValueError, TypeError) as e:
+                    _logger.warning("Failed to parse tax amount from field '%s', error: %s", tax_field, str(e))
+                    continue
+            value = _scan_float(output, tax_field)
+            if value is not None:
+                tax = value
+                break
+
+    for total_field in SCAN_TOTAL_FIELDS:
+        if total_field in output:
+            value = _scan_float(output, total_field)
+            if value is not None:
+                total = value
+                break
+
+    # Without a tax amount, the tax is the difference between total and subtotal
+    if total > 0 and subtotal > 0 and tax == 0 and total - subtotal > 0:
+        tax = total - subtotal
+
+    if total > 0 and subtotal > 0 and tax > 0 and abs(subtotal + tax - total) >= 0.01:
+        _logger.warning("Financial data inconsistency: subtotal(%s) + tax(%s) = %s, but total = %s",
+                        subtotal, tax, subtotal + tax, total)
+
+    if subtotal > 0:
+        vals['total_amount'] = vals['total_amount_currency'] = subtotal
+    elif total > 0 and tax > 0:
+        vals['total_amount'] = vals['total_amount_currency'] = total - tax
+    elif total > 0:
+        vals['total_amount'] = vals['total_amount_currency'] = total
+
+    if tax > 0:
+        vals['tax_amount'] = vals['tax_amount_currency'] = tax
+
+    items = output.get('items')
+    if isinstance(items, list) and items:
+        items_description = []
+        total_tax = 0.0
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            qty = item.get('quantity', '')
+            desc = item.get('description', '')
+            amount = item.get('amount', '')
+            item_tax = 0.0
+            try:
+                if 'tax' in item:
+                    item_tax = float(item.get('tax', 0.0))
+                    total_tax += item_tax
+            except (ValueError, TypeError):
+                pass
+
+            if desc:
+                item_text = f"{qty} x {desc}" if qty else desc
+                item_text += f": {amount}" if amount else ""
+                if item_tax > 0:
+                    item_text += f" (Tax: {item_tax})"
+                items_description.append(item_text)
+
+        # The taxes of the items win over an overall tax that disagrees with them
+        if total_tax > 0 and (tax == 0 or abs(total_tax - tax) > 0.01):
+            vals['tax_amount'] = vals['tax_amount_currency'] = total_tax
+
+        if items_description:
+            items_summary = "\n".join(items_description)
+            vals['description'] = (f"{description}\n\nReceipt Items:\n{items_summary}" if description
+                                   else f"Receipt Items:\n{items_summary}")
+
+    return vals
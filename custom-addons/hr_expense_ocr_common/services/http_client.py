@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+Pooled keep-alive HTTP sessions for the OCR services.
+
+``requests.post`` opens a new TCP+TLS connection on every call. This module
+keeps one ``requests.Session`` per process and per endpoint (scheme, host and
+port), sized to the number of requests the process can serve concurrently,
+and retries transient failures with a bounded exponential backoff.
+
+Scans are POST requests to a billed API, so they are only retried when they
+certainly did not reach it (connection errors) or when the service asks for it
+(429 and 503 responses with a Retry-After header). Read timeouts and gateway
+errors are not retried for them: the receipt may have been scanned already.
+"""
+import os
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from odoo.tools import config
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Retry policy for transient failures: connection resets, gateway errors and throttling
+RETRY_TOTAL = 3
+# Read errors include timeouts, which are already long for OCR calls
+RETRY_READ = 1
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_BACKOFF_MAX = 10
+RETRY_STATUS_FORCELIST = (429, 502, 503, 504)
+RETRY_ALLOWED_METHODS = frozenset(['HEAD', 'GET', 'OPTIONS'])
+# Responses after which a POST is sent again, when they carry a Retry-After header
+RETRY_POST_STATUSES = (429, 503)
+
+WARM_UP_TIMEOUT = 5
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+_warm_up_urls = set()
+
+
+def _endpoint_key(url):
+    """Return the (scheme, host, port) tuple identifying a connection pool."""
+    parts = urlsplit(url)
+    port = parts.port or (443 if parts.scheme == 'https' else 80)
+    return (parts.scheme, parts.hostname, port)
+
+
+def get_pool_size():
+    """Return the number of connections to keep per endpoint.
+
+    A prefork worker serves one request at a time, so a couple of connections
+    is enough; the threaded server serves as many requests in parallel as it
+    has database connections.
+
+    Returns:
+        int: maximum number of pooled connections per endpoint
+    """
+    if config.get('workers'):
+        return 2
+    return max(int(config.get('db_maxconn') or 0), 4)
+
+
+class OcrRetry(Retry):
+    """Retry policy of the idempotent methods, extended to the POST requests
+    the OCR service explicitly asks to send again."""
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST':
+            return bool(self.total and has_retry_after and status_code in RETRY_POST_STATUSES)
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_session():
+    """Create a session with keep-alive pooling and the retry policy mounted."""
+    retry_kwargs = dict(
+        total=RETRY_TOTAL,
+        connect=RETRY_TOTAL,
+        read=RETRY_READ,
+        status=RETRY_TOTAL,
+        backoff_factor=RETRY_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUS_FORCELIST,
+        allowed_methods=RETRY_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        retry = OcrRetry(backoff_max=RETRY_BACKOFF_MAX, **retry_kwargs)
+    except TypeError:
+        # urllib3 < 2 has no backoff_max argument
+        retry = OcrRetry(**retry_kwargs)
+        retry.DEFAULT_BACKOFF_MAX = RETRY_BACKOFF_MAX
+    pool_size = get_pool_size()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size,
+                          max_retries=retry, pool_block=False)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session(url):
+    """Return the pooled session to use for requests to ``url``.
+
+    Sessions are keyed by process id as well as endpoint, so a prefork worker
+    never reuses sockets inherited from its parent process.
+
+    Args:
+        url (str): URL of the endpoint that will be called
+
+    Returns:
+        requests.Session: shared session for this process and endpoint
+    """
+    key = (os.getpid(),) + _endpoint_key(url)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(key)
+            if session is None:
+                _logger.info("Creating pooled HTTP session for %s://%s:%s (pool size %d)",
+                             key[1], key[2], key[3], get_pool_size())
+                session = _sessions[key] = _build_session()
+    return session
+
+
+def post(url, **kwargs):
+    """Send a POST request through the pooled session of the endpoint.
+
+    Accepts the same keyword arguments as ``requests.post``.
+
+    Returns:
+        requests.Response: the response of the last attempt
+    """
+    return get_session(url).post(url, **kwargs)
+
+
+def _warm_up(urls):
+    for url in urls:
+        try:
+            get_session(url).head(url, timeout=WARM_UP_TIMEOUT, allow_redirects=False)
+            _logger.debug("Warmed up HTTP connection to %s", url)
+        except requests.exceptions.RequestException as e:
+            _logger.info("Could not warm up HTTP connection to %s: %s", url, str(e))
+
+
+def _start_warm_up(urls):
+    thread = threading.Thread(target=_warm_up, args=(list(urls),), name='ocr-http-warm-up', daemon=True)
+    thread.start()
+
+
+def warm_up(urls):
+    """Open the pooled connections to ``urls`` in the background.
+
+    Meant to be called when a worker loads the registry, so the first scan does
+    not pay for the TCP and TLS handshakes. When the registry is preloaded by
+    the prefork master, each forked worker warms up its own connections.
+    Skipped when running tests or one-shot commands.
+
+    Args:
+        urls (iterable): endpoint URLs to connect to
+    """
+    urls = {url for url in urls if url and url.startswith(('http://', 'https://'))}
+    if not urls or config.get('test_enable') or config.get('stop_after_init'):
+        return
+    _warm_up_urls.update(urls)
+    _start_warm_up(urls)
+
+
+def _warm_up_after_fork():
+    if _warm_up_urls:
+        _start_warm_up(_warm_up_urls)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_warm_up_after_fork)
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming multipart/form-data request bodies.
+
+``requests`` builds multipart bodies in memory, which adds yet another copy of
+every uploaded file. ``MultipartStream`` is a file-like body that reads the
+files chunk by chunk while the request is sent, so the memory used by an
+upload does not depend on the size of the files. It knows its length, so the
+request keeps a Content-Length header, and it can seek, so urllib3 can rewind
+it when a request is retried.
+"""
+import io
+import os
+import uuid
+
+CRLF = b'\r\n'
+
+
+def _quote(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+class MultipartStream(io.RawIOBase):
+    """File-like multipart/form-data body streaming its file parts"""
+
+    def __init__(self, fields=None, files=None, boundary=None):
+        """
+        Args:
+            fields (iterable): (name, value) tuples of plain form fields
+            files (iterable): (name, ReceiptFile) tuples of file parts; several
+                parts may share the same name
+            boundary (str): multipart boundary, random by default
+        """
+        super().__init__()
+        self.boundary = boundary or uuid.uuid4().hex
+        self._parts = []
+        for name, value in (fields or []):
+            self._add_bytes(self._part_header(name))
+            self._add_bytes(str(value).encode('utf-8') + CRLF)
+        for name, receipt in (files or []):
+            self._add_bytes(self._part_header(name, receipt.name, receipt.mime_type))
+            self._parts.append((receipt, receipt.size))
+            self._add_bytes(CRLF)
+        self._add_bytes(b'--' + self.boundary.encode() + b'--' + CRLF)
+
+        self._length = sum(size for _part, size in self._parts)
+        self._position = 0
+        self._index = 0
+        self._offset = 0
+        self._stream = None
+
+    def _add_bytes(self, data):
+        self._parts.append((data, len(data)))
+
+    def _part_header(self, name, file_name=None, mime_type=None):
+        header = '--%s\r\nContent-Disposition: form-data; name="%s"' % (self.boundary, _quote(name))
+        if file_name is not None:
+            header += '; filename="%s"\r\nContent-Type: %s' % (
+                _quote(file_name), mime_type or 'application/octet-stream')
+        return header.encode('utf-8') + CRLF + CRLF
+
+    @property
+    def content_type(self):
+        """Value of the Content-Type header to send with this body."""
+        return 'multipart/form-data; boundary=%s' % self.boundary
+
+    def __len__(self):
+        return self._length
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self._length
+        offset = max(0, min(offset, self._length))
+        self._close_stream()
+        self._position = offset
+        # Locate the part holding the new position
+        self._index, remaining = 0, offset
+        while self._index < len(self._parts) and remaining >= self._parts[self._index][1]:
+            remaining -= self._parts[self._index][1]
+            self._index += 1
+        self._offset = remaining
+        return self._position
+
+    def _close_stream(self):
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length - self._position
+        chunks = []
+        while size > 0 and self._index < len(self._parts):
+            part, part_size = self._parts[self._index]
+            if isinstance(part, bytes):
+                chunk = part[self._offset:self._offset + size]
+            else:
+                if self._stream is None:
+                    self._stream = part.open()
+                    self._stream.seek(self._offset)
+                chunk = self._stream.read(min(size, part_size - self._offset))
+                if not chunk:
+                    raise IOError("Receipt %s is shorter than expected" % part.name)
+            chunks.append(chunk)
+            size -= len(chunk)
+            self._offset += len(chunk)
+            self._position += len(chunk)
+            if self._offset >= part_size:
+                self._close_stream()
+                self._index += 1
+                self._offset = 0
+        return b''.join(chunks)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        self._close_stream()
+        super().close()
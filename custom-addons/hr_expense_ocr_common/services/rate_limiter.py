@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Cluster-wide rate limiter of the OCR calls.
+
+Every worker on every node draws from the same per-company token bucket,
+stored in ``hr.expense.ocr.rate.limit``, before calling an OCR API, so bulk
+uploads stay within the OCR quota instead of being answered with 429s. When
+the bucket is empty the caller either waits for a token or gets an
+``OcrRateLimitedError`` right away, depending on the company settings.
+
+Each process leases a share of the burst at once (``LEASE_SHARE``) and spends
+it without going back to the database. The tokens it did not spend within
+``LEASE_TTL`` seconds go back to the bucket with its next take. Buckets with a
+small burst lease one token at a time.
+"""
+import asyncio
+import math
+import threading
+import time
+from datetime import timedelta
+
+from odoo import fields, _
+from odoo.addons.structured_logging import get_logger
+
+from .circuit_breaker import OcrUnavailableError
+
+_logger = get_logger(__name__)
+
+# Share of the burst of a bucket a process takes at once
+LEASE_SHARE = 0.1
+# Seconds a process may spend the tokens it leased
+LEASE_TTL = 10
+
+# Tokens leased and not spent yet by this process, by (database, company id):
+# (tokens, expiry)
+_leases = {}
+_leases_lock = threading.Lock()
+
+
+class OcrRateLimitedError(OcrUnavailableError):
+    """The OCR quota of the company is used up for now"""
+
+
+def _bucket(env, cost):
+    """Return the bucket parameters of the current company, or None without a rate limit."""
+    company = env.company.sudo()
+    if company.ocr_rate_limit <= 0:
+        return None
+    return {
+        'company': company,
+        'rate': company.ocr_rate_limit / 60.0,
+        'burst': max(company.ocr_rate_burst, cost),
+        'max_wait': company.ocr_rate_limit_max_wait if company.ocr_rate_limit_mode == 'wait' else 0,
+    }
+
+
+def _take(env, bucket, cost):
+    """Take ``cost`` tokens, from the lease of the process if it holds enough.
+
+    Returns:
+        float: 0 if the tokens were taken, otherwise the number of seconds
+            until enough tokens are available
+    """
+    key = (env.cr.dbname, bucket['company'].id)
+    now = time.monotonic()
+    with _leases_lock:
+        tokens, expiry = _leases.pop(key, (0, 0))
+        if tokens >= cost and now < expiry:
+            if tokens > cost:
+                _leases[key] = (tokens - cost, expiry)
+            return 0
+    # The rest of the lease goes back to the bucket with this take
+    taken, wait = env['hr.expense.ocr.rate.limit'].sudo()._take(
+        bucket['company'].id, bucket['rate'], bucket['burst'], cost,
+        lease=max(cost, int(bucket['burst'] * LEASE_SHARE)), returned=tokens)
+    if taken > cost:
+        with _leases_lock:
+            tokens, _expiry = _leases.get(key, (0, 0))
+            _leases[key] = (tokens + taken - cost, time.monotonic() + LEASE_TTL)
+    return wait
+
+
+def _limited(bucket, wait):
+    company = bucket['company']
+    _logger.info("OCR rate limit of %s reached (%d calls per minute)", company.name, company.ocr_rate_limit)
+    return OcrRateLimitedError(
+        _("The OCR quota of %s is used up for now, please try again later.") % company.name,
+        retry_at=fields.Datetime.now() + timedelta(seconds=math.ceil(wait)))
+
+
+def acquire(env, cost=1):
+    """Take ``cost`` tokens from the bucket of the current company.
+
+    Does nothing when the company has no rate limit. In 'wait' mode, waits up
+    to the configured maximum for the bucket to refill; in 'defer' mode,
+    never waits.
+
+    Args:
+        env: Odoo environment of the caller; its company owns the bucket
+        cost (int): number of tokens to take
+
+    Raises:
+        OcrRateLimitedError: no token is available in time; ``retry_at`` is
+            the date a token will be available
+    """
+    bucket = _bucket(env, cost)
+    if not bucket:
+        return
+
+    deadline = time.monotonic() + bucket['max_wait']
+    while True:
+        wait = _take(env, bucket, cost)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            break
+        _logger.debug("OCR rate limit of %s reached, waiting %.2f seconds", bucket['company'].name, wait)
+        time.sleep(wait)
+    raise _limited(bucket, wait)
+
+
+async def acquire_async(env, cost=1):
+    """Same as acquire() for coroutines: waits without blocking the event loop.
+
+    The bucket itself is still updated synchronously, with a short query.
+    """
+    bucket = _bucket(env, cost)
+    if not bucket:
+        return
+
+    deadline = time.monotonic() + bucket['max_wait']
+    while True:
+        wait = _take(env, bucket, cost)
+        if not wait:
+            return
+        if time.monotonic() + wait > deadline:
+            break
+        await asyncio.sleep(wait)
+    raise _limited(bucket, wait)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Receipt files read straight from the filestore.
+
+``base64.b64decode(attachment.datas)`` makes Odoo read the file, encode it in
+base64 and have the caller decode it again. A ``ReceiptFile`` points at the
+file in the filestore instead and only opens it when the upload streams it.
+"""
+import io
+import mimetypes
+import os
+from odoo.addons.structured_logging import get_logger
+
+_logger = get_logger(__name__)
+
+# Leading bytes used to recognise the file type when the name is not enough
+MAGIC_NUMBERS = [
+    (b'%PDF', 'application/pdf'),
+    (b'\xff\xd8', 'image/jpeg'),
+    (b'\x89PNG', 'image/png'),
+    (b'RIFF', 'image/webp'),
+]
+
+
+class ReceiptFile:
+    """A receipt to upload, backed either by a filestore path or by bytes in memory"""
+
+    def __init__(self, name, data=None, path=None, mime_type=None):
+        if data is None and path is None:
+            raise ValueError("A receipt needs either data or a path")
+        self.name = name or 'unknown'
+        self.data = data
+        self.path = path
+        self._mime_type = mime_type
+
+    @classmethod
+    def from_attachment(cls, attachment):
+        """Build a receipt from an ir.attachment without decoding its content.
+
+        Attachments stored in the filestore are streamed from their file;
+        attachments stored in the database fall back to their raw bytes.
+
+        Args:
+            attachment: ir.attachment record
+
+        Returns:
+            ReceiptFile
+        """
+        attachment = attachment.sudo()
+        name = attachment.name or 'unknown'
+        if attachment.store_fname:
+            path = attachment._full_path(attachment.store_fname)
+            if os.path.isfile(path):
+                return cls(name, path=path, mime_type=attachment.mimetype)
+            _logger.warning("Filestore file of attachment %s is missing, reading it from the database",
+                            attachment.id)
+        return cls(name, data=attachment.raw or b'', mime_type=attachment.mimetype)
+
+    @property
+    def size(self):
+        """Size of the file in bytes, without reading it."""
+        if self.path is not None:
+            return os.path.getsize(self.path)
+        return len(self.data)
+
+    @property
+    def mime_type(self):
+        """MIME type from the attachment, the file name or the leading bytes."""
+        if not self._mime_type or self._mime_type == 'application/octet-stream':
+            mime_type, _encoding = mimetypes.guess_type(self.name)
+            if not mime_type:
+                head = self.head()
+                mime_type = next((mime for magic, mime in MAGIC_NUMBERS if head.startswith(magic)), None)
+            self._mime_type = mime_type
+        return self._mime_type
+
+    def open(self):
+        """Return a binary file object positioned at the start of the receipt."""
+        if self.path is not None:
+            return open(self.path, 'rb')
+        return io.BytesIO(self.data)
+
+    def head(self, size=16):
+        """Return the first ``size`` bytes of the receipt."""
+        with self.open() as stream:
+            return stream.read(size)
+
+    def read(self):
+        """Return the whole content of the receipt (avoid for large files)."""
+        if self.path is None:
+            return self.data
+        with self.open() as stream:
+            return stream.read()
@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from . import test_http_client
+from . import test_circuit_breaker
+from . import test_rate_limiter
+from . import test_ocr_payload
+from . import test_receipt_lines
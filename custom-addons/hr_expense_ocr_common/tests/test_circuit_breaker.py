@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the circuit breaker and the adaptive concurrency limit
+"""
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+import requests
+
+from odoo import fields
+from odoo.tests import common, tagged
+
+from ..models import hr_expense_ocr_breaker
+from ..services import circuit_breaker, http_client
+from ..services.circuit_breaker import OcrUnavailableError
+from ..services.db import state_cursor
+
+_logger = logging.getLogger(__name__)
+
+API_URL = 'https://ocr.example.com/webhook/scan'
+
+
+class FakeResponse:
+    """Minimal stand-in for requests.Response"""
+
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.text = ''
+        self.headers = {}
+
+
+@tagged('post_install', '-at_install')
+class TestCircuitBreaker(common.TransactionCase):
+    """Test that calls fail fast while an OCR endpoint is unhealthy"""
+
+    def setUp(self):
+        super(TestCircuitBreaker, self).setUp()
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('ocr_breaker_failure_threshold', '3')
+        ICP.set_param('ocr_breaker_reset_timeout', '60')
+        ICP.set_param('ocr_concurrency_max', '8')
+        ICP.set_param('ocr_concurrency_wait', '0')
+        self.Breaker = self.env['hr.expense.ocr.breaker']
+
+    def _breaker(self):
+        return self.Breaker.search([('endpoint', '=', self.Breaker._get_endpoint(API_URL))])
+
+    def _call(self, status_code=200):
+        with patch.object(http_client, 'post', return_value=FakeResponse(status_code)) as post:
+            circuit_breaker.post(self.env, API_URL, timeout=1)
+        return post
+
+    def test_01_opens_after_consecutive_failures(self):
+        """The breaker opens after the failure threshold and then rejects calls without sending them"""
+        for _attempt in range(3):
+            self._call(503)
+        breaker = self._breaker()
+        self.assertEqual(breaker.state, 'open')
+        self.assertTrue(breaker.retry_at > fields.Datetime.now())
+
+        with patch.object(http_client, 'post') as post, self.assertRaises(OcrUnavailableError):
+            circuit_breaker.post(self.env, API_URL, timeout=1)
+        post.assert_not_called()
+
+    def test_02_connection_errors_count_as_failures(self):
+        """Timeouts and connection errors are failures and are re-raised"""
+        with patch.object(http_client, 'post', side_effect=requests.exceptions.ConnectTimeout('timeout')):
+            with self.assertRaises(requests.exceptions.ConnectTimeout):
+                circuit_breaker.post(self.env, API_URL, timeout=1)
+        breaker = self._breaker()
+        self.assertEqual(breaker.consecutive_failures, 1)
+        self.assertIn('timeout', breaker.last_error)
+
+    def test_03_probe_closes_breaker(self):
+        """Once the reset timeout has expired, one successful probe closes the breaker"""
+        for _attempt in range(3):
+            self._call(502)
+        breaker = self._breaker()
+        breaker.write({'retry_at': fields.Datetime.now() - timedelta(seconds=1)})
+
+        self._call(200)
+        breaker.invalidate_recordset()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.consecutive_failures, 0)
+
+    def test_04_failed_probe_reopens_breaker(self):
+        """A failed probe opens the breaker again immediately"""
+        for _attempt in range(3):
+            self._call(504)
+        breaker = self._breaker()
+        breaker.write({'retry_at': fields.Datetime.now() - timedelta(seconds=1)})
+
+        self._call(504)
+        breaker.invalidate_recordset()
+        self.assertEqual(breaker.state, 'open')
+        self.assertTrue(breaker.retry_at > fields.Datetime.now())
+
+    def test_05_aimd_concurrency_limit(self):
+        """Failures halve the concurrency limit and successes raise it back slowly"""
+        self._call(200)
+        breaker = self._breaker()
+        self.assertEqual(breaker.concurrency_limit, 8)
+
+        self._call(500)
+        breaker.invalidate_recordset()
+        self.assertEqual(breaker.concurrency_limit, 4)
+
+        self._call(200)
+        breaker.invalidate_recordset()
+        self.assertAlmostEqual(breaker.concurrency_limit, 4.25)
+        self.assertEqual(breaker.in_flight, 0, "Concurrency slots are released after each call")
+
+    def test_06_client_errors_do_not_trip_breaker(self):
+        """4xx answers are not a sign of an unhealthy service"""
+        for _attempt in range(5):
+            self._call(404)
+        breaker = self._breaker()
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.failure_count, 0)
+
+    def test_07_successes_not_written(self):
+        """Successful calls to a healthy endpoint are counted in memory, without a database connection"""
+        self._call(200)
+        with patch.object(hr_expense_ocr_breaker, 'state_cursor', wraps=state_cursor) as cursor:
+            for _attempt in range(5):
+                self._call(200)
+            cursor.assert_not_called()
+
+            self._call(503)
+            self.assertEqual(cursor.call_count, 1, "A failure is written at once")
+        breaker = self._breaker()
+        self.assertEqual((breaker.success_count, breaker.failure_count), (6, 1))
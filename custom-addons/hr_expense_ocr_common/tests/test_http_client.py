@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the pooled HTTP client: pool sizing, retry policy and warm-up
+"""
+import logging
+from unittest.mock import MagicMock, patch
+
+import requests
+from urllib3.exceptions import ConnectTimeoutError, ReadTimeoutError
+
+from odoo.tests import common, tagged
+from odoo.tools import config
+
+from ..services import http_client
+
+_logger = logging.getLogger(__name__)
+
+API_URL = 'https://ocr.example.com/webhook/scan'
+
+
+@tagged('post_install', '-at_install')
+class TestHttpClient(common.BaseCase):
+    """Test the sessions shared by the OCR modules"""
+
+    def _retry(self):
+        return http_client.get_session(API_URL).get_adapter(API_URL).max_retries
+
+    def test_01_pool_size(self):
+        """Prefork workers keep 2 connections per endpoint, the threaded server one per database connection"""
+        with patch.dict(config.options, {'workers': 4, 'db_maxconn': 64}):
+            self.assertEqual(http_client.get_pool_size(), 2)
+        with patch.dict(config.options, {'workers': 0, 'db_maxconn': 16}):
+            self.assertEqual(http_client.get_pool_size(), 16)
+            session = http_client._build_session()
+            self.assertEqual(session.get_adapter(API_URL)._pool_maxsize, 16)
+        with patch.dict(config.options, {'workers': 0, 'db_maxconn': 0}):
+            self.assertEqual(http_client.get_pool_size(), 4)
+
+    def test_02_session_per_endpoint(self):
+        """Requests to the same scheme, host and port share their session"""
+        session = http_client.get_session(API_URL)
+        self.assertIs(http_client.get_session('https://ocr.example.com:443/other/path'), session)
+        self.assertIsNot(http_client.get_session('http://ocr.example.com/webhook/scan'), session)
+        self.assertIsNot(http_client.get_session('https://ocr.example.com:8443/webhook/scan'), session)
+
+    def test_03_post_status_retries(self):
+        """POST requests are only sent again on 429/503 responses carrying a Retry-After header"""
+        retry = self._retry()
+        self.assertIsInstance(retry, http_client.OcrRetry)
+        self.assertTrue(retry.is_retry('POST', 503, has_retry_after=True))
+        self.assertTrue(retry.is_retry('POST', 429, has_retry_after=True))
+        self.assertFalse(retry.is_retry('POST', 503, has_retry_after=False))
+        self.assertFalse(retry.is_retry('POST', 502, has_retry_after=True))
+        self.assertFalse(retry.is_retry('POST', 504, has_retry_after=False))
+        # Idempotent methods keep the full policy
+        self.assertTrue(retry.is_retry('GET', 502))
+        self.assertTrue(retry.is_retry('HEAD', 504))
+
+    def test_04_post_error_retries(self):
+        """Connection errors are retried for POST requests, read timeouts are not"""
+        retry = self._retry()
+        retried = retry.increment(method='POST', url=API_URL, error=ConnectTimeoutError('connect timed out'))
+        self.assertIsInstance(retried, http_client.OcrRetry)
+        self.assertEqual(retried.total, retry.total - 1)
+
+        with self.assertRaises(ReadTimeoutError):
+            retry.increment(method='POST', url=API_URL, error=ReadTimeoutError(None, API_URL, 'read timed out'))
+        # A GET is retried once after a read timeout
+        retried = retry.increment(method='GET', url=API_URL, error=ReadTimeoutError(None, API_URL, 'read timed out'))
+        self.assertEqual(retried.read, http_client.RETRY_READ - 1)
+
+    def test_05_warm_up(self):
+        """Endpoints are warmed up in the background, again after each fork, except in tests"""
+        self.addCleanup(http_client._warm_up_urls.clear)
+        with patch.dict(config.options, {'test_enable': False, 'stop_after_init': False}), \
+                patch.object(http_client, '_start_warm_up') as start:
+            http_client.warm_up([API_URL, 'ftp://ocr.example.com/scan', '', None])
+            start.assert_called_once_with({API_URL})
+            start.reset_mock()
+            http_client._warm_up_after_fork()
+            start.assert_called_once_with({API_URL})
+
+        with patch.dict(config.options, {'test_enable': True}), \
+                patch.object(http_client, '_start_warm_up') as start:
+            http_client.warm_up(['https://other.example.com/scan'])
+            start.assert_not_called()
+
+    def test_06_warm_up_errors(self):
+        """Warming up opens the connection with a HEAD request and ignores unreachable endpoints"""
+        session = MagicMock()
+        session.head.side_effect = [requests.exceptions.ConnectionError('refused'), MagicMock()]
+        with patch.object(http_client, 'get_session', return_value=session):
+            http_client._warm_up(['https://down.example.com/scan', API_URL])
+        self.assertEqual(session.head.call_count, 2)
+        session.head.assert_called_with(API_URL, timeout=http_client.WARM_UP_TIMEOUT, allow_redirects=False)
@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the raw OCR payloads of the expenses
+"""
+import logging
+
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+PAYLOADS = [
+    {'business_name': 'City Taxi', 'total_amount': 42.5, 'tax': 3.5,
+     'items': [{'description': 'Taxi fare', 'amount': 42.5}]},
+    {'business_name': 'Hotel Bellevue', 'total_amount': 820.0,
+     'items': [{'description': 'Room, 2 nights', 'amount': 760.0}, {'description': 'Breakfast', 'amount': 60.0}]},
+    {'business_name': 'City Taxi', 'total_amount': 18.0, 'tax_amount': 1.5},
+]
+
+
+@tagged('post_install', '-at_install')
+class TestOcrPayload(common.TransactionCase):
+    """Test the SQL/JSON path queries on the raw OCR payloads"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestOcrPayload, cls).setUpClass()
+        cls.Expense = cls.env['hr.expense']
+        cls.expenses = cls.Expense.create([{
+            'name': 'Payload Expense %s' % index,
+            'employee_id': cls.env.ref('hr.employee_admin').id,
+            'product_id': cls.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 1.0,
+            'ocr_payload': payload,
+        } for index, payload in enumerate(PAYLOADS)])
+        cls.env.flush_all()
+
+    def _search(self, jsonpath):
+        return self.Expense._search_ocr_payload(jsonpath, domain=[('id', 'in', self.expenses.ids)])
+
+    def test_01_queries(self):
+        """Vendor, item amount and missing tax queries"""
+        taxi, hotel, taxi_again = self.expenses
+        self.assertEqual(self._search('$.business_name == "City Taxi"'), taxi | taxi_again)
+        self.assertEqual(self._search('exists($.items[*] ? (@.amount > 500))'), hotel)
+        self.assertEqual(self._search('!(exists($.tax) || exists($.tax_amount))'), hotel)
+        self.assertFalse(self._search('$.total_amount > 1000'))
+
+    def test_02_payload_round_trip(self):
+        """Payloads are stored as JSON and read back as such"""
+        self.expenses.invalidate_recordset(['ocr_payload'])
+        self.assertEqual(self.expenses[1].ocr_payload, PAYLOADS[1])
+        self.env.cr.execute("SELECT jsonb_typeof(ocr_payload) FROM hr_expense WHERE id = %s", [self.expenses[0].id])
+        self.assertEqual(self.env.cr.fetchone()[0], 'object')
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the cluster-wide OCR rate limiter
+"""
+import logging
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+from odoo.tests import common, tagged
+
+from ..models import hr_expense_ocr_rate_limit
+from ..services import circuit_breaker, http_client, rate_limiter
+from ..services.circuit_breaker import OcrUnavailableError
+from ..services.db import state_cursor
+from ..services.rate_limiter import OcrRateLimitedError
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestRateLimiter(common.TransactionCase):
+    """Test the per-company token bucket"""
+
+    def setUp(self):
+        super(TestRateLimiter, self).setUp()
+        self.company = self.env.company
+        self.company.write({
+            'ocr_rate_limit': 60,
+            'ocr_rate_burst': 2,
+            'ocr_rate_limit_mode': 'defer',
+        })
+        self.RateLimit = self.env['hr.expense.ocr.rate.limit']
+
+    def _bucket(self):
+        return self.RateLimit.search([('company_id', '=', self.company.id)])
+
+    def test_01_no_limit(self):
+        """Companies without a rate limit never touch the buckets"""
+        self.company.ocr_rate_limit = 0
+        for _call in range(10):
+            rate_limiter.acquire(self.env)
+        self.assertFalse(self._bucket())
+
+    def test_02_burst_then_defer(self):
+        """The burst goes through, then calls are rejected with the date a token is available"""
+        rate_limiter.acquire(self.env)
+        rate_limiter.acquire(self.env)
+        with self.assertRaises(OcrRateLimitedError) as context:
+            rate_limiter.acquire(self.env)
+
+        self.assertTrue(context.exception.retry_at > fields.Datetime.now())
+        bucket = self._bucket()
+        self.assertEqual(bucket.granted_count, 2)
+        self.assertEqual(bucket.throttled_count, 1)
+
+    def test_03_bucket_refills(self):
+        """Tokens come back at the configured rate, up to the burst size"""
+        rate_limiter.acquire(self.env)
+        rate_limiter.acquire(self.env)
+        bucket = self._bucket()
+        bucket.write({'refilled_at': fields.Datetime.now() - timedelta(minutes=10)})
+
+        rate_limiter.acquire(self.env)
+        bucket.invalidate_recordset()
+        self.assertAlmostEqual(bucket.tokens, 1, places=0, msg="The bucket never holds more than the burst")
+
+    def test_04_wait_mode_gives_up_after_max_wait(self):
+        """In wait mode, a call is only deferred once the maximum wait would be exceeded"""
+        self.company.write({'ocr_rate_limit_mode': 'wait', 'ocr_rate_limit_max_wait': 0})
+        rate_limiter.acquire(self.env)
+        rate_limiter.acquire(self.env)
+        with self.assertRaises(OcrRateLimitedError):
+            rate_limiter.acquire(self.env)
+
+    def test_05_buckets_are_per_company(self):
+        """Each company draws from its own bucket"""
+        other = self.env['res.company'].create({
+            'name': 'Other OCR Company',
+            'ocr_rate_limit': 60,
+            'ocr_rate_burst': 1,
+            'ocr_rate_limit_mode': 'defer',
+        })
+        rate_limiter.acquire(self.env)
+        rate_limiter.acquire(self.env)
+        rate_limiter.acquire(self.env(context=dict(self.env.context, allowed_company_ids=[other.id])))
+        self.assertEqual(self.RateLimit.search_count([('company_id', 'in', (self.company | other).ids)]), 2)
+
+    def test_06_tokens_leased(self):
+        """Processes lease a share of the burst and spend it without a database connection"""
+        self.company.write({'ocr_rate_limit': 600, 'ocr_rate_burst': 50})
+        with patch.object(hr_expense_ocr_rate_limit, 'state_cursor', wraps=state_cursor) as cursor:
+            for _call in range(5):
+                rate_limiter.acquire(self.env)
+        self.assertEqual(cursor.call_count, 1, "5 tokens are leased at once")
+        bucket = self._bucket()
+        self.assertEqual(bucket.granted_count, 5)
+        self.assertAlmostEqual(bucket.tokens, 45, places=0)
+
+    def test_07_open_breaker_keeps_quota(self):
+        """Calls rejected by an open circuit breaker do not take a token"""
+        url = 'https://ocr.example.com/webhook/scan'
+        Breaker = self.env['hr.expense.ocr.breaker']
+        Breaker.create({
+            'endpoint': Breaker._get_endpoint(url),
+            'state': 'open',
+            'retry_at': fields.Datetime.now() + timedelta(minutes=5),
+            'concurrency_limit': 4,
+        })
+        with patch.object(http_client, 'post') as post, self.assertRaises(OcrUnavailableError):
+            circuit_breaker.post(self.env, url, before_send=lambda: rate_limiter.acquire(self.env), timeout=1)
+        post.assert_not_called()
+        self.assertFalse(self._bucket(), "No token was taken")
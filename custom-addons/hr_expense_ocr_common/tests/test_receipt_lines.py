@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the receipt line items of the expenses
+"""
+import logging
+
+from odoo import Command
+from odoo.exceptions import AccessError
+from odoo.tests import common, new_test_user, tagged
+
+from ..services.extraction import receipt_line_values
+
+_logger = logging.getLogger(__name__)
+
+ITEMS = {
+    'Coffee Receipt': [
+        {'quantity': 2, 'description': 'Cappuccino', 'amount': 7.0},
+        {'quantity': 1, 'description': 'Blueberry Muffin', 'amount': 3.25},
+    ],
+    'Office Receipt': [
+        {'quantity': '1', 'description': 'Printer toner, black', 'amount': '89.90', 'tax': '17.08'},
+        {'description': 'A4 paper (500 sheets)', 'amount': 6.5},
+        {'amount': ''},
+    ],
+}
+
+
+@tagged('post_install', '-at_install')
+class TestReceiptLines(common.TransactionCase):
+    """Test the receipt lines and their full-text search"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestReceiptLines, cls).setUpClass()
+        cls.Expense = cls.env['hr.expense']
+        cls.expenses = cls.Expense.create([{
+            'name': name,
+            'employee_id': cls.env.ref('hr.employee_admin').id,
+            'product_id': cls.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 1.0,
+            'receipt_line_ids': [Command.create(line) for line in receipt_line_values(items)],
+        } for name, items in ITEMS.items()])
+        cls.env.flush_all()
+
+    def _search(self, text):
+        return self.Expense.search([('id', 'in', self.expenses.ids), ('receipt_item_search', 'ilike', text)])
+
+    def test_01_line_values(self):
+        """Items are mapped to lines, the ones without description nor amount skipped"""
+        coffee, office = self.expenses
+        self.assertEqual(coffee.receipt_line_ids._get_line_values(), receipt_line_values(ITEMS['Coffee Receipt']))
+        self.assertEqual(len(office.receipt_line_ids), 2)
+        toner = office.receipt_line_ids[0]
+        self.assertEqual((toner.quantity, toner.amount, toner.tax), (1.0, 89.9, 17.08))
+
+    def test_02_full_text_search(self):
+        """Expenses are found by the words of their items"""
+        coffee, office = self.expenses
+        self.assertEqual(self._search('cappuccino'), coffee)
+        self.assertEqual(self._search('Toner'), office)
+        # Queries match single items: the paper is not the toner
+        self.assertEqual(self._search('paper -toner'), office)
+        self.assertFalse(self._search('paper toner'))
+        self.assertEqual(self._search('"blueberry muffin"'), coffee)
+        self.assertFalse(self._search('espresso'))
+
+    def test_03_access_rules(self):
+        """Employees read the items of their own expenses, team approvers the ones of their team"""
+        approver = new_test_user(self.env, 'receipt_approver', groups='hr_expense.group_hr_expense_team_approver')
+        employee_user = new_test_user(self.env, 'receipt_employee', groups='base.group_user')
+        employee = self.env['hr.employee'].create({
+            'name': 'Receipt Employee',
+            'user_id': employee_user.id,
+            'expense_manager_id': approver.id,
+        })
+        own = self.Expense.create({
+            'name': 'Own Receipt',
+            'employee_id': employee.id,
+            'product_id': self.env.ref('hr_expense.product_product_fixed_cost').id,
+            'total_amount': 1.0,
+            'receipt_line_ids': [Command.create(line) for line in receipt_line_values(ITEMS['Coffee Receipt'])],
+        })
+        lines = self.env['hr.expense.receipt.line'].search(
+            [('expense_id', 'in', (own | self.expenses).ids)])
+
+        visible = lines.with_user(employee_user).search([('id', 'in', lines.ids)])
+        self.assertEqual(visible, own.receipt_line_ids)
+        with self.assertRaises(AccessError):
+            visible.with_user(employee_user).write({'description': 'Espresso'})
+
+        # The approver manages the employee only: the expenses of the admin stay out of reach
+        visible = lines.with_user(approver).search([('id', 'in', lines.ids)])
+        self.assertEqual(visible, own.receipt_line_ids)
@@ -11,7 +11,7 @@
     'author': 'Alvin Paul L. Azurin',
     'website': 'https://www.cre8or-lab.com',
     'license': 'LGPL-3',
-    'depends': ['base'],
+    'depends': ['base', 'structured_logging'],
     'data': [
         'security/ir.model.access.csv',
         'views/res_user_limit_views.xml',
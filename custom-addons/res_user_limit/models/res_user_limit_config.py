@@ -1,11 +1,11 @@
 # -*- coding: utf-8 -*-
-import logging
 # Fix import statements to avoid lint warnings
 import odoo
 from odoo import models, fields, api, _
 from odoo.exceptions import ValidationError, UserError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class ResUserLimitConfig(models.Model):
     _name = 'res.user.limit.config'
@@ -126,11 +126,11 @@ class ResUserLimitConfig(models.Model):
                 (when no configuration is active)
         """
         try:
-            _logger.info('Fetching current user limit configuration')
+            _logger.debug('Fetching current user limit configuration')
             config = self.search([('active', '=', True)], limit=1)
             
             if not config:
-                _logger.info('No active configuration found - user creation will be unlimited')
+                _logger.info('No active configuration found - user creation will be unlimited', sample=3600)
                 return -1  # Return -1 to indicate no limit
             
             _logger.debug(
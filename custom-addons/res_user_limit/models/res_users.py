@@ -1,21 +1,21 @@
 # -*- coding: utf-8 -*-
-import logging
 import odoo
 from odoo import models, api, _
 from odoo.exceptions import ValidationError
+from odoo.addons.structured_logging import get_logger
 
-_logger = logging.getLogger(__name__)
+_logger = get_logger(__name__)
 
 class ResUsers(models.Model):
     _inherit = 'res.users'
 
     @api.model_create_multi
     def create(self, vals_list):
-        _logger.info('Attempting to create %d new user record(s)', len(vals_list))
+        _logger.debug('Attempting to create %d new user record(s)', len(vals_list))
         
         # Skip the check for admin/system users
         if self.env.su:
-            _logger.info('Superuser mode detected, bypassing user limit check')
+            _logger.debug('Superuser mode detected, bypassing user limit check')
             return super().create(vals_list)
             
         # Get the current user count (excluding portal and public users)
@@ -28,12 +28,12 @@ class ResUsers(models.Model):
         
         # If limit is -1, it means no limit is set
         if limit_config == -1:
-            _logger.info('No user limit configured, proceeding with creation')
+            _logger.debug('No user limit configured, proceeding with creation')
             return super().create(vals_list)
         
         # Count only internal users being created (not portal/public)
         internal_users_to_create = sum(1 for vals in vals_list if not vals.get('share', False))
-        _logger.info('Creating %d internal users', internal_users_to_create)
+        _logger.debug('Creating %d internal users', internal_users_to_create)
         
         # Check if creating these users would exceed the limit
         if user_count + internal_users_to_create > limit_config:
@@ -46,7 +46,7 @@ class ResUsers(models.Model):
                 'Current internal user count: %s'
             ) % (limit_config, user_count))
         
-        _logger.info('User limit check passed, proceeding with creation')
+        _logger.debug('User limit check passed, proceeding with creation')
         result = super().create(vals_list)
         _logger.info('Successfully created %d new user record(s)', len(result))
         return result
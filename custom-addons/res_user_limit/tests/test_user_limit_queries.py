@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Query budgets of user creation under a user limit
+
+The budgets are upper bounds: a change that makes the limit check issue
+more queries fails here, one that saves queries is only logged by
+assertQueryCount(). Each case is run once beforehand to warm the caches.
+"""
+import logging
+
+from odoo.exceptions import ValidationError
+from odoo.tests import common, tagged
+
+_logger = logging.getLogger(__name__)
+
+
+@tagged('post_install', '-at_install')
+class TestUserLimitQueries(common.TransactionCase):
+    """SQL cost of the user limit check in res.users create()"""
+
+    @classmethod
+    def setUpClass(cls):
+        super(TestUserLimitQueries, cls).setUpClass()
+        cls.config = cls.env.ref('res_user_limit.default_user_limit_config')
+        cls.internal_count = cls.env['res.users'].search_count([('share', '=', False)])
+        # The limit check is skipped in superuser mode
+        cls.Users = cls.env['res.users'].with_user(cls.env.ref('base.user_admin')).with_context(no_reset_password=True)
+
+    def _vals(self, login):
+        return {'name': login.title(), 'login': login}
+
+    def test_01_limit_reached(self):
+        """Refusing a user costs the user count and the configuration lookup only"""
+        self.config.max_users = self.internal_count
+        with self.assertRaises(ValidationError):
+            self.Users.create([self._vals('qc_warm_up')])
+        self.env.invalidate_all()
+        with self.assertQueryCount(admin=3):
+            with self.assertRaises(ValidationError):
+                self.Users.create([self._vals('qc_refused')])
+
+    def test_02_under_limit(self):
+        """Creating users under the limit"""
+        self.config.max_users = self.internal_count + 10
+        self.Users.create([self._vals('qc_warm_up')])
+        self.env.flush_all()
+        self.env.invalidate_all()
+        with self.assertQueryCount(admin=90):
+            users = self.Users.create([self._vals('qc_user_%d' % index) for index in range(3)])
+            self.env.flush_all()
+        self.assertEqual(len(users), 3)
@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+from .log import get_logger, payload, StructuredLogger
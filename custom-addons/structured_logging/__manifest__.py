@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+{
+    'name': 'Structured Logging',
+    'version': '18.0.1.0.0',
+    'summary': 'Lazy, sampled and size-capped logging for the custom addons',
+    'description': """
+        Technical module holding the logging helper shared by the custom addons.
+        
+        Features:
+        - Drop-in replacement of the standard module loggers
+        - Payloads (OCR results, values written) serialized lazily, only when
+          the record is actually emitted, and capped in size
+        - Sampling of repeated events: at most one record per interval for a
+          message, with the number of records left out
+        - Structured events written as ``event key=value ...``
+    """,
+    'category': 'Technical',
+    'author': 'Alvin Paul L. Azurin',
+    'website': 'https://www.cre8or-lab.com',
+    'depends': ['base'],
+    'data': [],
+    'installable': True,
+    'application': False,
+    'auto_install': False,
+    'license': 'LGPL-3',
+}
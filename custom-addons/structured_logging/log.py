@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy, sampled and size-capped logging.
+
+``get_logger(__name__)`` returns a drop-in replacement of the standard module
+logger, with three additions for the hot paths:
+
+- ``payload(value)`` wraps a payload (an OCR result, the values written on a
+  record) so that it is only serialized if the record is actually emitted,
+  as compact JSON cut to ``DEFAULT_PAYLOAD_LIMIT`` characters;
+- ``sample=<seconds>`` on any call emits a message at most once per interval
+  per process, and tells how many records were left out meanwhile;
+- ``event(name, **fields)`` writes a structured ``name key=value ...``
+  record, the values being formatted lazily like payloads.
+
+Example::
+
+    _logger = get_logger(__name__)
+    _logger.debug("OCR result for expense %s: %s", expense.id, payload(result))
+    _logger.info("User limit checked: %s", limit, sample=60)
+    _logger.event('ocr.scan', expense=expense.id, engine=engine, seconds=round(elapsed, 3))
+
+This module imports nothing from Odoo.
+"""
+import json
+import logging
+import threading
+import time
+
+# Longest payload written in a log record, in characters
+DEFAULT_PAYLOAD_LIMIT = 2048
+# Messages whose sampling state is kept; the state is reset beyond
+SAMPLES_MAX = 4096
+
+_SCALARS = (int, float, bool, type(None))
+
+
+class payload(object):
+    """Payload formatted when, and only when, its log record is emitted.
+
+    Args:
+        value: payload, formatted as compact JSON unless it is a string
+        limit (int): longest text written, in characters (default DEFAULT_PAYLOAD_LIMIT)
+        exclude (tuple): keys of a dict payload left out, e.g. large raw values
+    """
+
+    __slots__ = ('value', 'limit', 'exclude')
+
+    def __init__(self, value, limit=None, exclude=()):
+        self.value = value
+        self.limit = limit
+        self.exclude = exclude
+
+    def __str__(self):
+        value = self.value
+        if self.exclude and isinstance(value, dict):
+            value = {key: val for key, val in value.items() if key not in self.exclude}
+        if isinstance(value, str):
+            text = value
+        else:
+            try:
+                text = json.dumps(value, default=str, ensure_ascii=False, separators=(',', ':'))
+            except (TypeError, ValueError):
+                text = repr(value)
+        limit = self.limit or DEFAULT_PAYLOAD_LIMIT
+        if len(text) > limit:
+            text = '%s... (%d characters)' % (text[:limit], len(text))
+        return text
+
+    __repr__ = __str__
+
+
+class _Sampler(object):
+    """Per-process admission of repeated log records, by message."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = {}
+
+    def admit(self, key, interval):
+        """Return None if a record must be left out, else the number left out since the last one."""
+        now = time.monotonic()
+        with self._lock:
+            last, skipped = self._seen.get(key, (None, 0))
+            if last is not None and now - last < interval:
+                self._seen[key] = (last, skipped + 1)
+                return None
+            if key not in self._seen and len(self._seen) >= SAMPLES_MAX:
+                self._seen.clear()
+            self._seen[key] = (now, 0)
+            return skipped
+
+    def reset(self):
+        with self._lock:
+            self._seen.clear()
+
+
+_sampler = _Sampler()
+
+
+class StructuredLogger(object):
+    """Wrapper of a standard logger, see the module documentation."""
+
+    def __init__(self, name, payload_limit=None):
+        self.name = name
+        self.logger = logging.getLogger(name)
+        self.payload_limit = payload_limit
+
+    def __getattr__(self, attr):
+        # setLevel(), handlers, getEffectiveLevel()... of the standard logger
+        return getattr(self.logger, attr)
+
+    def isEnabledFor(self, level):
+        return self.logger.isEnabledFor(level)
+
+    def _log(self, level, msg, args, kwargs):
+        sample = kwargs.pop('sample', None)
+        if not self.logger.isEnabledFor(level):
+            return
+        if sample:
+            skipped = _sampler.admit((self.name, level, msg), sample)
+            if skipped is None:
+                return
+            if skipped:
+                if not args:
+                    msg = msg.replace('%', '%%')
+                msg += ' (%d similar records left out)'
+                args += (skipped,)
+        # Point the record at the caller of debug(), info()...
+        kwargs['stacklevel'] = kwargs.get('stacklevel', 1) + 2
+        self.logger.log(level, msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        self._log(logging.DEBUG, msg, args, kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self._log(logging.INFO, msg, args, kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self._log(logging.WARNING, msg, args, kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self._log(logging.CRITICAL, msg, args, kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs.setdefault('exc_info', True)
+        self._log(logging.ERROR, msg, args, kwargs)
+
+    def log(self, level, msg, *args, **kwargs):
+        self._log(level, msg, args, kwargs)
+
+    def event(self, name, level=logging.INFO, sample=None, **fields):
+        """Log a structured event: ``name key=value ...``.
+
+        Args:
+            name (str): event name, e.g. ``ocr.scan``
+            level (int): logging level
+            sample (float): emit the event at most once per this many seconds
+            fields: values of the event; anything but numbers, booleans and
+                None is formatted like a payload
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        msg = ' '.join([name.replace('%', '%%')] + ['%s=%%s' % key for key in fields])
+        args = tuple(value if isinstance(value, _SCALARS) else payload(value, self.payload_limit)
+                     for value in fields.values())
+        self._log(level, msg, args, {'sample': sample})
+
+
+def get_logger(name, payload_limit=None):
+    """Return the structured logger of a module.
+
+    Args:
+        name (str): logger name, usually ``__name__``
+        payload_limit (int): longest payload of the events, in characters
+            (default DEFAULT_PAYLOAD_LIMIT)
+
+    Returns:
+        StructuredLogger
+    """
+    return StructuredLogger(name, payload_limit)
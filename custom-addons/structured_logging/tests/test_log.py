@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the structured logging helper
+"""
+import logging
+from unittest.mock import patch
+
+from odoo.tests import common, tagged
+
+from .. import log
+from ..log import get_logger, payload
+
+LOGGER_NAME = 'odoo.addons.structured_logging.tests.sample'
+
+
+class ExpensivePayload(object):
+    """Payload counting its serializations"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __str__(self):
+        self.calls += 1
+        return 'expensive'
+
+
+@tagged('post_install', '-at_install')
+class TestStructuredLogging(common.BaseCase):
+    """Test lazy payloads, sampling and events"""
+
+    def setUp(self):
+        super(TestStructuredLogging, self).setUp()
+        self.logger = get_logger(LOGGER_NAME)
+        log._sampler.reset()
+        self.addCleanup(log._sampler.reset)
+
+    def test_01_payload_lazy(self):
+        """Payloads of records below the logger level are never serialized"""
+        expensive = ExpensivePayload()
+        with self.assertLogs(LOGGER_NAME, level='INFO') as logs:
+            self.logger.debug("OCR result: %s", expensive)
+            self.logger.info("Scanned")
+        self.assertEqual(expensive.calls, 0)
+        self.assertEqual(logs.output, ['INFO:%s:Scanned' % LOGGER_NAME])
+
+        with self.assertLogs(LOGGER_NAME, level='DEBUG') as logs:
+            self.logger.debug("OCR result: %s", expensive)
+        self.assertEqual(expensive.calls, 1)
+        self.assertEqual(logs.output, ['DEBUG:%s:OCR result: expensive' % LOGGER_NAME])
+
+    def test_02_payload_format(self):
+        """Payloads are compact JSON, capped, without the excluded keys"""
+        self.assertEqual(str(payload({'total': 12.5, 'items': [1, 2]})), '{"total":12.5,"items":[1,2]}')
+        self.assertEqual(str(payload('raw text')), 'raw text')
+        self.assertEqual(str(payload({'vendor': 'Café', 'api_key': 'secret'}, exclude=('api_key',))),
+                         '{"vendor":"Café"}')
+        capped = str(payload({'text': 'x' * 100}, limit=20))
+        self.assertEqual(capped, '{"text":"xxxxxxxxxxx... (111 characters)')
+
+    def test_03_sample(self):
+        """Repeated sampled records are emitted once per interval, with the number left out"""
+        with patch.object(log.time, 'monotonic', return_value=1000.0), \
+                self.assertLogs(LOGGER_NAME, level='INFO') as logs:
+            for user in range(5):
+                self.logger.info("Debug mode denied to user %s", user, sample=60)
+        self.assertEqual(logs.output, ['INFO:%s:Debug mode denied to user 0' % LOGGER_NAME])
+
+        with patch.object(log.time, 'monotonic', return_value=1061.0), \
+                self.assertLogs(LOGGER_NAME, level='INFO') as logs:
+            self.logger.info("Debug mode denied to user %s", 5, sample=60)
+            self.logger.info("Limit reached: 100%", sample=60)
+        self.assertEqual(logs.output, [
+            'INFO:%s:Debug mode denied to user 5 (4 similar records left out)' % LOGGER_NAME,
+            'INFO:%s:Limit reached: 100%%' % LOGGER_NAME,
+        ])
+
+    def test_04_event(self):
+        """Events are written as name key=value, with their values formatted as payloads"""
+        with self.assertLogs(LOGGER_NAME, level='INFO') as logs:
+            self.logger.event('ocr.scan', expense=7, cached=False, engine='tesseract',
+                              fields={'amount': 12.5})
+            self.logger.event('ocr.debug', level=logging.DEBUG, output={'items': []})
+        self.assertEqual(logs.output, [
+            'INFO:%s:ocr.scan expense=7 cached=False engine=tesseract fields={"amount":12.5}' % LOGGER_NAME,
+        ])
+        # Records point at the caller, not at the helper
+        self.assertEqual(logs.records[0].pathname, __file__)